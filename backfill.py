@@ -0,0 +1,234 @@
+"""
+历史回填
+
+监听服务停机或权重调整后，按群聊历史消息重建月度活跃度统计：
+- 按天分片、服务端时间过滤并发拉取历史消息（按时间顺序交付，升序处理）
+- 消息逐条喂给统一计分引擎（与实时监听同一套规则），按统计周期聚合
+- 可选拉取每条消息的表情回复，补齐点赞数 / 被点赞数
+- 每处理完一段写入断点文件，中断后以相同参数重跑即从断点继续
+- 每个月处理完后以批量接口覆盖写入多维表格（保留被Pin次数；未统计点赞时保留点赞数 / 被点赞数）
+
+使用方法:
+    python backfill.py 2026-01                  # 重建 2026-01
+    python backfill.py 2026-01 2026-03          # 重建 2026-01 ~ 2026-03
+    python backfill.py 2026-02 --with-reactions # 同时统计点赞
+"""
+
+import argparse
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Optional
+
+from dotenv import load_dotenv
+
+from calculator import MetricsCalculator, ParsedContent
+from metrics_stream import StreamingMetricsEngine
+
+# 加载环境变量
+env_path = Path(__file__).parent / "config" / ".env"
+if env_path.exists():
+    load_dotenv(env_path)
+else:
+    load_dotenv()
+
+
+# 由消息历史重建的指标；点赞类指标仅在 --with-reactions 时重建
+MESSAGE_METRIC_KEYS = frozenset(
+    {"message_count", "char_count", "reply_received", "mention_received", "topic_initiated"}
+)
+REACTION_METRIC_KEYS = frozenset({"reaction_given", "reaction_received"})
+
+
+def _month_of(timestamp_ms: int) -> str:
+    return datetime.fromtimestamp(timestamp_ms / 1000).strftime("%Y-%m")
+
+
+def _month_start(month: str) -> datetime:
+    return datetime.strptime(month, "%Y-%m")
+
+
+def _next_month_start(month: str) -> datetime:
+    start = _month_start(month)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _mention_ids(msg: Dict) -> list:
+    """历史消息中的 mentions[].id 可能为字符串或 {"open_id": ...}"""
+    ids = []
+    for mention in msg.get("mentions") or []:
+        mention_id = mention.get("id")
+        if isinstance(mention_id, dict):
+            mention_id = mention_id.get("open_id")
+        if mention_id:
+            ids.append(mention_id)
+    return ids
+
+
+class HistoryBackfill:
+    """
+    历史消息回填器
+
+    Attributes:
+        collector: MessageCollector 实例
+        storage: BitableStorage 实例
+        checkpoint_file: 断点文件路径
+        with_reactions: 是否统计表情回复
+    """
+
+    CHECKPOINT_FILE = Path(__file__).parent / ".backfill_checkpoint.json"
+    WINDOW = timedelta(days=1)
+
+    def __init__(self, collector, storage, checkpoint_file: Optional[Path] = None, with_reactions: bool = False):
+        self.collector = collector
+        self.storage = storage
+        self.checkpoint_file = Path(checkpoint_file or self.CHECKPOINT_FILE)
+        self.with_reactions = with_reactions
+        self.metric_keys = MESSAGE_METRIC_KEYS | REACTION_METRIC_KEYS if with_reactions else MESSAGE_METRIC_KEYS
+        self.engine = StreamingMetricsEngine()
+
+    # ---------- 断点 ----------
+
+    def _load_checkpoint(self, start_month: str, end_month: str) -> Dict:
+        fresh = {
+            "start_month": start_month,
+            "end_month": end_month,
+            "with_reactions": self.with_reactions,
+            "cursor_ms": int(_month_start(start_month).timestamp() * 1000),
+            "months": {},
+        }
+        if not self.checkpoint_file.exists():
+            return fresh
+        try:
+            checkpoint = json.loads(self.checkpoint_file.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 读取回填断点失败，从头开始: {e}")
+            return fresh
+
+        if (
+            checkpoint.get("start_month") != start_month
+            or checkpoint.get("end_month") != end_month
+            or checkpoint.get("with_reactions") != self.with_reactions
+        ):
+            print("ℹ️ 断点参数与本次不一致，从头开始")
+            return fresh
+
+        cursor = datetime.fromtimestamp(checkpoint["cursor_ms"] / 1000)
+        print(f"🔁 从断点继续: {cursor.strftime('%Y-%m-%d %H:%M:%S')}")
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint: Dict) -> None:
+        tmp_path = self.checkpoint_file.with_name(f"{self.checkpoint_file.name}.tmp")
+        tmp_path.write_text(json.dumps(checkpoint, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.checkpoint_file)
+
+    # ---------- 处理 ----------
+
+    def _feed_message(self, msg: Dict, months: Dict[str, Dict]) -> None:
+        if msg.get("deleted"):
+            return
+        sender = msg.get("sender") or {}
+        if sender.get("sender_type") and sender.get("sender_type") != "user":
+            return
+        sender_id = MetricsCalculator._get_sender_id(msg)
+        if not sender_id:
+            return
+
+        month_totals = months.setdefault(_month_of(int(msg.get("create_time") or 0)), {})
+
+        def sink(user_id, user_name, delta):
+            entry = month_totals.setdefault(user_id, {"user_name": user_name, "metrics": {}})
+            for key, value in delta.items():
+                entry["metrics"][key] = entry["metrics"].get(key, 0) + value
+
+        self.engine.feed(
+            {
+                "message_id": msg.get("message_id"),
+                "chat_id": msg.get("chat_id"),
+                "sender_id": sender_id,
+                "sender_name": sender_id,
+                "char_count": ParsedContent((msg.get("body") or {}).get("content", "")).text_length,
+                "root_id": msg.get("root_id"),
+                "parent_id": msg.get("parent_id"),
+                "mention_ids": _mention_ids(msg),
+            },
+            resolve_sender=self.collector.get_message_sender,
+            sink=sink,
+        )
+
+        if self.with_reactions:
+            for reaction in self.collector.get_message_reactions(msg.get("message_id")):
+                operator = reaction.get("operator") or {}
+                if operator.get("operator_type", "user") != "user" or not operator.get("operator_id"):
+                    continue
+                self.engine.feed_reaction(operator["operator_id"], None, sender_id, None, sink=sink)
+
+        # 引擎自身的累计指标在回填中不使用，及时清空保持内存有界
+        self.engine.drain()
+
+    def _write_month(self, month: str, month_totals: Dict[str, Dict]) -> None:
+        names = self.collector.get_user_names(list(month_totals)) if month_totals else {}
+        for user_id, entry in month_totals.items():
+            entry["user_name"] = names.get(user_id) or user_id
+        self.storage.bulk_upsert_month(month, month_totals, metric_keys=self.metric_keys)
+
+    def run(self, start_month: str, end_month: Optional[str] = None) -> Dict[str, int]:
+        """
+        重建 [start_month, end_month] 各月统计并写入多维表格
+
+        Returns:
+            {month: 用户数}
+        """
+        end_month = end_month or start_month
+        range_end = min(_next_month_start(end_month), datetime.now())
+        checkpoint = self._load_checkpoint(start_month, end_month)
+        months = checkpoint["months"]
+        written = {}
+
+        cursor = datetime.fromtimestamp(checkpoint["cursor_ms"] / 1000)
+        # 各天分片并发拉取、按时间顺序交付，处理与断点仍逐天串行推进
+        shards = self.collector.iter_message_shards(cursor, range_end, self.WINDOW)
+        for window_start, window_end, messages in shards:
+            for msg in messages:
+                self._feed_message(msg, months)
+            print(f"📥 {window_start.strftime('%Y-%m-%d')} 处理消息 {len(messages)} 条")
+
+            # 已完整处理的月份立即写入
+            for month in sorted(months):
+                if _next_month_start(month) <= window_end or window_end >= range_end:
+                    self._write_month(month, months[month])
+                    written[month] = len(months.pop(month))
+
+            checkpoint["cursor_ms"] = int(window_end.timestamp() * 1000)
+            self._save_checkpoint(checkpoint)
+
+        # 全部完成，移除断点
+        if self.checkpoint_file.exists():
+            self.checkpoint_file.unlink()
+        print(f"✅ 回填完成: {written}")
+        return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按群聊历史重建月度活跃度统计")
+    parser.add_argument("start_month", help="起始月份 YYYY-MM")
+    parser.add_argument("end_month", nargs="?", help="结束月份 YYYY-MM（含），默认同起始月份")
+    parser.add_argument("--with-reactions", action="store_true", help="同时统计点赞（每条消息额外一次 API 调用）")
+    args = parser.parse_args()
+
+    from auth import FeishuAuth
+    from collector import MessageCollector
+    from storage import BitableStorage
+
+    auth = FeishuAuth()
+    backfill = HistoryBackfill(
+        MessageCollector(auth),
+        BitableStorage(auth),
+        with_reactions=args.with_reactions,
+    )
+    backfill.run(args.start_month, args.end_month)
+
+
+if __name__ == "__main__":
+    main()
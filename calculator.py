@@ -1,6 +1,104 @@
 import json
 import re
-from config import ACTIVITY_WEIGHTS
+from metrics_stream import initiates_topic
+from scoring import ScoringEngine
+
+# @ 标签（统计字数时移除）
+_MENTION_PATTERN = re.compile(r"@[^ ]+")
+
+
+class ParsedContent:
+    """
+    消息 content 的一次性解析结果
+
+    同一条消息在统计字数、路由标签、公告识别、文档渲染等环节都需要解析 content，
+    构造一次后在各环节共享，JSON 解析与文本提取都只执行一次（惰性计算并缓存）
+
+    Example:
+        >>> parsed = ParsedContent('{"text": "Hello @user2 World"}')
+        >>> parsed.text
+        'Hello @user2 World'
+        >>> parsed.text_length
+        12
+    """
+
+    __slots__ = ("raw", "_obj", "_parse_error", "_parsed", "_extracted", "_text_length")
+
+    def __init__(self, raw):
+        """
+        Args:
+            raw: 飞书消息 content（JSON 字符串或已解析的 dict）
+        """
+        self.raw = raw
+        self._obj = None
+        self._parse_error = False
+        self._parsed = False
+        self._extracted = None
+        self._text_length = None
+
+    @classmethod
+    def of(cls, content):
+        """已是 ParsedContent 时直接复用，否则新建"""
+        return content if isinstance(content, cls) else cls(content)
+
+    def _parse(self):
+        if self._parsed:
+            return
+        self._parsed = True
+        if isinstance(self.raw, str):
+            try:
+                self._obj = json.loads(self.raw)
+            except (json.JSONDecodeError, ValueError):
+                self._parse_error = True
+        else:
+            self._obj = self.raw
+
+    @property
+    def obj(self):
+        """解析后的 content 对象，JSON 无效时为 None"""
+        self._parse()
+        return self._obj
+
+    @property
+    def parse_error(self):
+        """content 是否为无效 JSON"""
+        self._parse()
+        return self._parse_error
+
+    def _extract(self):
+        if self._extracted is None:
+            if not self.raw:
+                self._extracted = ("", ())
+            elif self.parse_error:
+                self._extracted = (str(self.raw), ())
+            else:
+                try:
+                    text, image_keys = MetricsCalculator._extract_from_obj(self.obj)
+                except Exception:
+                    text, image_keys = str(self.raw), []
+                self._extracted = (text, tuple(image_keys))
+        return self._extracted
+
+    @property
+    def text(self):
+        """提取出的纯文本"""
+        return self._extract()[0]
+
+    @property
+    def image_keys(self):
+        """富文本中嵌入的图片 key 列表"""
+        return list(self._extract()[1])
+
+    @property
+    def text_length(self):
+        """去除 @ 标签后的字数（活跃度统计口径）"""
+        if self._text_length is None:
+            text = self.text
+            # 快速路径：不含 @ 时跳过正则替换
+            if "@" in text:
+                text = _MENTION_PATTERN.sub("", text)
+            self._text_length = len(text.strip())
+        return self._text_length
 
 
 class MetricsCalculator:
@@ -9,196 +107,180 @@ class MetricsCalculator:
         self.user_names = user_names or {}
         self.msg_sender_map = {}
 
+    @staticmethod
+    def _get_sender_id(msg):
+        """提取发送者 open_id，兼容 sender.id 为字符串或字典的情况"""
+        sender_id_obj = msg.get("sender", {}).get("id", {})
+        if isinstance(sender_id_obj, dict):
+            return sender_id_obj.get("open_id", "")
+        if isinstance(sender_id_obj, str):
+            return sender_id_obj
+        return ""
+
+    def _new_entry(self, user_id):
+        """新建用户指标条目"""
+        return {
+            "user_id": user_id,
+            "user_name": self.user_names.get(user_id, user_id),
+            "message_count": 0,
+            "char_count": 0,
+            "reply_received": 0,
+            "mention_received": 0,
+            "topic_initiated": 0,
+            "score": 0,
+        }
+
     def calculate(self):
         metrics = {}
 
+        # 第一遍：建立发送者索引，回复计数据此 O(1) 查找父消息发送者
+        sender_ids = []
         for msg in self.messages:
-            msg_id = msg.get("message_id")
-            sender = msg.get("sender", {})
-
-            # 处理 sender.id 可能是字符串或字典的情况
-            sender_id_obj = sender.get("id", {})
-            if isinstance(sender_id_obj, dict):
-                sender_id = sender_id_obj.get("open_id", "")
-            elif isinstance(sender_id_obj, str):
-                sender_id = sender_id_obj
-            else:
-                sender_id = ""
-
-            self.msg_sender_map[msg_id] = sender_id
+            sender_id = self._get_sender_id(msg)
+            sender_ids.append(sender_id)
+            self.msg_sender_map[msg.get("message_id")] = sender_id
 
             if sender_id and sender_id not in metrics:
-                metrics[sender_id] = {
-                    "user_id": sender_id,
-                    "user_name": self.user_names.get(sender_id, sender_id),
-                    "message_count": 0,
-                    "char_count": 0,
-                    "reply_received": 0,
-                    "mention_received": 0,
-                    "topic_initiated": 0,
-                    "score": 0,
-                }
-
-        for msg in self.messages:
-            sender = msg.get("sender", {})
-
-            # 处理 sender.id 可能是字符串或字典的情况
-            sender_id_obj = sender.get("id", {})
-            if isinstance(sender_id_obj, dict):
-                sender_id = sender_id_obj.get("open_id", "")
-            elif isinstance(sender_id_obj, str):
-                sender_id = sender_id_obj
-            else:
-                sender_id = ""
+                metrics[sender_id] = self._new_entry(sender_id)
 
+        # 第二遍：累加各项指标
+        for msg, sender_id in zip(self.messages, sender_ids):
             if not sender_id:
                 continue
 
-            metrics[sender_id]["message_count"] += 1
+            user_metrics = metrics[sender_id]
+            user_metrics["message_count"] += 1
 
             content = msg.get("body", {}).get("content", "")
-            char_count = self._extract_text_length(content)
-            metrics[sender_id]["char_count"] += char_count
+            user_metrics["char_count"] += self._extract_text_length(content)
 
             parent_id = msg.get("parent_id")
-            if parent_id and parent_id in self.msg_sender_map:
-                original_sender = self.msg_sender_map[parent_id]
-                metrics[original_sender]["reply_received"] += 1
+            if parent_id:
+                original_sender = self.msg_sender_map.get(parent_id)
+                if original_sender in metrics:
+                    metrics[original_sender]["reply_received"] += 1
 
-            mentions = msg.get("mentions", [])
-            for mention in mentions:
+            for mention in msg.get("mentions", []):
                 mentioned_id = mention.get("id", {}).get("open_id", "")
-                if mentioned_id:
-                    metrics[mentioned_id]["mention_received"] += 1
-
-            if not msg.get("root_id"):
-                msg_id = msg.get("message_id")
-                is_topic = any(m.get("root_id") == msg_id for m in self.messages)
-                if is_topic:
-                    metrics[sender_id]["topic_initiated"] += 1
-
-        # 计算活跃度分数（使用配置文件中的权重）
-        for user_id, data in metrics.items():
-            score = (
-                data["message_count"] * ACTIVITY_WEIGHTS["message_count"]
-                + data["char_count"] * ACTIVITY_WEIGHTS["char_count"]
-                + data["reply_received"] * ACTIVITY_WEIGHTS["reply_received"]
-                + data["mention_received"] * ACTIVITY_WEIGHTS["mention_received"]
-                + data["topic_initiated"] * ACTIVITY_WEIGHTS["topic_initiated"]
-            )
-            metrics[user_id]["score"] = round(score, 2)
+                if not mentioned_id:
+                    continue
+                # 被@者本批次未发言时同样计分（与实时监听一致）
+                if mentioned_id not in metrics:
+                    metrics[mentioned_id] = self._new_entry(mentioned_id)
+                metrics[mentioned_id]["mention_received"] += 1
+
+            # 与实时监听 / 历史回填共用同一话题规则
+            if initiates_topic(msg.get("root_id")):
+                user_metrics["topic_initiated"] += 1
+
+        # 计算活跃度分数（使用配置文件中的权重，全部用户一次批量打分）
+        rows = list(metrics.values())
+        for data, score in zip(rows, ScoringEngine().score_many(rows)):
+            data["score"] = score
 
         return dict(metrics)
 
     def _extract_text_length(self, content):
-        text, _ = self.extract_text_from_content(content)
         # 移除 @ 标签带来的字数影响
-        text = re.sub(r"@[^ ]+", "", text)
-        return len(text.strip())
+        return ParsedContent.of(content).text_length
 
     @staticmethod
     def extract_text_from_content(content):
         """通用内容提取逻辑，支持 text、post 以及其他复杂类型
+        content 可为 JSON 字符串、dict 或 ParsedContent（复用已有解析结果）
         返回: (text_content, image_keys_list)
         """
-        if not content:
-            return "", []
+        parsed = ParsedContent.of(content)
+        return parsed.text, parsed.image_keys
 
-        try:
-            # 如果 content 是字符串，则解析为字典；如果是字典则直接使用
-            if isinstance(content, str):
-                content_obj = json.loads(content)
-            else:
-                content_obj = content
-
-            # 1. 尝试直接获取 text 字段 (纯文本消息)
-            if "text" in content_obj:
-                text = content_obj["text"]
-                # 处理被转义的 JSON 文本
-                if isinstance(text, str) and text.startswith('{"text":'):
-                    try:
-                        inner = json.loads(text)
-                        return inner.get("text", text), []
-                    except (json.JSONDecodeError, ValueError):
-                        # 嵌套JSON解析失败，返回原始文本
-                        pass
-                return text, []
-
-            # 2. 处理直接的 post 结构 (title + content 数组)
-            if "content" in content_obj and isinstance(content_obj["content"], list):
-                text_parts = []
-                image_keys = []
-
-                # 添加标题(如果有)
-                if content_obj.get("title"):
-                    text_parts.append(content_obj["title"])
-
-                # 遍历每一行 content
-                for row in content_obj["content"]:
-                    if not isinstance(row, list):
+    @staticmethod
+    def _extract_from_obj(content_obj):
+        """从已解析的 content 对象中提取 (text_content, image_keys_list)"""
+        # 1. 快速路径：纯文本消息
+        if "text" in content_obj:
+            text = content_obj["text"]
+            # 处理被转义的 JSON 文本
+            if isinstance(text, str) and text.startswith('{"text":'):
+                try:
+                    inner = json.loads(text)
+                    return inner.get("text", text), []
+                except (json.JSONDecodeError, ValueError):
+                    # 嵌套JSON解析失败，返回原始文本
+                    pass
+            return text, []
+
+        # 2. 处理直接的 post 结构 (title + content 数组)
+        if "content" in content_obj and isinstance(content_obj["content"], list):
+            text_parts = []
+            image_keys = []
+
+            # 添加标题(如果有)
+            if content_obj.get("title"):
+                text_parts.append(content_obj["title"])
+
+            # 遍历每一行 content
+            for row in content_obj["content"]:
+                if not isinstance(row, list):
+                    continue
+                row_text = []
+                for item in row:
+                    if not isinstance(item, dict):
                         continue
-                    row_text = []
-                    for item in row:
-                        if not isinstance(item, dict):
-                            continue
-                        tag = item.get("tag")
-                        if tag in ["text", "a", "at"]:
-                            text_val = item.get("text", "")
-                            if text_val:
-                                row_text.append(text_val)
-                        elif tag == "img":
-                            # 提取图片 key
-                            img_key = item.get("image_key")
-                            if img_key:
-                                image_keys.append(img_key)
-                    if row_text:
-                        text_parts.append("".join(row_text))
-
+                    tag = item.get("tag")
+                    if tag in ["text", "a", "at"]:
+                        text_val = item.get("text", "")
+                        if text_val:
+                            row_text.append(text_val)
+                    elif tag == "img":
+                        # 提取图片 key
+                        img_key = item.get("image_key")
+                        if img_key:
+                            image_keys.append(img_key)
+                if row_text:
+                    text_parts.append("".join(row_text))
+
+            return "\n".join(text_parts), image_keys
+
+        # 3. 处理标准的 post 结构 (带语言版本)
+        if "post" in content_obj:
+            post_data = content_obj["post"]
+            text_parts = []
+            image_keys = []
+            values_to_check = post_data.values() if isinstance(post_data, dict) else [post_data]
+
+            for lang_data in values_to_check:
+                if not isinstance(lang_data, dict):
+                    continue
+
+                if "title" in lang_data and lang_data["title"]:
+                    text_parts.append(lang_data["title"])
+
+                if "content" in lang_data:
+                    for row in lang_data["content"]:
+                        row_text = []
+                        for item in row:
+                            tag = item.get("tag")
+                            if tag in ["text", "a", "at"]:
+                                text_parts_in_row = item.get("text", "")
+                                if text_parts_in_row:
+                                    row_text.append(text_parts_in_row)
+                            elif tag == "img":
+                                img_key = item.get("image_key")
+                                if img_key:
+                                    image_keys.append(img_key)
+                        if row_text:
+                            text_parts.append("".join(row_text))
+
+            if text_parts or image_keys:
                 return "\n".join(text_parts), image_keys
 
-            # 3. 处理标准的 post 结构 (带语言版本)
-            if "post" in content_obj:
-                post_data = content_obj["post"]
-                text_parts = []
-                image_keys = []
-                values_to_check = post_data.values() if isinstance(post_data, dict) else [post_data]
+        # 4. 处理其他类型 (image, file, audio 等)
+        for key in ["image_key", "file_key", "file_name"]:
+            if key in content_obj:
+                return f"[{key.replace('_', ' ')}: {content_obj[key]}]", []
 
-                for lang_data in values_to_check:
-                    if not isinstance(lang_data, dict):
-                        continue
+        # ⚠️ 兜底逻辑
+        if content_obj:
+            return str(content_obj), []
 
-                    if "title" in lang_data and lang_data["title"]:
-                        text_parts.append(lang_data["title"])
-
-                    if "content" in lang_data:
-                        for row in lang_data["content"]:
-                            row_text = []
-                            for item in row:
-                                tag = item.get("tag")
-                                if tag in ["text", "a", "at"]:
-                                    text_parts_in_row = item.get("text", "")
-                                    if text_parts_in_row:
-                                        row_text.append(text_parts_in_row)
-                                elif tag == "img":
-                                    img_key = item.get("image_key")
-                                    if img_key:
-                                        image_keys.append(img_key)
-                            if row_text:
-                                text_parts.append("".join(row_text))
-
-                if text_parts or image_keys:
-                    return "\n".join(text_parts), image_keys
-
-            # 4. 处理其他类型 (image, file, audio 等)
-            for key in ["image_key", "file_key", "file_name"]:
-                if key in content_obj:
-                    return f"[{key.replace('_', ' ')}: {content_obj[key]}]", []
-
-            # ⚠️ 兜底逻辑
-            if content_obj:
-                return str(content_obj), []
-
-            return "", []
-        except Exception:
-            # 如果解析完全失败，返回原始输入
-            return str(content), []
+        return "", []
@@ -2,17 +2,27 @@
 消息采集模块
 
 负责从飞书API获取群聊消息和用户信息
-支持分页、时间过滤和自动限流
+支持流式分页、服务端时间过滤、按时间分片并发拉取和自动限流
 """
 
 import requests
-import time
 import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Any
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
-from config import MAX_MESSAGES_PER_FETCH, MAX_PAGES_PER_FETCH, PAGE_SLEEP_TIME, API_TIMEOUT
-from rate_limiter import with_rate_limit
+from config import (
+    MESSAGE_PAGE_SIZE,
+    MAX_PAGES_PER_FETCH,
+    PAGE_SLEEP_TIME,
+    HISTORY_SHARD_HOURS,
+    HISTORY_FETCH_WORKERS,
+    API_TIMEOUT,
+)
+from metrics_registry import API_LATENCY
+from rate_limiter import acquire_rate_limit, with_rate_limit
 
 load_dotenv()
 
@@ -48,23 +58,18 @@ class MessageCollector:
         self.auth = auth
         self.chat_id: Optional[str] = os.getenv("CHAT_ID")
 
-    @with_rate_limit
-    def get_messages(self, hours: int = 1) -> List[Dict[str, Any]]:
+    def get_messages(self, hours: int = 1, limit: Optional[int] = None) -> List[Dict[str, Any]]:
         """
-        获取指定时间范围内的群聊消息
+        获取最近N小时的群聊消息
 
-        支持分页获取，自动过滤时间范围，防止无限循环和内存溢出
+        基于 iter_messages 的兼容封装；需要处理大时间范围时请直接使用 iter_messages 流式消费
 
         Args:
             hours: 获取最近N小时的消息，默认1小时
+            limit: 最多返回的消息数，默认不限制
 
         Returns:
-            消息列表，每条消息为字典格式
-
-        Note:
-            - 最多获取MAX_MESSAGES_PER_FETCH条消息（默认5000条）
-            - 最多翻MAX_PAGES_PER_FETCH页（默认100页）
-            - 自动应用速率限制
+            消息列表（按创建时间升序），请求失败时返回已获取的部分
 
         Example:
             >>> collector = MessageCollector(auth)
@@ -72,83 +77,193 @@ class MessageCollector:
             >>> for msg in messages:
             ...     print(msg.get('message_id'))
         """
-        url = "https://open.feishu.cn/open-apis/im/v1/messages"
+        end_time = datetime.now()
+        messages: List[Dict[str, Any]] = []
+        try:
+            for msg in self.iter_messages(end_time - timedelta(hours=hours), end_time):
+                messages.append(msg)
+                if limit and len(messages) >= limit:
+                    break
+        except requests.exceptions.Timeout:
+            print(f"⚠️ 获取消息请求超时，返回已获取的 {len(messages)} 条")
+        except Exception as e:
+            print(f"❌ 获取消息出错: {e}")
 
-        # 计算时间阈值（毫秒）
-        time_threshold = int((datetime.now() - timedelta(hours=hours)).timestamp() * 1000)
+        print(f"✅ 采集到 {len(messages)} 条消息")
+        return messages
 
-        all_messages = []
-        page_token = None
-        page_count = 0
+    def _get_message_page(
+        self, start_time: datetime, end_time: Optional[datetime] = None, page_token: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按服务端时间范围获取一页消息（按创建时间升序）
 
-        while True:
-            page_count += 1
+        不单独占用限流额度，由 iter_message_pages 每次拉取整体占用一次
 
-            # ⚡ 保护1: 最大页数限制
-            if page_count > MAX_PAGES_PER_FETCH:
-                print(f"⚠️ 已达到最大页数限制({MAX_PAGES_PER_FETCH})，停止获取")
-                break
+        Returns:
+            (消息列表, 下一页page_token)，没有更多时 page_token 为 None
 
-            # ⚡ 保护2: 最大消息数限制
-            if len(all_messages) >= MAX_MESSAGES_PER_FETCH:
-                print(f"⚠️ 已达到消息数量限制({MAX_MESSAGES_PER_FETCH})，停止获取")
-                break
+        Raises:
+            RuntimeError: API 返回错误时
+        """
+        url = "https://open.feishu.cn/open-apis/im/v1/messages"
+        params = {
+            "container_id_type": "chat",
+            "container_id": self.chat_id,
+            # 消息列表接口的时间过滤单位为秒
+            "start_time": str(int(start_time.timestamp())),
+            "sort_type": "ByCreateTimeAsc",
+            "page_size": MESSAGE_PAGE_SIZE,
+        }
+        if end_time:
+            params["end_time"] = str(int(end_time.timestamp()))
+        if page_token:
+            params["page_token"] = page_token
+
+        with API_LATENCY.time(endpoint="MessageCollector._get_message_page"):
+            response = requests.get(url, headers=self.auth.get_headers(), params=params, timeout=API_TIMEOUT)
+            data = response.json()
+        if data.get("code") != 0:
+            raise RuntimeError(f"获取消息失败: {data}")
 
-            # 不使用 start_time 和 end_time，直接获取最新消息
-            params = {"container_id_type": "chat", "container_id": self.chat_id, "page_size": 50}
+        data_obj = data.get("data") or {}
+        next_token = data_obj.get("page_token") if data_obj.get("has_more") else None
+        return data_obj.get("items") or [], next_token
 
-            if page_token:
-                params["page_token"] = page_token
+    def iter_message_pages(
+        self, start_time: datetime, end_time: Optional[datetime] = None
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        逐页产出 [start_time, end_time) 内的群聊消息（按创建时间升序）
 
-            try:
-                response = requests.get(
-                    url, headers=self.auth.get_headers(), params=params, timeout=API_TIMEOUT
-                )
-                data = response.json()
+        时间过滤在服务端完成，调用方每次只持有一页数据。
+        整次拉取只占用一次全局限流额度，页间间隔 PAGE_SLEEP_TIME；
+        最多翻 MAX_PAGES_PER_FETCH 页，防止 has_more 异常时无限翻页（更长的范围请用 iter_message_shards 分片）
 
-                if data.get("code") != 0:
-                    print(f"❌ 获取消息失败: {data}")
-                    break
+        Args:
+            start_time: 起始时间（含）
+            end_time: 结束时间（不含），默认不限制
 
-                messages = data.get("data", {}).get("items", [])
+        Raises:
+            RuntimeError: API 返回错误时（调用方据此保留断点，稍后重试）
+        """
+        end_ms = int(end_time.timestamp() * 1000) if end_time else None
+        page_token = None
+        acquire_rate_limit()
+        for page_count in range(1, MAX_PAGES_PER_FETCH + 1):
+            if page_count > 1:
+                time.sleep(PAGE_SLEEP_TIME)
+            items, page_token = self._get_message_page(start_time, end_time, page_token)
+            if end_ms is not None:
+                # 服务端按秒过滤，右边界按毫秒再精确截断一次
+                items = [msg for msg in items if int(msg.get("create_time") or 0) < end_ms]
+            if items:
+                yield items
+            if not page_token:
+                return
+        print(f"⚠️ 已达到最大页数限制({MAX_PAGES_PER_FETCH})，停止获取")
+
+    def iter_messages(
+        self, start_time: datetime, end_time: Optional[datetime] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        逐条产出 [start_time, end_time) 内的群聊消息（按创建时间升序），内存占用恒定
 
-                # 在代码层面过滤时间范围
-                for msg in messages:
-                    create_time = msg.get("create_time", 0)
-                    if isinstance(create_time, str):
-                        create_time = int(create_time)
+        Raises:
+            RuntimeError: API 返回错误时
+        """
+        for page in self.iter_message_pages(start_time, end_time):
+            yield from page
+
+    def iter_message_shards(
+        self,
+        start_time: datetime,
+        end_time: datetime,
+        shard_size: Optional[timedelta] = None,
+        max_workers: int = HISTORY_FETCH_WORKERS,
+    ) -> Iterator[Tuple[datetime, datetime, List[Dict[str, Any]]]]:
+        """
+        将 [start_time, end_time) 切分为时间分片并发拉取，按时间顺序逐片产出
 
-                    # 只保留指定时间范围内的消息
-                    if create_time >= time_threshold:
-                        all_messages.append(msg)
-                        # 再次检查消息数限制
-                        if len(all_messages) >= MAX_MESSAGES_PER_FETCH:
-                            break
+        各分片在线程池中独立翻页，每个分片占用一次全局 api_limiter 额度；
+        分片互不重叠且片内升序，按分片顺序产出即为全局升序。
+        同时在途的分片最多 max_workers 个，内存占用与总时间范围无关。
 
-                # 如果没有更多消息，或者已经获取到足够旧的消息，停止翻页
-                if not data.get("data", {}).get("has_more"):
-                    break
+        Args:
+            start_time: 起始时间（含）
+            end_time: 结束时间（不含）
+            shard_size: 分片长度，默认 HISTORY_SHARD_HOURS 小时
+            max_workers: 并发分片数
 
-                # 检查最后一条消息是否已经超出时间范围
-                if messages:
-                    last_msg_time = messages[-1].get("create_time", 0)
-                    if isinstance(last_msg_time, str):
-                        last_msg_time = int(last_msg_time)
-                    if last_msg_time < time_threshold:
-                        break
+        Yields:
+            (分片起始时间, 分片结束时间, 分片内消息列表)
 
-                page_token = data.get("data", {}).get("page_token")
-                time.sleep(PAGE_SLEEP_TIME)  # 使用配置文件中的延迟时间
+        Raises:
+            RuntimeError: 某个分片拉取失败时，在产出到该分片时抛出（此前的分片均已产出）
+        """
+        shard_size = shard_size or timedelta(hours=HISTORY_SHARD_HOURS)
+        shards = []
+        cursor = start_time
+        while cursor < end_time:
+            shard_end = min(cursor + shard_size, end_time)
+            shards.append((cursor, shard_end))
+            cursor = shard_end
+        if not shards:
+            return
+
+        def fetch(shard):
+            return list(self.iter_messages(*shard))
+
+        workers = max(1, min(max_workers, len(shards)))
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="history-fetch")
+        pending = deque()
+        next_index = 0
+        try:
+            while pending or next_index < len(shards):
+                while next_index < len(shards) and len(pending) < workers:
+                    shard = shards[next_index]
+                    pending.append((shard, executor.submit(fetch, shard)))
+                    next_index += 1
+                (shard_start, shard_end), future = pending.popleft()
+                yield shard_start, shard_end, future.result()
+        finally:
+            # 调用方提前停止或分片失败时，不再启动尚未开始的分片
+            executor.shutdown(wait=False, cancel_futures=True)
 
-            except requests.exceptions.Timeout:
-                print(f"⚠️ 第{page_count}页请求超时，停止获取")
-                break
+    @with_rate_limit
+    def get_message_reactions(self, message_id: str) -> List[Dict[str, Any]]:
+        """
+        获取消息的全部表情回复（自动翻页）
+
+        Returns:
+            表情回复列表，每项包含 operator.operator_id / operator.operator_type；失败时返回已获取部分
+        """
+        url = f"https://open.feishu.cn/open-apis/im/v1/messages/{message_id}/reactions"
+        reactions = []
+        page_token = None
+
+        while True:
+            params = {"user_id_type": "open_id", "page_size": 50}
+            if page_token:
+                params["page_token"] = page_token
+            try:
+                response = requests.get(url, headers=self.auth.get_headers(), params=params, timeout=API_TIMEOUT)
+                data = response.json()
             except Exception as e:
-                print(f"❌ 获取消息出错: {e}")
+                print(f"⚠️ 获取消息 {message_id} 表情回复出错: {e}")
+                break
+
+            if data.get("code") != 0:
+                print(f"⚠️ 获取消息 {message_id} 表情回复失败: {data.get('msg')}")
+                break
+
+            data_obj = data.get("data") or {}
+            reactions.extend(data_obj.get("items") or [])
+            if not data_obj.get("has_more"):
                 break
+            page_token = data_obj.get("page_token")
 
-        print(f"✅ 采集到 {len(all_messages)} 条消息（共{page_count}页）")
-        return all_messages
+        return reactions
 
     @with_rate_limit
     def get_user_names(self, user_ids: List[str]) -> Dict[str, str]:
@@ -17,7 +17,46 @@ from typing import Dict
 
 # ========== 缓存配置 ==========
 CACHE_USER_NAME_SIZE = 500  # 用户名缓存容量
-CACHE_EVENT_SIZE = 1000  # 事件去重缓存容量
+CACHE_USER_NAME_TTL_SECONDS = 6 * 3600  # 用户名缓存过期时间（秒），群备注修改后最迟在此时间后生效
+CACHE_PIN_DETAIL_SIZE = 200  # Pin 消息详情缓存容量
+CACHE_PIN_DETAIL_TTL_SECONDS = 24 * 3600  # Pin 消息详情缓存过期时间（秒）
+CACHE_NEGATIVE_TTL_SECONDS = 300  # 负缓存过期时间（秒）：查询无结果时短期内不再重复请求
+CACHE_EVENT_SIZE = 1000  # 事件去重缓存容量（持久化去重库的内存热层容量）
+CACHE_RENDERED_CARD_SIZE = 64  # 单聊卡片渲染结果缓存容量（PNG + 已上传的 image_key）
+CACHE_RENDERED_CARD_TTL_SECONDS = 24 * 3600  # 卡片渲染结果缓存过期时间（秒）
+
+# ========== 事件去重配置 ==========
+# 重连或重新部署后飞书会重推近期事件，去重记录持久化到 SQLite，按时间窗口过期
+EVENT_DEDUPE_DB_FILE = ".event_dedupe.sqlite3"  # 去重库文件（相对项目根目录，可用环境变量 EVENT_DEDUPE_DB_PATH 覆盖）
+EVENT_DEDUPE_TTL_SECONDS = 48 * 3600  # 去重窗口（秒），覆盖飞书事件重推周期
+EVENT_DEDUPE_PURGE_EVERY = 500  # 每新增多少条记录清理一次过期记录
+
+# ========== 撤回回滚快照配置 ==========
+# 每条消息的计分贡献以紧凑定长记录持久化到 SQLite，撤回时据此回滚
+MESSAGE_SNAPSHOT_DB_FILE = ".message_snapshots.sqlite3"  # 快照库文件（可用环境变量 MESSAGE_SNAPSHOT_DB_PATH 覆盖）
+MESSAGE_SNAPSHOT_RETENTION_SECONDS = 24 * 3600  # 快照保留期（秒），与飞书消息可撤回时限一致
+MESSAGE_SNAPSHOT_PURGE_EVERY = 500  # 每新增多少条快照清理一次过期快照
+
+# ========== Wiki 文档解析配置 ==========
+# Wiki 链接需换取实际文档 ID；直接查询失败时遍历知识空间节点树，解析结果持久化
+WIKI_TOKEN_DB_FILE = ".wiki_tokens.sqlite3"  # 解析结果库文件（可用环境变量 WIKI_TOKEN_DB_PATH 覆盖）
+WIKI_SEARCH_WORKERS = 4  # 并发遍历的知识空间数
+WIKI_RESOLVE_API_BUDGET = 200  # 单次解析最多调用的 Wiki 接口次数（遍历全部空间时的上限）
+
+# ========== MCP 文档获取配置 ==========
+MCP_TIMEOUT_SECONDS = 20  # 单次 MCP 工具调用超时（秒）
+MCP_MAX_CONCURRENCY = 4  # 并发 MCP 调用数（连接池大小）
+MCP_DOC_CACHE_SIZE = 100  # 文档内容缓存容量
+MCP_DOC_CACHE_TTL_SECONDS = 600  # 文档内容缓存过期时间（秒），文档修改后最迟在此时间后生效
+
+# ========== 单聊两阶段回复配置 ==========
+ASYNC_CARD_WORKERS = 5  # 后台生成文档卡片的线程数
+
+# ========== 卡片图片渲染配置 ==========
+# 回复卡片图片在独立进程池中渲染，避免 CPU 密集的绘制占用监听线程的 GIL
+RENDER_WORKERS = 2  # 渲染进程数，0 表示在调用线程内直接渲染
+RENDER_QUEUE_SIZE = 8  # 排队与进行中的渲染任务上限，超出时直接放弃本次渲染
+RENDER_TIMEOUT_SECONDS = 20  # 单次渲染等待上限（秒），含首次启动 worker 的预热时间
 
 # ========== API限流配置 ==========
 # 飞书API有速率限制，过快调用会被限流（HTTP 429错误）
@@ -27,8 +66,13 @@ API_RATE_LIMIT_PERIOD = 60  # 周期（秒）
 # 示例：20次/60秒 = 平均每3秒最多1次API调用
 
 # ========== 消息采集配置 ==========
-MAX_MESSAGES_PER_FETCH = 5000  # 单次最多获取消息数
-MAX_PAGES_PER_FETCH = 100  # 单次最多翻页数
+# 历史消息按页流式拉取；一次拉取（一个时间范围/分片）只占用一次全局限流额度，
+# 页与页之间按 PAGE_SLEEP_TIME 间隔，避免长历史翻页耗尽额度、饿死其他接口
+MESSAGE_PAGE_SIZE = 50  # 消息列表每页条数（接口上限50）
+MAX_PAGES_PER_FETCH = 100  # 单次拉取最多翻页数，防止 has_more 异常时无限翻页
+PAGE_SLEEP_TIME = 0.1  # 翻页间隔时间（秒），避免请求过快
+HISTORY_SHARD_HOURS = 24  # 大时间范围按此粒度切分为分片并发拉取
+HISTORY_FETCH_WORKERS = 4  # 并发拉取的分片数（每个分片占用一次全局限流额度）
 
 # ========== 活跃度权重配置 ==========
 # 用于计算活跃度分数的各项指标权重
@@ -48,15 +92,16 @@ ACTIVITY_WEIGHTS: Dict[str, float] = {
 TOPIC_ACTIVE_DAYS = 7  # 活跃阈值：7天内有回复
 TOPIC_SILENT_DAYS = 30  # 沉默阈值：30天内有回复
 
+# ========== Pin 审计去重记录配置 ==========
+PROCESSED_PIN_RETENTION_DAYS = 35  # 去重记录保留期（天），早于审计窗口的 Pin 不会再被处理
+PROCESSED_LOG_COMPACT_MIN_LINES = 200  # 冗余行数超过该值时压缩去重日志
+
 # ========== Token配置 ==========
 TOKEN_REFRESH_ADVANCE = 300  # Token刷新提前时间（秒），提前5分钟刷新
 
 # ========== API超时配置 ==========
 API_TIMEOUT = 10  # API请求超时时间（秒）
 
-# ========== 分页延迟配置 ==========
-PAGE_SLEEP_TIME = 0.1  # 翻页间隔时间（秒），避免请求过快
-
 
 # ========== API端点常量 ==========
 class FeishuAPIEndpoints:
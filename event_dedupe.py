@@ -0,0 +1,196 @@
+"""
+事件去重存储
+
+飞书长连接在重连、重新部署后会重推近期事件，纯内存 LRU 去重在进程重启后失效，
+突发流量下 1000 条容量也可能在几分钟内被挤出。本模块将去重记录持久化：
+- SQLite 单表（主键索引），检查与登记在同一把锁内原子完成，复杂度 O(log n)
+- 内存 LRU 热层缓存最近的事件，重复事件通常无需访问磁盘
+- 按时间窗口（TTL）定期清理过期记录，磁盘占用与窗口内事件量成正比
+- 数据库不可用时降级为仅内存去重，不影响事件处理
+
+所有事件处理函数共享同一个实例
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+from config import CACHE_EVENT_SIZE, EVENT_DEDUPE_PURGE_EVERY, EVENT_DEDUPE_TTL_SECONDS
+from utils import LRUCache
+
+
+class EventDedupeStore:
+    """
+    持久化、带时间窗口的事件去重存储
+
+    兼容 ``ThreadSafeLRUCache`` 的 ``in`` / ``set`` / ``clear`` 用法，
+    推荐使用原子的 ``mark_if_new``
+
+    Attributes:
+        path: SQLite 文件路径（":memory:" 表示不落盘）
+        ttl_seconds: 去重窗口（秒）
+        purge_every: 每新增多少条记录清理一次过期记录
+
+    Example:
+        >>> store = EventDedupeStore(Path(".event_dedupe.sqlite3"))
+        >>> store.mark_if_new("im.message.receive_v1:ev_1")
+        True
+        >>> store.mark_if_new("im.message.receive_v1:ev_1")
+        False
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        ttl_seconds: float = EVENT_DEDUPE_TTL_SECONDS,
+        recent_capacity: int = CACHE_EVENT_SIZE,
+        purge_every: int = EVENT_DEDUPE_PURGE_EVERY,
+    ):
+        """
+        打开（必要时创建）去重库
+
+        Args:
+            path: SQLite 文件路径，":memory:" 表示仅内存
+            ttl_seconds: 去重窗口（秒），超过窗口的事件视为新事件
+            recent_capacity: 内存热层容量
+            purge_every: 每新增多少条记录清理一次过期记录
+        """
+        self.path = str(path)
+        self.ttl_seconds = ttl_seconds
+        self.purge_every = max(1, purge_every)
+        self._recent = LRUCache(capacity=recent_capacity)
+        self._lock = threading.Lock()
+        self._inserted_since_purge = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._open()
+
+    def _open(self) -> None:
+        try:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS processed_events ("
+                "event_key TEXT PRIMARY KEY, seen_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_processed_events_seen_at ON processed_events(seen_at)"
+            )
+            self._conn = conn
+        except sqlite3.Error as e:
+            print(f"⚠️ 打开事件去重库失败({self.path})，降级为内存去重: {e}")
+            self._conn = None
+
+    def _is_fresh(self, seen_at: Optional[float], now: float) -> bool:
+        return seen_at is not None and now - seen_at < self.ttl_seconds
+
+    def _lookup_locked(self, key: str, now: float) -> Optional[float]:
+        """在锁内查询事件首次出现时间，热层未命中时查库并回填热层"""
+        seen_at = self._recent.get(key)
+        if seen_at is not None or self._conn is None:
+            return seen_at
+        try:
+            row = self._conn.execute(
+                "SELECT seen_at FROM processed_events WHERE event_key = ?", (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"⚠️ 查询事件去重库失败: {e}")
+            return None
+        if row and self._is_fresh(row[0], now):
+            self._recent.set(key, row[0])
+            return row[0]
+        return None
+
+    def mark_if_new(self, key: str, now: Optional[float] = None) -> bool:
+        """
+        原子地检查并登记事件
+
+        Args:
+            key: 事件去重键
+            now: 当前时间戳（秒），默认 time.time()
+
+        Returns:
+            True 表示首次出现（已登记，调用方应处理），False 表示窗口内重复
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            if self._is_fresh(self._lookup_locked(key, now), now):
+                return False
+
+            if self._conn is not None:
+                try:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO processed_events (event_key, seen_at) VALUES (?, ?)",
+                        (key, now),
+                    )
+                except sqlite3.Error as e:
+                    print(f"⚠️ 写入事件去重库失败，本条仅内存去重: {e}")
+            self._recent.set(key, now)
+
+            self._inserted_since_purge += 1
+            if self._inserted_since_purge >= self.purge_every:
+                self._purge_locked(now)
+            return True
+
+    def _purge_locked(self, now: float) -> int:
+        self._inserted_since_purge = 0
+        if self._conn is None:
+            return 0
+        try:
+            cursor = self._conn.execute(
+                "DELETE FROM processed_events WHERE seen_at < ?", (now - self.ttl_seconds,)
+            )
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"⚠️ 清理事件去重库失败: {e}")
+            return 0
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """
+        删除窗口外的记录
+
+        Returns:
+            删除的记录数
+        """
+        with self._lock:
+            return self._purge_locked(time.time() if now is None else now)
+
+    def __contains__(self, key: object) -> bool:
+        now = time.time()
+        with self._lock:
+            return self._is_fresh(self._lookup_locked(str(key), now), now)
+
+    def set(self, key: str, value: object = True) -> None:
+        """兼容 LRU 缓存接口：登记事件（value 被忽略）"""
+        self.mark_if_new(key)
+
+    def __len__(self) -> int:
+        with self._lock:
+            if self._conn is None:
+                return len(self._recent)
+            try:
+                return self._conn.execute("SELECT COUNT(*) FROM processed_events").fetchone()[0]
+            except sqlite3.Error:
+                return len(self._recent)
+
+    def clear(self) -> None:
+        """清空全部去重记录"""
+        with self._lock:
+            self._recent.clear()
+            self._inserted_since_purge = 0
+            if self._conn is not None:
+                try:
+                    self._conn.execute("DELETE FROM processed_events")
+                except sqlite3.Error as e:
+                    print(f"⚠️ 清空事件去重库失败: {e}")
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -8,28 +8,61 @@ from flask import Flask, jsonify
 import threading
 import time
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from metrics_registry import MetricsRegistry, registry as shared_registry
 
 
 class HealthMonitor:
-    """健康状态监控器"""
+    """
+    健康状态监控器
+
+    事件、消息、表情回复与错误计数使用指标注册表中的分片计数器，
+    各事件处理线程并发更新时无锁竞争、不丢失计数；/metrics 直接导出注册表。
+    计数器属于注册表而非实例：使用默认的共享注册表时，所有实例读写同一组计数
+    """
     
-    def __init__(self):
-        """初始化健康监控器"""
-        self.status = {
+    def __init__(self, registry: Optional[MetricsRegistry] = None):
+        """
+        初始化健康监控器
+
+        Args:
+            registry: 指标注册表，默认使用进程内共享的注册表；
+                      传入独立的注册表可使计数与 /metrics 输出与其他实例隔离
+        """
+        self.registry = registry if registry is not None else shared_registry
+        self._events = self.registry.counter("events_total", "处理的事件总数")
+        self._messages = self.registry.counter("messages_total", "处理的消息总数")
+        self._reactions = self.registry.counter("reactions_total", "处理的表情回复总数")
+        self._errors = self.registry.counter("errors_total", "错误总数")
+        # 非计数类状态：只做整体赋值，无需加锁
+        self._state = {
             "status": "starting",
             "start_time": time.time(),
             "last_event_time": 0,
             "last_heartbeat_time": time.time(),
-            "total_events_processed": 0,
-            "total_messages_processed": 0,
-            "total_reactions_processed": 0,
-            "total_errors": 0,
             "websocket_connected": False,
             "pin_monitor_enabled": False,
         }
+        self.registry.gauge("uptime_seconds", "服务运行时间（秒）").set_function(
+            lambda: int(time.time() - self._state["start_time"])
+        )
+        self.registry.gauge("websocket_connected", "WebSocket连接状态(1=已连接, 0=未连接)").set_function(
+            lambda: 1 if self._state["websocket_connected"] else 0
+        )
         self.app = Flask(__name__)
         self._setup_routes()
+
+    @property
+    def status(self) -> Dict[str, Any]:
+        """当前状态快照（含各计数器合并后的值）"""
+        return {
+            **self._state,
+            "total_events_processed": self._events.value(),
+            "total_messages_processed": self._messages.value(),
+            "total_reactions_processed": self._reactions.value(),
+            "total_errors": self._errors.value(),
+        }
     
     def _setup_routes(self):
         """设置HTTP路由"""
@@ -43,28 +76,29 @@ class HealthMonitor:
             - 200: 服务健康
             - 503: 服务不健康（超过5分钟未收到事件）
             """
+            status = self.status
             current_time = time.time()
-            uptime_seconds = current_time - self.status["start_time"]
-            time_since_last_event = current_time - self.status["last_event_time"]
+            uptime_seconds = current_time - status["start_time"]
+            time_since_last_event = current_time - status["last_event_time"]
             
             # 健康判断逻辑
             # 1. 如果刚启动（2分钟内），认为是健康的
             # 2. 如果运行超过2分钟但5分钟内没有收到事件，标记为不健康
             is_just_started = uptime_seconds < 120
             is_receiving_events = time_since_last_event < 300  # 5分钟
-            is_healthy = is_just_started or is_receiving_events or self.status["websocket_connected"]
+            is_healthy = is_just_started or is_receiving_events or status["websocket_connected"]
             
             response_data = {
                 "status": "healthy" if is_healthy else "unhealthy",
                 "uptime_seconds": int(uptime_seconds),
                 "uptime_human": self._format_uptime(uptime_seconds),
-                "last_event_ago_seconds": int(time_since_last_event) if self.status["last_event_time"] > 0 else None,
-                "total_events_processed": self.status["total_events_processed"],
-                "total_messages": self.status["total_messages_processed"],
-                "total_reactions": self.status["total_reactions_processed"],
-                "total_errors": self.status["total_errors"],
-                "websocket_connected": self.status["websocket_connected"],
-                "pin_monitor_enabled": self.status["pin_monitor_enabled"],
+                "last_event_ago_seconds": int(time_since_last_event) if status["last_event_time"] > 0 else None,
+                "total_events_processed": status["total_events_processed"],
+                "total_messages": status["total_messages_processed"],
+                "total_reactions": status["total_reactions_processed"],
+                "total_errors": status["total_errors"],
+                "websocket_connected": status["websocket_connected"],
+                "pin_monitor_enabled": status["pin_monitor_enabled"],
                 "timestamp": datetime.now().isoformat(),
             }
             
@@ -76,33 +110,9 @@ class HealthMonitor:
             """
             Prometheus风格的指标端点（可选）
             
-            返回可供Prometheus抓取的指标
+            返回可供Prometheus抓取的指标：指标注册表中的计数器、耗时直方图与仪表盘
             """
-            metrics_text = f"""# HELP feishu_monitor_uptime_seconds 服务运行时间（秒）
-# TYPE feishu_monitor_uptime_seconds gauge
-feishu_monitor_uptime_seconds {int(time.time() - self.status["start_time"])}
-
-# HELP feishu_monitor_events_total 处理的事件总数
-# TYPE feishu_monitor_events_total counter
-feishu_monitor_events_total {self.status["total_events_processed"]}
-
-# HELP feishu_monitor_messages_total 处理的消息总数
-# TYPE feishu_monitor_messages_total counter
-feishu_monitor_messages_total {self.status["total_messages_processed"]}
-
-# HELP feishu_monitor_reactions_total 处理的表情回复总数
-# TYPE feishu_monitor_reactions_total counter
-feishu_monitor_reactions_total {self.status["total_reactions_processed"]}
-
-# HELP feishu_monitor_errors_total 错误总数
-# TYPE feishu_monitor_errors_total counter
-feishu_monitor_errors_total {self.status["total_errors"]}
-
-# HELP feishu_monitor_websocket_connected WebSocket连接状态(1=已连接, 0=未连接)
-# TYPE feishu_monitor_websocket_connected gauge
-feishu_monitor_websocket_connected {1 if self.status["websocket_connected"] else 0}
-"""
-            return metrics_text, 200, {'Content-Type': 'text/plain; charset=utf-8'}
+            return self.registry.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
         
         @self.app.route('/status')
         def detailed_status():
@@ -111,11 +121,12 @@ feishu_monitor_websocket_connected {1 if self.status["websocket_connected"] else
             
             返回所有状态信息（用于调试）
             """
+            status = self.status
             current_time = time.time()
-            uptime_seconds = current_time - self.status["start_time"]
+            uptime_seconds = current_time - status["start_time"]
             
             return jsonify({
-                **self.status,
+                **status,
                 "uptime_seconds": int(uptime_seconds),
                 "uptime_human": self._format_uptime(uptime_seconds),
                 "current_time": datetime.now().isoformat(),
@@ -152,17 +163,17 @@ feishu_monitor_websocket_connected {1 if self.status["websocket_connected"] else
         Args:
             event_type: 事件类型，"message"或"reaction"
         """
-        self.status["last_event_time"] = time.time()
-        self.status["total_events_processed"] += 1
+        self._state["last_event_time"] = time.time()
+        self._events.inc()
         
         if event_type == "message":
-            self.status["total_messages_processed"] += 1
+            self._messages.inc()
         elif event_type == "reaction":
-            self.status["total_reactions_processed"] += 1
+            self._reactions.inc()
     
     def update_error(self):
         """记录错误"""
-        self.status["total_errors"] += 1
+        self._errors.inc()
     
     def update_websocket_status(self, connected: bool):
         """
@@ -171,11 +182,11 @@ feishu_monitor_websocket_connected {1 if self.status["websocket_connected"] else
         Args:
             connected: 是否已连接
         """
-        self.status["websocket_connected"] = connected
+        self._state["websocket_connected"] = connected
         if connected:
-            self.status["status"] = "running"
+            self._state["status"] = "running"
         else:
-            self.status["status"] = "disconnected"
+            self._state["status"] = "disconnected"
     
     def set_pin_monitor_status(self, enabled: bool):
         """
@@ -184,7 +195,7 @@ feishu_monitor_websocket_connected {1 if self.status["websocket_connected"] else
         Args:
             enabled: 是否启用
         """
-        self.status["pin_monitor_enabled"] = enabled
+        self._state["pin_monitor_enabled"] = enabled
     
     def heartbeat(self):
         """
@@ -192,7 +203,7 @@ feishu_monitor_websocket_connected {1 if self.status["websocket_connected"] else
         
         主循环应定期调用此方法表明服务仍在运行
         """
-        self.status["last_heartbeat_time"] = time.time()
+        self._state["last_heartbeat_time"] = time.time()
     
     def start_server(self, host: str = '0.0.0.0', port: int = 8080):
         """
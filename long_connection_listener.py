@@ -1,5 +1,4 @@
 import os
-import json
 import re
 import time
 import threading
@@ -11,16 +10,23 @@ from datetime import datetime
 
 # 导入现有模块
 from auth import FeishuAuth
-from calculator import MetricsCalculator
+from calculator import MetricsCalculator, ParsedContent
+from metrics_stream import StreamingMetricsEngine
 from storage import BitableStorage, MessageArchiveStorage
 from collector import MessageCollector
-from config import CACHE_USER_NAME_SIZE, CACHE_EVENT_SIZE
+from config import EVENT_DEDUPE_DB_FILE, MESSAGE_SNAPSHOT_DB_FILE, WIKI_TOKEN_DB_FILE
+from event_dedupe import EventDedupeStore
+from metrics_registry import CACHE_HIT_RATIO, HANDLER_LATENCY, PENDING_UPDATES, QUEUE_DEPTH, STAGE_LATENCY
+from snapshot_store import MessageSnapshotStore
 from reply_card import DocCardProcessor
-from utils import ThreadSafeLRUCache
+from reply_card.render_service import get_render_service
+from reply_card.wiki_token_store import WikiTokenStore
 from storage import DocxStorage
 from message_renderer import MessageToDocxConverter
 from pin_scheduler import start_pin_scheduler, stop_pin_scheduler
 from services.announcement_service import AnnouncementService
+from services.identity_service import identity_service
+from services.async_card_service import AsyncCardService
 
 # 加载环境变量 (支持新的 config/ 目录)
 env_path = Path(__file__).parent / "config" / ".env"
@@ -38,15 +44,21 @@ ARCHIVE_DOC_TOKEN = os.getenv("ARCHIVE_DOC_TOKEN")
 ANNOUNCEMENT_TAGS = AnnouncementService.parse_tags(os.getenv("ANNOUNCEMENT_TAGS"))
 BATCH_FLUSH_INTERVAL_SECONDS = int(os.getenv("BATCH_FLUSH_INTERVAL_SECONDS", "30"))
 
-# 初始化组件
-auth = FeishuAuth()
-storage = BitableStorage(auth)
-archive_storage = MessageArchiveStorage(auth)
-collector = MessageCollector(auth)
-calculator = MetricsCalculator([])
-doc_processor = DocCardProcessor(auth)
-docx_storage = DocxStorage(auth)
-docx_converter = MessageToDocxConverter(docx_storage)
+# 运行时组件，由 init_components() 创建
+# 渲染进程池的 worker 以 spawn 方式启动时会把入口脚本作为 __mp_main__ 重新导入，
+# 模块导入阶段不得创建认证、存储、SQLite 连接或线程池
+auth = None
+storage = None
+archive_storage = None
+collector = None
+doc_processor = None
+async_card_service = None
+docx_storage = None
+docx_converter = None
+processed_events = None
+message_metric_snapshots = None
+recalled_messages_rolled_back = None
+metrics_engine = None
 
 
 # 标签映射配置
@@ -121,8 +133,11 @@ def _get_event_dedupe_key(header) -> str:
     event_id = getattr(header, "event_id", None) or "unknown"
     return f"{event_type}:{event_id}"
 
-def get_target_doc_token(message):
-    """根据消息内容获取目标文档 Token。"""
+def get_target_doc_token(message, parsed_content=None):
+    """根据消息内容获取目标文档 Token。
+
+    parsed_content: 本消息已解析的 ParsedContent（可选），非回复消息时复用，避免重复解析
+    """
 
     route_info = {
         "raw_tags": [],
@@ -135,17 +150,19 @@ def get_target_doc_token(message):
 
     # 1. 确定要检查的内容：回复消息优先看根消息标签
     check_content_str = message.content
+    check_content = parsed_content if parsed_content is not None else check_content_str
     is_reply = bool(message.parent_id or message.root_id)
     if is_reply and message.root_id:
         try:
             root_msg = collector.get_message_detail(message.root_id)
             if root_msg:
                 check_content_str = root_msg.get("body", {}).get("content", "")
+                check_content = check_content_str
         except Exception as e:
             print(f"  > [路由] 获取根消息失败: {e}")
 
     # 2. 提取纯文本并解析 hashtag
-    plain_text, _ = MetricsCalculator.extract_text_from_content(check_content_str)
+    plain_text, _ = MetricsCalculator.extract_text_from_content(check_content)
     if not plain_text and check_content_str:
         plain_text = str(check_content_str)
 
@@ -179,16 +196,6 @@ def get_target_doc_token(message):
     return None, "默认", route_info
 
 
-# 用户昵称缓存 - 使用线程安全LRU防止内存泄漏
-user_name_cache = ThreadSafeLRUCache(capacity=CACHE_USER_NAME_SIZE)
-
-# 事件去重缓存 - 使用线程安全LRU防止内存泄漏
-processed_events = ThreadSafeLRUCache(capacity=CACHE_EVENT_SIZE)
-# 消息统计快照（用于撤回事件回滚）
-message_metric_snapshots = ThreadSafeLRUCache(capacity=CACHE_EVENT_SIZE)
-# 已回滚撤回消息缓存（避免重复扣减）
-recalled_messages_rolled_back = ThreadSafeLRUCache(capacity=CACHE_EVENT_SIZE)
-
 # 批量更新配置
 BATCH_UPDATE_THRESHOLD = 3  # 每 3 条消息更新一次
 message_counter = 0
@@ -200,21 +207,10 @@ flush_worker_thread = None
 
 
 def get_cached_nickname(user_id):
-    """获取缓存的昵称，如果不存在则从 API 获取并更新缓存"""
+    """获取用户群昵称（进程内共享缓存；并发未命中合并为一次群成员查询）"""
     if not user_id:
         return user_id
-
-    cached_name = user_name_cache.get(user_id)
-    if cached_name:
-        return cached_name
-
-    print(f"正在获取用户 {user_id} 的群备注...")
-    names = collector.get_user_names([user_id])
-    if names:
-        for uid, name in names.items():
-            user_name_cache.set(uid, name)
-
-    return user_name_cache.get(user_id, user_id)
+    return identity_service.get_name(user_id, fetch_names=collector.get_user_names)
 
 
 def accumulate_metrics(user_id: str, user_name: str, metrics_delta: dict):
@@ -240,6 +236,67 @@ def accumulate_metrics(user_id: str, user_name: str, metrics_delta: dict):
                 pending_updates[user_id]["metrics"][key] += value
 
 
+def _write_metrics_now(user_id: str, user_name: str, metrics_delta: dict):
+    """立即写入指标增量（点赞、撤回回滚等不经批量队列的场景）"""
+    storage.update_or_create_record(
+        user_id=user_id,
+        user_name=user_name or get_cached_nickname(user_id),
+        metrics_delta=metrics_delta,
+    )
+
+
+def init_components():
+    """创建运行时组件（认证、存储、SQLite 持久化、单聊处理线程池）并登记 /metrics 仪表盘"""
+    global auth, storage, archive_storage, collector, doc_processor, async_card_service
+    global docx_storage, docx_converter, processed_events, message_metric_snapshots
+    global recalled_messages_rolled_back, metrics_engine
+
+    auth = FeishuAuth()
+    storage = BitableStorage(auth)
+    archive_storage = MessageArchiveStorage(auth)
+    collector = MessageCollector(auth)
+    # Wiki 链接解析结果持久化，重启后同一链接无需再遍历知识空间
+    doc_processor = DocCardProcessor(
+        auth,
+        wiki_token_store=WikiTokenStore(os.getenv("WIKI_TOKEN_DB_PATH") or Path(__file__).parent / WIKI_TOKEN_DB_FILE),
+    )
+    # 单聊文档链接两阶段回复：先发占位提示，后台生成卡片
+    async_card_service = AsyncCardService(doc_processor)
+    docx_storage = DocxStorage(auth)
+    docx_converter = MessageToDocxConverter(docx_storage)
+
+    # 事件去重存储 - 持久化到 SQLite，重连/重启后飞书重推的事件不会被重复统计
+    processed_events = EventDedupeStore(
+        os.getenv("EVENT_DEDUPE_DB_PATH") or Path(__file__).parent / EVENT_DEDUPE_DB_FILE
+    )
+    # 消息统计快照（用于撤回事件回滚）- 定长记录持久化到 SQLite，保留期覆盖飞书可撤回时限
+    message_metric_snapshots = MessageSnapshotStore(
+        os.getenv("MESSAGE_SNAPSHOT_DB_PATH") or Path(__file__).parent / MESSAGE_SNAPSHOT_DB_FILE
+    )
+    # 已回滚撤回消息标记（与快照同库存放，避免重复扣减）
+    recalled_messages_rolled_back = message_metric_snapshots.retracted
+
+    # 统一计分引擎：消息贡献累积到批量待更新队列，贡献快照用于撤回回滚
+    metrics_engine = StreamingMetricsEngine(
+        sink=accumulate_metrics,
+        contributions=message_metric_snapshots,
+        retracted=recalled_messages_rolled_back,
+    )
+
+    # /metrics 抓取时读取的运行状态
+    PENDING_UPDATES.set_function(lambda: len(pending_updates))
+    QUEUE_DEPTH.set_function(lambda: get_render_service().pending, queue="render")
+    QUEUE_DEPTH.set_function(lambda: async_card_service.pending, queue="async_card")
+    for cache_name, cache in (
+        ("identity", identity_service.cache),
+        ("wiki_resolution", doc_processor.wiki_resolutions),
+        ("mcp_doc", doc_processor.mcp_client.doc_cache),
+        ("rendered_card", doc_processor.rendered_cards),
+    ):
+        CACHE_HIT_RATIO.set_function(lambda cache=cache: cache.stats()["hit_rate"], cache=cache_name)
+
+
+@STAGE_LATENCY.timed(stage="flush")
 def flush_pending_updates():
     """批量更新所有待处理的用户统计（线程安全）"""
     global pending_updates, pending_updates_lock
@@ -328,15 +385,7 @@ def stop_flush_worker():
         flush_worker_thread.join(timeout=2)
 
 
-def _negate_metrics(metrics_delta: dict) -> dict:
-    """返回指标增量的反向值。"""
-    negated = {}
-    for key, value in (metrics_delta or {}).items():
-        if isinstance(value, (int, float)) and value:
-            negated[key] = -value
-    return negated
-
-
+@HANDLER_LATENCY.timed(handler="message_receive")
 def do_p2_im_message_receive_v1(data: lark.im.v1.P2ImMessageReceiveV1) -> None:
     """处理接收消息 v2.0 事件"""
     from health_monitor import update_event_processed
@@ -357,10 +406,9 @@ def do_p2_im_message_receive_v1(data: lark.im.v1.P2ImMessageReceiveV1) -> None:
 
     # 0. 事件去重
     dedupe_key = _get_event_dedupe_key(data.header)
-    if dedupe_key in processed_events:
+    if not processed_events.mark_if_new(dedupe_key):
         print(f"  > [拦截] 该事件已处理过，跳过 (去重)")
         return
-    processed_events.set(dedupe_key, True)
 
     # 获取发送者 OpenID
     sender_id = _extract_sender_id(sender)
@@ -368,6 +416,9 @@ def do_p2_im_message_receive_v1(data: lark.im.v1.P2ImMessageReceiveV1) -> None:
         print(f"  > [拦截] 无法获取 sender_id")
         return
 
+    # 消息 content 只解析一次，供单聊、路由、字数统计、公告识别与文档渲染共享
+    parsed_content = ParsedContent(message.content)
+
     # 1. 识别聊天类型并执行过滤
     chat_type = message.chat_type  # 'p2p' 或 'group'
     is_p2p = (chat_type == "p2p")
@@ -380,27 +431,25 @@ def do_p2_im_message_receive_v1(data: lark.im.v1.P2ImMessageReceiveV1) -> None:
         print(f"  > [单聊] 收到单聊消息，准备处理...")
         try:
             # 优先复用已验证稳定的提取逻辑
-            message_text, _ = MetricsCalculator.extract_text_from_content(message.content)
-            message_text = (message_text or "").strip()
+            message_text = (parsed_content.text or "").strip()
 
-            # 先尝试按文档链接处理（与 1.py 行为一致）
-            processed = doc_processor.process_and_reply(message_text, message.chat_id)
+            # 先尝试按文档链接处理：立即发送占位提示，卡片在后台生成
+            processed = async_card_service.process_message(message_text, message.chat_id)
 
             # 兜底：部分消息结构里链接只存在于原始 JSON 文本中
             if not processed and message.content and message.content != message_text:
-                processed = doc_processor.process_and_reply(message.content, message.chat_id)
+                processed = async_card_service.process_message(message.content, message.chat_id)
 
             if processed:
-                print(f"  > [单聊] ✅ 文档链接处理成功")
+                print(f"  > [单聊] ✅ 文档链接已受理")
             elif message_text:
                 # 纯文本消息，使用白卡样式（不显示标题栏）
                 print(f"  > [单聊] 收到纯文本: {message_text[:50]}...")
                 try:
-                    from reply_card.card_style_generator import CardStyleImageGenerator
-                    generator = CardStyleImageGenerator()
-                    image_data = generator.generate_card_image("", message_text)
-                    doc_processor._send_image_reply(message.chat_id, image_data)
-                    print(f"  > [单聊] ✅ 纯文本图片发送成功")
+                    if doc_processor.send_card_image(message.chat_id, "", message_text):
+                        print(f"  > [单聊] ✅ 纯文本图片发送成功")
+                    else:
+                        print(f"  > [单聊] ❌ 纯文本图片未发送（渲染繁忙/超时或发送失败）")
                 except Exception as e:
                     print(f"  > [单聊] ❌ 图片生成失败: {e}")
                     import traceback
@@ -426,7 +475,8 @@ def do_p2_im_message_receive_v1(data: lark.im.v1.P2ImMessageReceiveV1) -> None:
     # 2) 未知标签/无标签/标签异常 -> 不归档文档，但继续统计活跃值
     archive_status_message = "未命中归档规则，不归档文档，但已计入活跃值"
     try:
-        target_doc_token, matched_tag, route_info = get_target_doc_token(message)
+        with STAGE_LATENCY.time(stage="route"):
+            target_doc_token, matched_tag, route_info = get_target_doc_token(message, parsed_content)
     except Exception as e:
         target_doc_token = None
         matched_tag = "默认"
@@ -484,7 +534,7 @@ def do_p2_im_message_receive_v1(data: lark.im.v1.P2ImMessageReceiveV1) -> None:
             tag_to_remove = matched_tag if route_info.get("matched") else None
 
             blocks = docx_converter.convert(
-                message.content,
+                parsed_content,
                 message.message_id,
                 target_doc_token,
                 sender_name=sender_nickname,
@@ -493,7 +543,8 @@ def do_p2_im_message_receive_v1(data: lark.im.v1.P2ImMessageReceiveV1) -> None:
                 parent_sender_name=parent_sender_nickname,
                 remove_tag=tag_to_remove,
             )
-            docx_storage.add_blocks(target_doc_token, blocks, insert_before_divider=is_reply)
+            with STAGE_LATENCY.time(stage="docx_write"):
+                docx_storage.add_blocks(target_doc_token, blocks, insert_before_divider=is_reply)
             print(f"  > [归档] ✅ 群消息已同步 (标签: {matched_tag}, Doc: {target_doc_token[-6:]})")
             archive_status_message = "已归档到标签文档，并已计入活跃值"
         except Exception as e:
@@ -513,8 +564,7 @@ def do_p2_im_message_receive_v1(data: lark.im.v1.P2ImMessageReceiveV1) -> None:
         elif reason == "tag_parse_error":
             archive_status_message = "标签解析异常，不归档文档，但已计入活跃值"
 
-    content_str = message.content
-    char_count = calculator._extract_text_length(content_str)
+    char_count = parsed_content.text_length
 
     print(f"  > 消息ID: {message.message_id}")
     print(f"  > 父ID (parent_id): {message.parent_id or 'None'}")
@@ -525,11 +575,11 @@ def do_p2_im_message_receive_v1(data: lark.im.v1.P2ImMessageReceiveV1) -> None:
 
     # [公告归档] 仅识别公告标签消息并写入 Bitable
     try:
-        if AnnouncementService.is_announcement_message(content_str, ANNOUNCEMENT_TAGS):
+        if AnnouncementService.is_announcement_message(parsed_content, ANNOUNCEMENT_TAGS):
             if not archive_storage.archive_table_id:
                 print("  > [公告归档] ⚠️ 未配置 ARCHIVE_TABLE_ID，跳过公告归档")
             else:
-                text_content_for_db, _ = MetricsCalculator.extract_text_from_content(message.content)
+                text_content_for_db = parsed_content.text
                 create_time_ms = int(message.create_time) if message.create_time else int(datetime.now().timestamp() * 1000)
 
                 archive_fields = _build_archive_fields(
@@ -548,77 +598,31 @@ def do_p2_im_message_receive_v1(data: lark.im.v1.P2ImMessageReceiveV1) -> None:
     except Exception as e:
         print(f"  > [公告归档] ❌ 归档失败: {e}")
 
-    # 4. 构建指标增量
-    metrics_delta = {
-        "message_count": 1,
-        "char_count": char_count,
-        "reply_received": 0,
-        "mention_received": 0,
-        "topic_initiated": 1 if not message.root_id else 0,
-    }
-
-    # 5. 累积到批量更新字典 (替代原来的实时更新)
+    # 4~7. 按统一计分规则计算本消息贡献（发言、发起话题、被回复、被@），累积到批量更新队列
+    #      同时记录贡献快照，用于撤回回滚
     global message_counter
-    accumulate_metrics(sender_id, user_name, metrics_delta)
+    contribution = metrics_engine.feed(
+        {
+            "message_id": message.message_id,
+            "chat_id": message.chat_id,
+            "sender_id": sender_id,
+            "sender_name": user_name,
+            "char_count": char_count,
+            "root_id": message.root_id,
+            "parent_id": message.parent_id,
+            "mention_ids": [mention.id.open_id for mention in (message.mentions or [])],
+        },
+        resolve_sender=collector.get_message_sender,
+        name_of=get_cached_nickname,
+    )
     print(f"  > [归档/统计] {archive_status_message}")
 
-    # 为撤回回滚记录快照（消息发送者基础指标）
-    message_snapshot = {
-        "message_id": message.message_id,
-        "chat_id": message.chat_id,
-        "sender_id": sender_id,
-        "sender_name": user_name,
-        "sender_metrics": dict(metrics_delta),
-        "reply_target": None,
-        "mention_targets": [],
-    }
-
-    # 6. 特殊逻辑：处理被回复的情况
-    parent_id = message.parent_id
-    root_id = message.root_id
-    already_credited_ids = set()  # 记录本消息中已经获得"被回复"积分的人
-
-    if parent_id:
-        # 识别目标用户 ID (target_parent_id)
-        target_parent_id = None
-
-        # 启发式逻辑：在话题群中，parent_id 和 root_id 通常相同且指向话题头
-        if parent_id == root_id and message.mentions:
-            target_parent_id = message.mentions[0].id.open_id
-            print(f"  > [探测] 识别到话题嵌套回复: 使用首个艾特对象 {target_parent_id}")
-        else:
-            # 普通群或直接回复话题，使用父消息发送者
-            target_parent_id = collector.get_message_sender(parent_id)
-
-        if target_parent_id:
-            # 获取被回复者昵称并累积
-            target_user_name = get_cached_nickname(target_parent_id)
-            print(f"  > [更新] 增加被回复数给: {target_user_name}")
-            accumulate_metrics(target_parent_id, target_user_name, {"reply_received": 1})
-            already_credited_ids.add(target_parent_id)
-            message_snapshot["reply_target"] = {
-                "user_id": target_parent_id,
-                "user_name": target_user_name,
-            }
-
-    # 7. 处理被 @ 的人
-    if message.mentions:
-        for mention in message.mentions:
-            mentioned_id = mention.id.open_id
-            if mentioned_id:
-                # 如果该用户刚才已经因为"被回复"加过分了，这次 @ 就跳过，避免重复计费
-                if mentioned_id in already_credited_ids:
-                    print(f"  > [跳过] {mentioned_id} 已在本次统计中作为被回复者，跳过艾特计费")
-                    continue
-
-                mentioned_name = get_cached_nickname(mentioned_id)
-                print(f"  > [更新] 增加被艾特数给: {mentioned_name}")
-                accumulate_metrics(mentioned_id, mentioned_name, {"mention_received": 1})
-                message_snapshot["mention_targets"].append(
-                    {"user_id": mentioned_id, "user_name": mentioned_name}
-                )
-
-    message_metric_snapshots.set(message.message_id, message_snapshot)
+    if contribution:
+        reply_target = contribution.get("reply_target")
+        if reply_target:
+            print(f"  > [更新] 增加被回复数给: {reply_target['user_name']}")
+        for mention_target in contribution.get("mention_targets", []):
+            print(f"  > [更新] 增加被艾特数给: {mention_target['user_name']}")
 
     # 8. 检查是否需要批量更新
     message_counter += 1
@@ -630,21 +634,24 @@ def do_p2_im_message_receive_v1(data: lark.im.v1.P2ImMessageReceiveV1) -> None:
     print("✅ 消息处理完成")
 
 
-def _process_message_attachments(message, message_id: str) -> list:
+def _process_message_attachments(message, message_id: str, parsed_content=None) -> tuple:
     """
     处理消息附件（图片和文件）
 
     Args:
         message: 消息对象
         message_id: 消息ID
+        parsed_content: 本消息已解析的 ParsedContent（可选），传入时复用，避免重复解析
 
     Returns:
-        file_tokens列表，包含上传后的附件信息
+        (file_tokens, text_content)：上传后的附件信息列表与纯文本归档内容
     """
     file_tokens = []
 
     # 提取纯文本归档内容和嵌入图片 keys
-    text_content, embedded_image_keys = MetricsCalculator.extract_text_from_content(message.content)
+    if parsed_content is None:
+        parsed_content = ParsedContent(message.content)
+    text_content, embedded_image_keys = parsed_content.text, parsed_content.image_keys
 
     # 处理富文本中嵌入的图片
     if embedded_image_keys:
@@ -657,12 +664,7 @@ def _process_message_attachments(message, message_id: str) -> list:
                     file_tokens.append(attachment_obj)
 
     # 解析content获取文件信息
-    try:
-        content_obj = (
-            json.loads(message.content) if isinstance(message.content, str) else message.content
-        )
-    except (json.JSONDecodeError, ValueError):
-        content_obj = {}
+    content_obj = parsed_content.obj if isinstance(parsed_content.obj, dict) else {}
 
     # 处理独立的图片消息
     if message.message_type == "image":
@@ -726,15 +728,15 @@ def _build_archive_fields(
 
 
 
+@HANDLER_LATENCY.timed(handler="reaction_created")
 def do_p2_im_message_reaction_created_v1(data: lark.im.v1.P2ImMessageReactionCreatedV1) -> None:
     """处理表情回复事件（点赞）"""
     from health_monitor import update_event_processed
     
     # 0. 事件去重
     dedupe_key = _get_event_dedupe_key(data.header)
-    if dedupe_key in processed_events:
+    if not processed_events.mark_if_new(dedupe_key):
         return
-    processed_events.set(dedupe_key, True)  # LRU会自动管理容量，无需手动清理
 
     event = data.event
     
@@ -771,20 +773,12 @@ def do_p2_im_message_reaction_created_v1(data: lark.im.v1.P2ImMessageReactionCre
         print(f"  > 点赞者: {operator_name}")
         print(f"  > 被点赞者: {receiver_name}")
 
-        # 3. 更新点赞者的"点赞数"
-        storage.update_or_create_record(
-            user_id=operator_id, user_name=operator_name, metrics_delta={"reaction_given": 1}
-        )
-
-        # 4. 更新被点赞者的"被点赞数"
-        if message_sender_id != operator_id:  # 避免自己给自己点赞的情况
-            storage.update_or_create_record(
-                user_id=message_sender_id,
-                user_name=receiver_name,
-                metrics_delta={"reaction_received": 1},
-            )
-        else:
+        # 3. 更新点赞者的"点赞数"与被点赞者的"被点赞数"（自己给自己点赞不计被点赞数）
+        if message_sender_id == operator_id:
             print(f"  > [跳过] 用户给自己点赞")
+        metrics_engine.feed_reaction(
+            operator_id, operator_name, message_sender_id, receiver_name, sign=1, sink=_write_metrics_now
+        )
 
         print("✅ 表情回复统计成功")
 
@@ -792,14 +786,14 @@ def do_p2_im_message_reaction_created_v1(data: lark.im.v1.P2ImMessageReactionCre
         print(f"❌ 表情回复统计失败: {e}")
 
 
+@HANDLER_LATENCY.timed(handler="reaction_deleted")
 def do_p2_im_message_reaction_deleted_v1(data: lark.im.v1.P2ImMessageReactionDeletedV1) -> None:
     """处理表情取消事件（回滚点赞统计）。"""
     from health_monitor import update_event_processed
 
     dedupe_key = _get_event_dedupe_key(data.header)
-    if dedupe_key in processed_events:
+    if not processed_events.mark_if_new(dedupe_key):
         return
-    processed_events.set(dedupe_key, True)
 
     event = data.event
     update_event_processed("reaction")
@@ -823,34 +817,25 @@ def do_p2_im_message_reaction_deleted_v1(data: lark.im.v1.P2ImMessageReactionDel
         operator_name = get_cached_nickname(operator_id)
         receiver_name = get_cached_nickname(message_sender_id)
 
-        storage.update_or_create_record(
-            user_id=operator_id,
-            user_name=operator_name,
-            metrics_delta={"reaction_given": -1},
-        )
-
-        if message_sender_id != operator_id:
-            storage.update_or_create_record(
-                user_id=message_sender_id,
-                user_name=receiver_name,
-                metrics_delta={"reaction_received": -1},
-            )
-        else:
+        if message_sender_id == operator_id:
             print("  > [跳过] 用户取消自己的点赞，不回滚被点赞数")
+        metrics_engine.feed_reaction(
+            operator_id, operator_name, message_sender_id, receiver_name, sign=-1, sink=_write_metrics_now
+        )
 
         print("✅ 表情取消回滚成功")
     except Exception as e:
         print(f"❌ 表情取消回滚失败: {e}")
 
 
+@HANDLER_LATENCY.timed(handler="message_recalled")
 def do_p2_im_message_recalled_v1(data: lark.im.v1.P2ImMessageRecalledV1) -> None:
     """处理消息撤回事件（回滚活跃度统计）。"""
     from health_monitor import update_event_processed
 
     dedupe_key = _get_event_dedupe_key(data.header)
-    if dedupe_key in processed_events:
+    if not processed_events.mark_if_new(dedupe_key):
         return
-    processed_events.set(dedupe_key, True)
 
     event = data.event
     message_id = event.message_id
@@ -881,33 +866,8 @@ def do_p2_im_message_recalled_v1(data: lark.im.v1.P2ImMessageRecalledV1) -> None
         return
 
     try:
-        sender_delta = _negate_metrics(snapshot.get("sender_metrics", {}))
-        if sender_delta:
-            storage.update_or_create_record(
-                user_id=snapshot.get("sender_id"),
-                user_name=snapshot.get("sender_name") or get_cached_nickname(snapshot.get("sender_id")),
-                metrics_delta=sender_delta,
-            )
-
-        reply_target = snapshot.get("reply_target")
-        if reply_target and reply_target.get("user_id"):
-            storage.update_or_create_record(
-                user_id=reply_target["user_id"],
-                user_name=reply_target.get("user_name") or get_cached_nickname(reply_target["user_id"]),
-                metrics_delta={"reply_received": -1},
-            )
-
-        for mention_target in snapshot.get("mention_targets", []):
-            user_id = mention_target.get("user_id")
-            if not user_id:
-                continue
-            storage.update_or_create_record(
-                user_id=user_id,
-                user_name=mention_target.get("user_name") or get_cached_nickname(user_id),
-                metrics_delta={"mention_received": -1},
-            )
-
-        recalled_messages_rolled_back.set(message_id, True)
+        # 按贡献快照回滚发送者指标、被回复者与被@者计数；全部写入成功后才记为已回滚
+        metrics_engine.retract(message_id, sink=_write_metrics_now, name_of=get_cached_nickname)
         print("✅ 消息撤回回滚成功")
     except Exception as e:
         print(f"❌ 消息撤回回滚失败: {e}")
@@ -921,9 +881,8 @@ def do_p2_im_chat_access_event_bot_p2p_chat_entered_v1(data) -> None:
 def do_p2_customized_event_p2p_chat_create(data) -> None:
     """忽略 p2p_chat_create 事件，避免 WS 层报 processor not found。"""
     dedupe_key = _get_event_dedupe_key(data.header)
-    if dedupe_key in processed_events:
+    if not processed_events.mark_if_new(dedupe_key):
         return
-    processed_events.set(dedupe_key, True)
     print("  > [事件] 已忽略 p2p_chat_create")
 
 
@@ -960,6 +919,8 @@ def main():
         print(f"\n❌ 启动失败：{e}")
         print("\n请检查 .env 文件配置，参考 .env.example 模板")
         return
+
+    init_components()
     
     # ========== 2. 启动健康检查服务 ==========
     health_port = int(os.getenv("HEALTH_CHECK_PORT", 8080))
@@ -976,6 +937,13 @@ def main():
         print(f"⚠️  批量刷新线程启动失败: {e}")
         print("   将继续运行主服务（仍可依赖阈值刷新）")
     
+    # 启动卡片图片渲染进程池（worker 预热字体与模板）
+    try:
+        get_render_service().start()
+    except Exception as e:
+        print(f"⚠️  渲染进程池启动失败: {e}")
+        print("   单聊卡片将在首次请求时再尝试创建进程池")
+
     # ========== 3. 自动重连循环 ==========
     retry_count = 0
     max_retries = int(os.getenv("MAX_RETRIES", 10))  # 最大重试次数
@@ -1008,7 +976,7 @@ def main():
             else:
                 print(f"🔄 正在重新连接 (尝试 {retry_count + 1}/{max_retries})")
             print(f"📅 系统时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            print(f"✨ 特性: 环境验证 | 健康检查:{health_port} | 自动重连 | LRU缓存 | API限流")
+            print(f"✨ 特性: 环境验证 | 健康检查:{health_port} | 自动重连 | TTL缓存 | API限流")
             print("=" * 60 + "\n")
             
             # 更新健康状态
@@ -1065,6 +1033,9 @@ def main():
     
     # ========== 4. 清理和退出 ==========
     stop_flush_worker()
+    async_card_service.shutdown()
+    doc_processor.close()
+    get_render_service().shutdown()
     maybe_flush_pending_updates(force=True, reason="process_exit")
     print("\n" + "=" * 60)
     print("✅ 程序已安全退出")
@@ -5,8 +5,9 @@
 支持文本样式(加粗/斜体/下划线/删除线)、链接、图片、@提及等元素的转换
 """
 
-import json
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Union
+
+from calculator import ParsedContent
 
 class MessageToDocxConverter:
     """
@@ -20,7 +21,7 @@ class MessageToDocxConverter:
         """
         self.storage = storage_client
 
-    def convert(self, message_content_json: str, message_id: str, doc_id: str, 
+    def convert(self, message_content_json: Union[str, ParsedContent], message_id: str, doc_id: str, 
                 sender_name: str = "", send_time: str = "", 
                 is_reply: bool = False, parent_sender_name: str = None,
                 remove_tag: str = None) -> List[Dict[str, Any]]:
@@ -28,7 +29,7 @@ class MessageToDocxConverter:
         将消息内容转换为Docx Block列表
         
         Args:
-            message_content_json: 消息内容的JSON字符串
+            message_content_json: 消息内容的JSON字符串（或已解析的 ParsedContent，复用解析结果）
             message_id: 原始消息ID(用于下载资源)
             doc_id: 目标文档ID(用于上传资源挂载)
             sender_name: 发送者昵称
@@ -76,9 +77,10 @@ class MessageToDocxConverter:
                 self._create_text_run(header_text, {"bold": True})
             ]))
         
-        try:
-            content_obj = json.loads(message_content_json)
-        except json.JSONDecodeError:
+        parsed_content = ParsedContent.of(message_content_json)
+        message_content_json = parsed_content.raw
+        content_obj = parsed_content.obj
+        if parsed_content.parse_error:
             # 如果不是JSON，当作纯文本处理（检查是否是代码块）
             if message_content_json.strip().startswith('```'):
                 # 处理代码块
@@ -0,0 +1,375 @@
+"""
+运行指标注册表
+
+提供计数器、直方图与仪表盘指标，按 Prometheus 文本格式导出，由 /metrics 端点统一输出：
+- 计数器：事件、消息、表情回复、错误总数
+- 直方图：事件处理器、飞书接口、处理阶段（路由、渲染、文档写入、批量刷新）耗时
+- 仪表盘：待更新队列大小、任务队列深度、缓存命中率等，可在抓取时通过回调取值
+
+计数器与直方图按线程分片累加：每个线程只写自己的分片，打点路径无锁、无竞争，
+抓取时合并全部分片。已退出线程的分片在合并时折叠进汇总值，不会丢失计数
+
+仅依赖标准库，业务模块可直接导入打点，不引入 Flask 依赖
+"""
+
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# 默认桶覆盖 5ms ~ 60s：事件路由为毫秒级，MCP 获取与渲染可达数十秒
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    """格式化样本值（Prometheus 文本格式）"""
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if math.isnan(value):
+        return "NaN"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape_label(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _ThreadShards:
+    """
+    按线程分片的累加单元
+
+    每个线程持有独立的 {标签值: 数值列表}，只有所属线程会写入，自增无需加锁也不会丢失更新；
+    锁只在线程首次写入（登记分片）与抓取合并时使用
+    """
+
+    def __init__(self, width: int):
+        self.width = width
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[Tuple[threading.Thread, Dict[LabelValues, list]]] = []
+        # 已退出线程的分片合并结果
+        self._retired: Dict[LabelValues, list] = {}
+
+    def cell(self, key: LabelValues) -> list:
+        """当前线程在该标签组合下的数值列表（仅可由当前线程修改）"""
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._retire_dead_shards()
+                self._shards.append((threading.current_thread(), shard))
+        cell = shard.get(key)
+        if cell is None:
+            cell = shard[key] = [0] * self.width
+        return cell
+
+    def _retire_dead_shards(self) -> None:
+        # 调用方持有 self._lock；线程已退出后其分片不再变化，可安全折叠
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                self._fold(self._retired, shard)
+        self._shards = alive
+
+    def _fold(self, target: Dict[LabelValues, list], shard: Dict[LabelValues, list]) -> None:
+        for key, cell in shard.copy().items():
+            merged = target.get(key)
+            if merged is None:
+                merged = target[key] = [0] * self.width
+            for i, value in enumerate(list(cell)):
+                merged[i] += value
+
+    def merged(self) -> Dict[LabelValues, list]:
+        """合并全部分片，返回 {标签值: 数值列表} 的副本"""
+        with self._lock:
+            self._retire_dead_shards()
+            result = {key: list(cell) for key, cell in self._retired.items()}
+            for _thread, shard in self._shards:
+                self._fold(result, shard)
+        return result
+
+
+class _Metric:
+    """指标基类：名称、说明与标签维度"""
+
+    TYPE = ""
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _label_values(self, labels: Dict[str, str]) -> LabelValues:
+        if not labels and not self.label_names:
+            return ()
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"指标 {self.name} 需要标签 {self.label_names}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """导出为 Prometheus 文本格式（含 HELP/TYPE）"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        lines.extend(self._samples())
+        return "\n".join(lines) + "\n"
+
+
+class Counter(_Metric):
+    """
+    单调递增计数器
+
+    Example:
+        >>> events = Counter("demo_events_total", "示例事件数", ("type",))
+        >>> events.inc(type="message")
+        >>> events.value(type="message")
+        1
+    """
+
+    TYPE = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._shards = _ThreadShards(1)
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """计数增加 amount（须为非负数）"""
+        if amount < 0:
+            raise ValueError(f"计数器 {self.name} 只能增加")
+        self._shards.cell(self._label_values(labels))[0] += amount
+
+    def value(self, **labels: str) -> float:
+        """读取合并后的当前值"""
+        cell = self._shards.merged().get(self._label_values(labels))
+        return cell[0] if cell else 0
+
+    def _samples(self) -> List[str]:
+        series = self._shards.merged()
+        if not self.label_names and not series:
+            # 无标签计数器即使尚未计数也输出 0，便于 rate() 计算
+            series = {(): [0]}
+        return [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(series[key][0])}"
+            for key in sorted(series)
+        ]
+
+
+class Histogram(_Metric):
+    """
+    耗时直方图
+
+    Example:
+        >>> latency = Histogram("demo_seconds", "示例耗时", ("stage",))
+        >>> latency.observe(0.2, stage="render")
+        >>> with latency.time(stage="route"):
+        ...     pass
+    """
+
+    TYPE = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(float(b) for b in buckets if not math.isinf(b)))
+        # 每个标签组合一个数值列表：各桶计数（非累计，最后一桶为 +Inf），末位为总和
+        self._shards = _ThreadShards(len(self.buckets) + 2)
+
+    def observe(self, value: float, **labels: str) -> None:
+        """记录一次观测值（秒）"""
+        cell = self._shards.cell(self._label_values(labels))
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """计时上下文：代码块结束（包括抛出异常）时记录耗时"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def timed(self, **labels: str) -> Callable:
+        """计时装饰器：记录被装饰函数每次调用的耗时"""
+
+        def decorator(func: Callable) -> Callable:
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def snapshot(self, **labels: str) -> Optional[Dict[str, object]]:
+        """读取某一标签组合的累计桶计数、总和与次数，未观测过返回 None"""
+        cell = self._shards.merged().get(self._label_values(labels))
+        if cell is None:
+            return None
+        cumulative, running = [], 0
+        for count in cell[:-1]:
+            running += count
+            cumulative.append(running)
+        return {
+            "buckets": dict(zip(self.buckets + (math.inf,), cumulative)),
+            "sum": cell[-1],
+            "count": running,
+        }
+
+    def _samples(self) -> List[str]:
+        series = self._shards.merged()
+        lines = []
+        bounds = self.buckets + (math.inf,)
+        for key in sorted(series):
+            counts, total = series[key][:-1], series[key][-1]
+            running = 0
+            for bound, count in zip(bounds, counts):
+                running += count
+                labels = _format_labels(self.label_names + ("le",), key + (_format_value(bound),))
+                lines.append(f"{self.name}_bucket{labels} {running}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {running}")
+        return lines
+
+
+class Gauge(_Metric):
+    """
+    仪表盘指标：可直接设置数值，也可注册回调在抓取时取值
+
+    Example:
+        >>> depth = Gauge("demo_queue_depth", "示例队列深度", ("queue",))
+        >>> depth.set(3, queue="render")
+        >>> depth.set_function(lambda: 5, queue="async_card")
+    """
+
+    TYPE = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[LabelValues, float] = {}
+        self._functions: Dict[LabelValues, Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._label_values(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def set_function(self, func: Callable[[], float], **labels: str) -> None:
+        """注册取值回调，每次抓取时调用；回调异常时该样本跳过"""
+        key = self._label_values(labels)
+        with self._lock:
+            self._functions[key] = func
+
+    def value(self, **labels: str) -> Optional[float]:
+        """读取当前值，未设置返回 None"""
+        key = self._label_values(labels)
+        with self._lock:
+            func = self._functions.get(key)
+            value = self._values.get(key)
+        if func is not None:
+            try:
+                return float(func())
+            except Exception:
+                return None
+        return value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            keys = set(self._values) | set(self._functions)
+        lines = []
+        for key in sorted(keys):
+            value = self.value(**dict(zip(self.label_names, key)))
+            if value is not None:
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    指标注册表：按名称登记指标，统一导出
+
+    同名指标重复登记时返回已有实例，便于各模块在导入时声明所需指标
+    """
+
+    def __init__(self, prefix: str = "feishu_monitor"):
+        self.prefix = prefix
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, documentation: str, label_names: Sequence[str], **kwargs) -> _Metric:
+        full_name = f"{self.prefix}_{name}" if self.prefix else name
+        with self._lock:
+            metric = self._metrics.get(full_name)
+            if metric is None:
+                metric = self._metrics[full_name] = cls(full_name, documentation, label_names, **kwargs)
+            elif not isinstance(metric, cls) or metric.label_names != tuple(label_names):
+                raise ValueError(f"指标 {full_name} 已以不同类型或标签登记")
+            return metric
+
+    def counter(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, label_names)
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram, name, documentation, label_names, buckets=buckets)
+
+    def gauge(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, label_names)
+
+    def render(self) -> str:
+        """导出全部指标（Prometheus 文本格式）"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics)
+
+
+# 进程内共享的注册表，/metrics 端点导出其中全部指标
+registry = MetricsRegistry()
+
+# ========== 计数器 ==========
+EVENTS_TOTAL = registry.counter("events_total", "处理的事件总数")
+MESSAGES_TOTAL = registry.counter("messages_total", "处理的消息总数")
+REACTIONS_TOTAL = registry.counter("reactions_total", "处理的表情回复总数")
+ERRORS_TOTAL = registry.counter("errors_total", "错误总数")
+
+# ========== 耗时直方图 ==========
+HANDLER_LATENCY = registry.histogram("handler_duration_seconds", "事件处理器耗时（秒）", ("handler",))
+API_LATENCY = registry.histogram("feishu_api_duration_seconds", "飞书接口调用耗时（秒，按接口封装函数）", ("endpoint",))
+STAGE_LATENCY = registry.histogram("stage_duration_seconds", "处理阶段耗时（秒）", ("stage",))
+RATE_LIMIT_WAIT = registry.histogram("rate_limiter_wait_seconds", "API 限流等待耗时（秒）")
+
+# ========== 仪表盘 ==========
+PENDING_UPDATES = registry.gauge("pending_updates", "待批量写入的用户数")
+QUEUE_DEPTH = registry.gauge("queue_depth", "任务队列深度（排队与进行中）", ("queue",))
+CACHE_HIT_RATIO = registry.gauge("cache_hit_ratio", "缓存命中率", ("cache",))
@@ -0,0 +1,277 @@
+"""
+流式活跃度指标引擎
+
+将"发言 / 被回复 / 被@ / 发起话题 / 点赞"的计分规则集中在一处，按事件增量计算：
+- feed(event): 处理一条消息事件，O(1) 更新，返回该消息的贡献快照
+- retract(message_id): 按贡献快照回滚一条消息（撤回），幂等
+- feed_reaction(...): 点赞 / 取消点赞
+- snapshot(): 当前累计的各用户指标
+
+实时监听、撤回回滚与历史回填共用同一引擎，规则与性能优化只维护一份。
+状态有界：贡献快照、已回滚记录默认为固定容量的 LRU 缓存（实时监听注入持久化的
+snapshot_store.MessageSnapshotStore），消息发送者索引为 LRU 缓存，累计指标按用户聚合，规模与群成员数同阶。
+"""
+
+import copy
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import CACHE_EVENT_SIZE
+from utils import ThreadSafeLRUCache
+
+# (user_id, user_name, metrics_delta)
+MetricsDelta = Tuple[str, str, Dict[str, int]]
+Sink = Callable[[str, str, Dict[str, int]], None]
+
+
+def initiates_topic(root_id: Optional[str]) -> bool:
+    """
+    话题发起规则：不属于任何话题（无 root_id）的消息即计一次发起话题
+
+    实时监听、历史回填与 calculator.MetricsCalculator 批量计算共用此规则；
+    不以"是否收到回复"为条件，消息到达时即可确定，撤回回滚也无需追溯后续回复
+    """
+    return not root_id
+
+
+class StreamingMetricsEngine:
+    """
+    流式活跃度指标引擎
+
+    消息事件为 dict，字段:
+        message_id, chat_id, sender_id, sender_name, char_count,
+        root_id, parent_id, mention_ids (按消息中出现顺序的 open_id 列表)
+
+    Example:
+        >>> engine = StreamingMetricsEngine()
+        >>> _ = engine.feed({"message_id": "om_1", "sender_id": "ou_a", "char_count": 5})
+        >>> engine.snapshot()["ou_a"]["metrics"]["message_count"]
+        1
+    """
+
+    def __init__(
+        self,
+        capacity: int = CACHE_EVENT_SIZE,
+        sink: Optional[Sink] = None,
+        contributions: Optional[ThreadSafeLRUCache] = None,
+        retracted: Optional[ThreadSafeLRUCache] = None,
+    ):
+        """
+        初始化引擎
+
+        Args:
+            capacity: 贡献快照 / 回滚记录 / 发送者索引的缓存容量
+            sink: 默认指标增量输出 (user_id, user_name, delta)，如实时监听的批量待更新队列
+            contributions: 贡献快照存储（默认新建 LRU）
+            retracted: 已回滚消息记录（默认新建 LRU）
+        """
+        self.sink = sink
+        self.contributions = contributions if contributions is not None else ThreadSafeLRUCache(capacity)
+        self.retracted = retracted if retracted is not None else ThreadSafeLRUCache(capacity)
+        self._senders = ThreadSafeLRUCache(capacity)
+        self._totals: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    # ---------- 规则 ----------
+
+    def _resolve_reply_target(
+        self, event: Dict, resolve_sender: Optional[Callable[[str], Optional[str]]]
+    ) -> Optional[str]:
+        """确定被回复者：话题内嵌套回复取首个 @ 对象，否则取父消息发送者"""
+        parent_id = event.get("parent_id")
+        if not parent_id:
+            return None
+
+        mention_ids = event.get("mention_ids") or []
+        # 话题群中 parent_id 与 root_id 相同且指向话题头，实际回复对象为首个 @ 的人
+        if parent_id == event.get("root_id") and mention_ids:
+            return mention_ids[0]
+
+        sender_id = self._senders.get(parent_id)
+        if sender_id:
+            return sender_id
+        return resolve_sender(parent_id) if resolve_sender else None
+
+    def build_contribution(
+        self,
+        event: Dict,
+        resolve_sender: Optional[Callable[[str], Optional[str]]] = None,
+        name_of: Optional[Callable[[str], str]] = None,
+    ) -> Dict:
+        """
+        按计分规则计算一条消息的贡献快照（不修改累计指标）
+
+        Returns:
+            {"message_id", "chat_id", "sender_id", "sender_name",
+             "sender_metrics", "reply_target", "mention_targets"}
+        """
+        name_of = name_of or (lambda uid: uid)
+        sender_id = event.get("sender_id")
+
+        contribution = {
+            "message_id": event.get("message_id"),
+            "chat_id": event.get("chat_id"),
+            "sender_id": sender_id,
+            "sender_name": event.get("sender_name") or name_of(sender_id),
+            "sender_metrics": {
+                "message_count": 1,
+                "char_count": int(event.get("char_count") or 0),
+                "reply_received": 0,
+                "mention_received": 0,
+                "topic_initiated": 1 if initiates_topic(event.get("root_id")) else 0,
+            },
+            "reply_target": None,
+            "mention_targets": [],
+        }
+
+        # 已获得"被回复"积分的人，本消息中的 @ 不再重复计分
+        credited_ids = set()
+        target_id = self._resolve_reply_target(event, resolve_sender)
+        if target_id:
+            contribution["reply_target"] = {"user_id": target_id, "user_name": name_of(target_id)}
+            credited_ids.add(target_id)
+
+        for mentioned_id in event.get("mention_ids") or []:
+            if not mentioned_id or mentioned_id in credited_ids:
+                continue
+            contribution["mention_targets"].append(
+                {"user_id": mentioned_id, "user_name": name_of(mentioned_id)}
+            )
+
+        return contribution
+
+    @staticmethod
+    def contribution_deltas(
+        contribution: Dict, sign: int = 1, name_of: Optional[Callable[[str], str]] = None
+    ) -> List[MetricsDelta]:
+        """
+        将贡献快照展开为各用户的指标增量（sign=-1 时为回滚增量）
+
+        name_of: 快照中缺少昵称时（如从持久化存储读出）用于补全，默认使用 user_id
+        """
+        name_of = name_of or (lambda uid: uid)
+        deltas = []
+        sender_metrics = {
+            key: value * sign
+            for key, value in (contribution.get("sender_metrics") or {}).items()
+            if isinstance(value, (int, float)) and value
+        }
+        if sender_metrics and contribution.get("sender_id"):
+            sender_id = contribution["sender_id"]
+            deltas.append((sender_id, contribution.get("sender_name") or name_of(sender_id), sender_metrics))
+
+        reply_target = contribution.get("reply_target")
+        if reply_target and reply_target.get("user_id"):
+            user_id = reply_target["user_id"]
+            deltas.append((user_id, reply_target.get("user_name") or name_of(user_id), {"reply_received": sign}))
+
+        for target in contribution.get("mention_targets") or []:
+            if target.get("user_id"):
+                user_id = target["user_id"]
+                deltas.append((user_id, target.get("user_name") or name_of(user_id), {"mention_received": sign}))
+        return deltas
+
+    # ---------- 事件 ----------
+
+    def feed(
+        self,
+        event: Dict,
+        resolve_sender: Optional[Callable[[str], Optional[str]]] = None,
+        name_of: Optional[Callable[[str], str]] = None,
+        sink: Optional[Sink] = None,
+    ) -> Optional[Dict]:
+        """
+        处理一条消息事件
+
+        Args:
+            event: 消息事件
+            resolve_sender: 父消息不在本地索引时，用于查询父消息发送者（如 collector.get_message_sender）
+            name_of: user_id -> 昵称
+            sink: 本次增量输出，默认使用构造时的 sink
+
+        Returns:
+            贡献快照；重复消息或缺少发送者时返回 None
+        """
+        message_id = event.get("message_id")
+        if not event.get("sender_id"):
+            return None
+        if message_id and message_id in self.contributions:
+            return None
+
+        contribution = self.build_contribution(event, resolve_sender, name_of)
+        self._apply(self.contribution_deltas(contribution), sink)
+
+        if message_id:
+            self._senders.set(message_id, event["sender_id"])
+            self.contributions.set(message_id, contribution)
+        return contribution
+
+    def retract(
+        self,
+        message_id: str,
+        sink: Optional[Sink] = None,
+        name_of: Optional[Callable[[str], str]] = None,
+    ) -> Optional[List[MetricsDelta]]:
+        """
+        按贡献快照回滚一条消息（幂等）
+
+        增量全部输出成功后才记为已回滚；输出异常会向上抛出，可重试
+        name_of: 快照不含昵称时用于补全（持久化快照只保存 user_id）
+
+        Returns:
+            回滚增量列表；已回滚或无快照时返回 None
+        """
+        if not message_id or message_id in self.retracted:
+            return None
+        contribution = self.contributions.get(message_id)
+        if not contribution:
+            return None
+
+        deltas = self.contribution_deltas(contribution, sign=-1, name_of=name_of)
+        self._apply(deltas, sink)
+        self.retracted.set(message_id, True)
+        return deltas
+
+    def feed_reaction(
+        self,
+        operator_id: str,
+        operator_name: str,
+        receiver_id: Optional[str],
+        receiver_name: Optional[str],
+        sign: int = 1,
+        sink: Optional[Sink] = None,
+    ) -> List[MetricsDelta]:
+        """
+        点赞（sign=1）/ 取消点赞（sign=-1）：点赞者计点赞数，被点赞者计被点赞数，自己给自己点赞不计被点赞数
+        """
+        deltas = [(operator_id, operator_name, {"reaction_given": sign})]
+        if receiver_id and receiver_id != operator_id:
+            deltas.append((receiver_id, receiver_name, {"reaction_received": sign}))
+        self._apply(deltas, sink)
+        return deltas
+
+    # ---------- 累计 ----------
+
+    def _apply(self, deltas: Iterable[MetricsDelta], sink: Optional[Sink]) -> None:
+        sink = sink or self.sink
+        for user_id, user_name, delta in deltas:
+            if sink:
+                sink(user_id, user_name, delta)
+            with self._lock:
+                entry = self._totals.setdefault(user_id, {"user_name": user_name, "metrics": {}})
+                if user_name:
+                    entry["user_name"] = user_name
+                metrics = entry["metrics"]
+                for key, value in delta.items():
+                    metrics[key] = metrics.get(key, 0) + value
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """当前累计指标 {user_id: {"user_name": str, "metrics": dict}}（副本）"""
+        with self._lock:
+            return copy.deepcopy(self._totals)
+
+    def drain(self) -> Dict[str, Dict]:
+        """返回并清空累计指标"""
+        with self._lock:
+            totals, self._totals = self._totals, {}
+        return totals
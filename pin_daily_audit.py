@@ -14,19 +14,23 @@ import os
 import re
 from datetime import datetime, timedelta, time as dtime
 from pathlib import Path
-from typing import Dict, List, Optional, Set
+from typing import Dict, List, Optional, Tuple
 
 import requests
 
 from calculator import MetricsCalculator
 from collector import MessageCollector
+from config import PROCESSED_LOG_COMPACT_MIN_LINES, PROCESSED_PIN_RETENTION_DAYS
 from message_renderer import MessageToDocxConverter
+from processed_log import ProcessedIdLog
+from services.identity_service import identity_service
 
 
 class DailyPinAuditor:
     """Pin 审计器（主流程为每周审计）"""
 
     PROCESSED_FILE = Path(__file__).parent / ".processed_daily_pins.txt"
+    HIGH_WATER_MARK_SUFFIX = ".hwm"
     MAX_PIN_PAGE_SIZE = 50
     PIN_SUMMARY_COLLAPSE_THRESHOLD = 500
     PIN_SUMMARY_PREVIEW_LENGTH = 50
@@ -51,9 +55,8 @@ class DailyPinAuditor:
         self.docx_storage = docx_storage
         self.essence_doc_token = essence_doc_token
         self.collector = MessageCollector(auth)
-        self.user_name_cache: Dict[str, str] = {}
         self.converter = MessageToDocxConverter(docx_storage) if docx_storage else None
-        self.processed_ids: Set[str] = self._load_processed_ids()
+        self.processed_ids: ProcessedIdLog = self._load_processed_ids()
 
         if not os.getenv("PIN_TABLE_ID"):
             print("⚠️  未配置 PIN_TABLE_ID：Pin 审计任务将跳过 Pin 归档表写入")
@@ -105,13 +108,22 @@ class DailyPinAuditor:
             print(f"❌ 未配置 CHAT_ID，跳过{window_name} Pin 审计")
             return 0
 
-        pins = self._get_pinned_messages()
-        if pins is None:
-            return 0
-
         window_start_ms = int(window_start.timestamp() * 1000)
         window_end_ms = int(window_end.timestamp() * 1000)
 
+        # 已审计区间 [covered_start, 高水位) 内的 Pin 无需重复拉取
+        covered_start_ms, high_water_mark_ms = self._load_high_water_mark()
+        fetch_start_ms = window_start_ms
+        if covered_start_ms <= window_start_ms <= high_water_mark_ms:
+            fetch_start_ms = high_water_mark_ms
+        if fetch_start_ms >= window_end_ms:
+            print(f"📌 {window_name}窗口已审计完成（高水位: {self._format_ms(high_water_mark_ms)}），不发送提醒")
+            return 0
+
+        pins = self._get_pinned_messages(start_ms=fetch_start_ms, end_ms=window_end_ms)
+        if pins is None:
+            return 0
+
         candidates = []
         skipped_processed = 0
         skipped_outside_window = 0
@@ -138,26 +150,37 @@ class DailyPinAuditor:
                 f"📌 {window_name}无新增 Pin（或均已处理），不发送提醒"
                 f" | 已处理: {skipped_processed}, {outside_window_name}: {skipped_outside_window}, 无效时间: {skipped_invalid_time}"
             )
+            self._save_high_water_mark(window_start_ms, window_end_ms)
             return 0
 
         print(f"📌 {window_name}新增 Pin 待处理: {len(candidates)} 条")
 
         processed_items = []
-        newly_processed_ids = set()
+        newly_processed_ids: Dict[str, int] = {}
 
         for pin in candidates:
             item = self._process_one_pin(pin)
             if item:
                 processed_items.append(item)
-                newly_processed_ids.add(item["message_id"])
+                newly_processed_ids[item["message_id"]] = self._normalize_timestamp_ms(
+                    self._safe_int(pin.get("create_time") or pin.get("pin_time") or pin.get("time"))
+                )
+
+        # 处理失败的 Pin 不推进高水位，下次运行仍会重新拉取
+        failed_pin_times = [
+            self._normalize_timestamp_ms(self._safe_int(pin.get("create_time") or pin.get("pin_time") or pin.get("time")))
+            for pin in candidates
+            if pin.get("message_id") not in newly_processed_ids
+        ]
+        self._save_high_water_mark(window_start_ms, min(failed_pin_times) if failed_pin_times else window_end_ms)
 
         if not processed_items:
             print(f"⚠️ {window_name} Pin 候选存在，但未成功处理任何记录")
             return 0
 
-        # 保存处理记录（去重保证：同一 message_id 只处理一次）
+        # 追加处理记录（去重保证：同一 message_id 只处理一次），并按保留期压缩
         self.processed_ids.update(newly_processed_ids)
-        self._save_processed_ids(self.processed_ids)
+        self._save_processed_ids(self.processed_ids, window_start)
 
         # 仅在有新增时发送 1 张汇总卡片
         self._send_summary_card(processed_items, card_title)
@@ -569,7 +592,20 @@ class DailyPinAuditor:
 
         return file_tokens
 
-    def _get_pinned_messages(self) -> Optional[List[dict]]:
+    def _get_pinned_messages(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Optional[List[dict]]:
+        """
+        拉取群内 Pin 列表
+
+        Args:
+            start_ms: Pin 时间下限（毫秒，含），传给接口做服务端过滤
+            end_ms: Pin 时间上限（毫秒，不含），传给接口做服务端过滤
+
+        Returns:
+            Pin 列表，接口失败返回 None
+
+        Note:
+            接口按 Pin 时间倒序返回，当某页最早的 Pin 已早于 start_ms 时停止翻页
+        """
         url = "https://open.feishu.cn/open-apis/im/v1/pins"
         page_token = None
         all_items: List[dict] = []
@@ -577,6 +613,10 @@ class DailyPinAuditor:
         try:
             while True:
                 params = {"chat_id": self.chat_id, "page_size": self.MAX_PIN_PAGE_SIZE}
+                if start_ms:
+                    params["start_time"] = str(start_ms)
+                if end_ms:
+                    params["end_time"] = str(end_ms)
                 if page_token:
                     params["page_token"] = page_token
 
@@ -591,13 +631,26 @@ class DailyPinAuditor:
                 page_token = data.get("data", {}).get("page_token")
                 if not page_token:
                     break
+                if start_ms and self._page_passed_window(page_items, start_ms):
+                    break
 
-            print(f"📌 当前 Pin 总数: {len(all_items)}")
+            print(f"📌 拉取 Pin 数: {len(all_items)}")
             return all_items
         except Exception as e:
             print(f"❌ 获取 Pin 列表异常: {e}")
             return None
 
+    @classmethod
+    def _page_passed_window(cls, page_items: List[dict], start_ms: int) -> bool:
+        """判断一页 Pin 是否已翻过窗口起点（存在早于 start_ms 的 Pin）"""
+        for pin in page_items:
+            pin_time_ms = cls._normalize_timestamp_ms(
+                cls._safe_int(pin.get("create_time") or pin.get("pin_time") or pin.get("time"))
+            )
+            if 0 < pin_time_ms < start_ms:
+                return True
+        return False
+
     def _get_message_detail(self, message_id: str) -> Optional[dict]:
         url = f"https://open.feishu.cn/open-apis/im/v1/messages/{message_id}"
         try:
@@ -641,19 +694,8 @@ class DailyPinAuditor:
     def _get_user_name(self, user_id: Optional[str]) -> str:
         if not user_id:
             return "未知用户"
-        if user_id in self.user_name_cache:
-            return self.user_name_cache[user_id]
-
-        try:
-            names = self.collector.get_user_names([user_id])
-            if names and names.get(user_id):
-                self.user_name_cache[user_id] = names[user_id]
-                return names[user_id]
-        except Exception as e:
-            print(f"⚠️ 获取用户名失败({user_id}): {e}")
-
-        self.user_name_cache[user_id] = user_id
-        return user_id
+        # 与实时监听共享昵称缓存，查询失败时由共享缓存短期负缓存并回退为 user_id
+        return identity_service.get_name(user_id, fetch_names=self.collector.get_user_names)
 
     def _download_and_upload_resource(
         self, message_id: str, file_key: str, resource_type: str, file_name: str
@@ -703,23 +745,58 @@ class DailyPinAuditor:
         except Exception:
             return None
 
-    def _load_processed_ids(self) -> Set[str]:
-        if not self.PROCESSED_FILE.exists():
-            return set()
+    def _load_processed_ids(self) -> ProcessedIdLog:
+        return ProcessedIdLog(self.PROCESSED_FILE, compact_min_lines=PROCESSED_LOG_COMPACT_MIN_LINES)
+
+    def _save_processed_ids(self, ids: ProcessedIdLog, window_start: datetime) -> None:
+        """新增记录已在 update 时追加落盘，这里只做保留期裁剪（相对审计窗口）和周期性压缩"""
+        retention_start = window_start - timedelta(days=PROCESSED_PIN_RETENTION_DAYS)
+        try:
+            ids.maybe_compact(min_pin_time_ms=int(retention_start.timestamp() * 1000))
+        except Exception as e:
+            print(f"⚠️ 压缩已处理 Pin 记录失败: {e}")
+
+    def _high_water_mark_file(self) -> Path:
+        return self.PROCESSED_FILE.with_name(f"{self.PROCESSED_FILE.name}{self.HIGH_WATER_MARK_SUFFIX}")
+
+    def _load_high_water_mark(self) -> Tuple[int, int]:
+        """
+        读取已审计区间
+
+        Returns:
+            (covered_start_ms, high_water_mark_ms)：该区间内的 Pin 均已审计完成，无记录时为 (0, 0)
+        """
+        path = self._high_water_mark_file()
+        if not path.exists():
+            return 0, 0
         try:
-            with open(self.PROCESSED_FILE, "r", encoding="utf-8") as f:
-                return {line.strip() for line in f if line.strip()}
+            parts = path.read_text(encoding="utf-8").split()
+            if len(parts) != 2:
+                return 0, 0
+            return self._safe_int(parts[0]), self._safe_int(parts[1])
         except Exception as e:
-            print(f"⚠️ 读取已处理 Pin 记录失败: {e}")
-            return set()
+            print(f"⚠️ 读取 Pin 审计高水位失败: {e}")
+            return 0, 0
 
-    def _save_processed_ids(self, ids: Set[str]) -> None:
+    def _save_high_water_mark(self, window_start_ms: int, audited_until_ms: int) -> None:
+        """
+        推进已审计区间
+
+        窗口起点落在已有区间内时只推进高水位（只增不减）；否则以本次窗口重新开始记录，
+        避免不连续的窗口（如补跑昨日审计）把中间未审计的时间段误判为已完成。
+        """
+        covered_start_ms, high_water_mark_ms = self._load_high_water_mark()
+        if covered_start_ms <= window_start_ms <= high_water_mark_ms:
+            if audited_until_ms <= high_water_mark_ms:
+                return
+        else:
+            covered_start_ms = window_start_ms
+        if audited_until_ms <= covered_start_ms:
+            return
         try:
-            with open(self.PROCESSED_FILE, "w", encoding="utf-8") as f:
-                for message_id in sorted(ids):
-                    f.write(f"{message_id}\n")
+            self._high_water_mark_file().write_text(f"{covered_start_ms} {audited_until_ms}", encoding="utf-8")
         except Exception as e:
-            print(f"⚠️ 保存已处理 Pin 记录失败: {e}")
+            print(f"⚠️ 保存 Pin 审计高水位失败: {e}")
 
     @staticmethod
     def _extract_user_id(user_obj) -> Optional[str]:
@@ -1,20 +1,34 @@
 import os
 import json
-import time
 import requests
 import threading
+import time
 from datetime import datetime
 from dotenv import load_dotenv
 from rate_limiter import with_rate_limit
+from services.identity_service import identity_service
 from utils import ThreadSafeLRUCache
 
 load_dotenv()
 
 
 class PinMonitor:
-    """Pin消息监控类 - 定期轮询检测Pin消息变化"""
-
-    def __init__(self, auth, storage, chat_id, interval=30, docx_storage=None, essence_doc_token=None):
+    """Pin消息监控类 - 自适应间隔轮询检测Pin消息变化"""
+
+    MAX_PIN_PAGE_SIZE = 50
+    BACKOFF_FACTOR = 2
+
+    def __init__(
+        self,
+        auth,
+        storage,
+        chat_id,
+        interval=30,
+        docx_storage=None,
+        essence_doc_token=None,
+        max_interval=300,
+        full_sync_interval=600,
+    ):
         """
         初始化Pin监控器
 
@@ -22,14 +36,20 @@ class PinMonitor:
             auth: FeishuAuth实例
             storage: BitableStorage实例 (用于统计被Pin次数)
             chat_id: 要监控的群组ID
-            interval: 轮询间隔(秒)，默认30秒
+            interval: 最小轮询间隔(秒)，默认30秒；检测到变化后回到该间隔
             docx_storage: DocxStorage实例 (可选，用于归档到精华文档)
             essence_doc_token: 精华文档Token (可选)
+            max_interval: 最大轮询间隔(秒)，无变化时按 BACKOFF_FACTOR 逐步退避至该值
+            full_sync_interval: 强制全量拉取的最长间隔(秒)；首页签名无法反映后续页的取消Pin，
+                                超过该时长后即使签名未变也完整翻页一次
         """
         self.auth = auth
         self.storage = storage
         self.chat_id = chat_id
         self.interval = interval
+        self.max_interval = max(interval, max_interval)
+        self.current_interval = interval
+        self.full_sync_interval = full_sync_interval
         self.docx_storage = docx_storage
         self.essence_doc_token = essence_doc_token
         
@@ -38,36 +58,70 @@ class PinMonitor:
             from message_renderer import MessageToDocxConverter
             self.converter = MessageToDocxConverter(self.docx_storage)
 
-        # 缓存当前Pin消息ID列表
+        # 缓存当前Pin消息ID列表，以及每条Pin的Pin时间 {message_id: create_time}
         self.current_pin_ids = set()
+        self.current_pin_times = {}
+
+        # 首页签名 (数量, 最新Pin时间, 是否有下一页)，未变化时跳过全量拉取
+        self.first_page_signature = None
+        # 上次成功全量拉取的时间（time.monotonic）
+        self.last_full_sync = 0.0
 
         # 缓存Pin消息详情(避免重复获取) - 使用线程安全缓存
         self.pin_details_cache = ThreadSafeLRUCache(capacity=200)
 
-        # 用户昵称缓存 - 使用线程安全缓存
-        self.user_name_cache = ThreadSafeLRUCache(capacity=500)
-
         # 是否为首次运行(避免首次启动时对所有现有Pin发送提醒)
         self.is_first_run = True
 
         # 运行状态
         self.running = False
         self.monitor_thread = None
+        self._stop_event = threading.Event()
+
+    def get_pinned_messages(self, first_page=None):
+        """
+        获取群内所有Pin消息列表（自动翻页）
+
+        Args:
+            first_page: 已拉取的首页结果 (items, page_token)，传入时从第二页开始拉取
+
+        Returns:
+            list: Pin消息列表，每个元素包含message_id和operator_id；任一页获取失败返回 None
+        """
+        page = first_page if first_page else self._get_pin_page()
+        if page is None:
+            return None
+        pins, page_token = list(page[0]), page[1]
+        while page_token:
+            page = self._get_pin_page(page_token)
+            if page is None:
+                # 部分列表会让未取到的Pin在下一轮被误判为新增，整体视为失败
+                print("[Pin监控] ⚠️ 翻页失败，本轮放弃Pin列表")
+                return None
+            page_items, page_token = page
+            pins.extend(page_items)
+        print(f"[Pin监控] 当前群内Pin消息数量: {len(pins)}")
+        return pins
 
     @with_rate_limit
-    def get_pinned_messages(self):
+    def _get_pin_page(self, page_token=None):
         """
-        获取群内所有Pin消息列表
+        获取一页Pin消息
+
+        Args:
+            page_token: 分页标记，为空时获取首页
 
         Returns:
-            list: Pin消息列表，每个元素包含message_id和operator_id
+            tuple: (Pin消息列表, 下一页page_token)，失败时返回 None
         """
         url = "https://open.feishu.cn/open-apis/im/v1/pins"  # 修正: open-apis(有s)
         headers = {
             "Authorization": f"Bearer {self.auth.get_tenant_access_token()}",
             "Content-Type": "application/json",
         }
-        params = {"chat_id": self.chat_id}  # 修正: 使用chat_id而不是container_id
+        params = {"chat_id": self.chat_id, "page_size": self.MAX_PIN_PAGE_SIZE}  # 修正: 使用chat_id而不是container_id
+        if page_token:
+            params["page_token"] = page_token
 
         try:
             response = requests.get(url, headers=headers, params=params, timeout=10)
@@ -76,7 +130,7 @@ class PinMonitor:
             if response.status_code != 200:
                 print(f"[Pin监控] ❌ HTTP错误: {response.status_code}")
                 print(f"[Pin监控] 响应内容: {response.text[:200]}")
-                return []
+                return None
 
             # 尝试解析JSON
             try:
@@ -84,24 +138,38 @@ class PinMonitor:
             except json.JSONDecodeError as e:
                 print(f"[Pin监控] ❌ JSON解析失败: {e}")
                 print(f"[Pin监控] 响应内容: {response.text[:200]}")
-                return []
+                return None
 
             if data.get("code") == 0:
-                pins = data.get("data", {}).get("items", [])
-                print(f"[Pin监控] 当前群内Pin消息数量: {len(pins)}")
-                return pins
+                data_obj = data.get("data") or {}
+                return data_obj.get("items") or [], data_obj.get("page_token")
             else:
                 print(f"[Pin监控] ❌ API返回错误: code={data.get('code')}, msg={data.get('msg')}")
-                return []
+                return None
         except requests.exceptions.Timeout:
             print(f"[Pin监控] ❌ 请求超时")
-            return []
+            return None
         except requests.exceptions.RequestException as e:
             print(f"[Pin监控] ❌ 请求异常: {e}")
-            return []
+            return None
         except Exception as e:
             print(f"[Pin监控] ❌ 未知异常: {e}")
-            return []
+            return None
+
+    @staticmethod
+    def _page_signature(page_items, page_token):
+        """
+        计算首页签名：数量 + 最新Pin时间 + 是否有下一页
+
+        新增Pin必然改变最新Pin时间；首页签名不变即可判定无新增，无需继续翻页
+        """
+        newest_pin_time = 0
+        for pin in page_items:
+            try:
+                newest_pin_time = max(newest_pin_time, int(pin.get("create_time") or 0))
+            except (TypeError, ValueError):
+                continue
+        return len(page_items), newest_pin_time, bool(page_token)
 
     @with_rate_limit
     def get_message_details(self, message_id):
@@ -172,27 +240,17 @@ class PinMonitor:
             return None
 
     def get_user_name(self, user_id):
-        """获取用户昵称（带缓存）"""
+        """获取用户昵称（进程内共享昵称缓存）"""
         if not user_id:
             return user_id
 
-        if user_id in self.user_name_cache:
-            return self.user_name_cache.get(user_id)
-
-        # 使用collector获取群备注
-        try:
+        def fetch_names(user_ids):
+            # 使用collector获取群备注
             from collector import MessageCollector
 
-            collector = MessageCollector(self.auth)
-            names = collector.get_user_names([user_id])
-            if names:
-                for uid, name in names.items():
-                    self.user_name_cache.set(uid, name)
-                return names.get(user_id, user_id)
-        except Exception as e:
-            print(f"[Pin监控] 获取用户名失败: {e}")
+            return MessageCollector(self.auth).get_user_names(user_ids)
 
-        return user_id
+        return identity_service.get_name(user_id, fetch_names=fetch_names)
 
     def send_pin_notification(self, message_id, pin_info):
         """
@@ -272,21 +330,50 @@ class PinMonitor:
             print(f"[Pin监控] ❌ 发送提醒卡片异常: {e}")
 
     def check_pin_changes(self):
-        """检查Pin消息变化并处理"""
-        pins = self.get_pinned_messages()
+        """
+        检查Pin消息变化并处理
 
-        # 提取当前Pin消息ID集合
-        new_pin_ids = {pin.get("message_id") for pin in pins if pin.get("message_id")}
+        Returns:
+            bool: 本轮是否检测到Pin列表变化（用于调整轮询间隔）
+        """
+        first_page = self._get_pin_page()
+        if first_page is None:
+            return False
+        signature = self._page_signature(*first_page)
+        full_sync_due = time.monotonic() - self.last_full_sync >= self.full_sync_interval
+        if not self.is_first_run and signature == self.first_page_signature and not full_sync_due:
+            return False
+
+        pins = self.get_pinned_messages(first_page=first_page)
+        if pins is None:
+            # 列表不完整：本轮不比对、不更新缓存，签名也不更新以便下轮重新翻页
+            return False
+        self.first_page_signature = signature
+        self.last_full_sync = time.monotonic()
+
+        # 提取当前Pin消息ID及其Pin时间
+        new_pin_times = {
+            pin.get("message_id"): str(pin.get("create_time") or "")
+            for pin in pins
+            if pin.get("message_id")
+        }
+        new_pin_ids = set(new_pin_times)
 
         if self.is_first_run:
             # 首次运行，只缓存不处理
             print(f"[Pin监控] 首次运行，缓存当前 {len(new_pin_ids)} 条Pin消息")
             self.current_pin_ids = new_pin_ids
+            self.current_pin_times = new_pin_times
             self.is_first_run = False
-            return
+            return False
 
-        # 检测新增的Pin
-        newly_pinned = new_pin_ids - self.current_pin_ids
+        # 检测新增的Pin：新出现的ID，或Pin时间变化（期间被取消后重新Pin，缓存未来得及移除）
+        newly_pinned = {
+            message_id
+            for message_id, pin_time in new_pin_times.items()
+            if self.current_pin_times.get(message_id) != pin_time
+        }
+        changed = bool(newly_pinned) or new_pin_ids != self.current_pin_ids
 
         # 处理新增Pin
         for message_id in newly_pinned:
@@ -294,6 +381,8 @@ class PinMonitor:
 
         # 更新缓存
         self.current_pin_ids = new_pin_ids
+        self.current_pin_times = new_pin_times
+        return changed
 
     def _handle_new_pin(self, message_id, pins):
         """处理新增Pin消息"""
@@ -477,18 +566,28 @@ class PinMonitor:
             print(f"  > [Pin附件] ❌ 上传异常: {e}")
             return None
 
+    def _next_interval(self, changed):
+        """检测到变化时回到最小间隔，否则按倍数退避直至 max_interval"""
+        if changed:
+            return self.interval
+        return min(self.current_interval * self.BACKOFF_FACTOR, self.max_interval)
+
     def _monitor_loop(self):
         """监控循环（后台线程）"""
-        print(f"[Pin监控] 🚀 开始监控，轮询间隔: {self.interval}秒")
+        print(f"[Pin监控] 🚀 开始监控，轮询间隔: {self.interval}~{self.max_interval}秒")
 
         while self.running:
+            changed = False
             try:
-                self.check_pin_changes()
+                changed = self.check_pin_changes()
             except Exception as e:
                 print(f"[Pin监控] ❌ 监控循环异常: {e}")
 
-            # 等待下一次轮询
-            time.sleep(self.interval)
+            self.current_interval = self._next_interval(changed)
+
+            # 等待下一次轮询（stop() 时立即唤醒）
+            if self._stop_event.wait(self.current_interval):
+                break
 
     def start(self):
         """启动Pin监控"""
@@ -497,6 +596,8 @@ class PinMonitor:
             return
 
         self.running = True
+        self.current_interval = self.interval
+        self._stop_event.clear()
         self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
         self.monitor_thread.start()
         print("[Pin监控] ✅ Pin监控已启动")
@@ -504,6 +605,7 @@ class PinMonitor:
     def stop(self):
         """停止Pin监控"""
         self.running = False
+        self._stop_event.set()
         if self.monitor_thread:
             self.monitor_thread.join(timeout=5)
         print("[Pin监控] 🛑 Pin监控已停止")
@@ -1,23 +1,20 @@
 """
 每周 Pin 审计 & 月度归档后台调度器
-集成到主进程中，使用 schedule 库定时执行
+集成到主进程中，使用内置的事件驱动定时器调度执行
 """
+import heapq
+import itertools
 import os
 import threading
-import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 from storage import BitableStorage, DocxStorage
 from pin_daily_audit import DailyPinAuditor
 
-try:
-    import schedule as _schedule_module
-except Exception:
-    _schedule_module = None
 
-
-class _MiniScheduleJob:
-    """轻量级调度任务，仅覆盖当前项目使用的日/周场景。"""
+class _TimerJob:
+    """定时任务，仅覆盖当前项目使用的日/周场景（接口与 schedule 库保持一致）。"""
 
     def __init__(self, scheduler):
         self.scheduler = scheduler
@@ -28,6 +25,7 @@ class _MiniScheduleJob:
         self.args = ()
         self.kwargs = {}
         self.next_run = None
+        self.cancelled = False
 
     @property
     def monday(self):
@@ -50,16 +48,18 @@ class _MiniScheduleJob:
         self.args = args
         self.kwargs = kwargs
         self.next_run = self._compute_next_run(datetime.now())
-        self.scheduler.jobs.append(self)
+        self.scheduler._add_job(self)
         return self
 
-    def should_run(self, now):
-        return self.next_run is not None and now >= self.next_run
+    def cancel(self):
+        """取消任务（立即生效，已在执行中的本次任务不受影响）"""
+        self.scheduler.cancel_job(self)
 
-    def run(self, now=None):
-        run_time = now or datetime.now()
-        self.job_func(*self.args, **self.kwargs)
-        self.next_run = self._compute_next_run(run_time + timedelta(seconds=1))
+    def run(self):
+        try:
+            self.job_func(*self.args, **self.kwargs)
+        except Exception as e:
+            print(f"❌ 定时任务执行异常({getattr(self.job_func, '__name__', self.job_func)}): {e}")
 
     def _compute_next_run(self, reference):
         candidate = reference.replace(
@@ -84,41 +84,137 @@ class _MiniScheduleJob:
         raise ValueError(f"Unsupported schedule unit: {self.unit}")
 
 
-class _MiniSchedule:
-    """第三方 schedule 不可用时的最小替代实现。"""
+class _TimerScheduler:
+    """
+    基于最小堆的事件驱动调度器
+
+    - 调度线程在条件变量上精确睡眠到最近一个任务的执行时间，无需每分钟轮询
+    - 新增/取消任务或 clear() 时立即唤醒调度线程
+    - 到期任务提交到小型线程池执行，长时间的归档不会推迟 Pin 审计
+    """
 
-    def __init__(self):
+    # 最长单次睡眠，防止系统时间被调整后长时间错过任务
+    MAX_WAIT_SECONDS = 3600
+
+    def __init__(self, max_workers=2):
+        self.max_workers = max_workers
         self.jobs = []
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._executor = None
 
     def every(self):
-        return _MiniScheduleJob(self)
+        return _TimerJob(self)
+
+    def _add_job(self, job):
+        with self._cond:
+            self.jobs.append(job)
+            self._push(job)
+            self._cond.notify_all()
+
+    def _push(self, job):
+        heapq.heappush(self._heap, (job.next_run, next(self._counter), job))
+
+    def _peek(self):
+        """弹出已取消或已过期的堆项（惰性删除），返回最近的有效堆项"""
+        while self._heap:
+            next_run, _, job = self._heap[0]
+            if not job.cancelled and job.next_run == next_run:
+                return self._heap[0]
+            heapq.heappop(self._heap)
+        return None
+
+    def cancel_job(self, job):
+        with self._cond:
+            job.cancelled = True
+            if job in self.jobs:
+                self.jobs.remove(job)
+            self._cond.notify_all()
 
     def clear(self):
-        self.jobs.clear()
-
-    def run_pending(self):
-        now = datetime.now()
-        for job in list(self.get_jobs()):
-            if job.should_run(now):
-                job.run(now)
+        with self._cond:
+            for job in self.jobs:
+                job.cancelled = True
+            self.jobs.clear()
+            self._heap.clear()
+            self._cond.notify_all()
+
+    def wakeup(self):
+        """唤醒等待中的调度线程"""
+        with self._cond:
+            self._cond.notify_all()
+
+    def idle_seconds(self, now=None):
+        """距离下一个任务的秒数，无任务时返回 None"""
+        with self._cond:
+            entry = self._peek()
+            if entry is None:
+                return None
+            return (entry[0] - (now or datetime.now())).total_seconds()
+
+    def run_pending(self, now=None):
+        """
+        将所有到期任务提交到线程池执行
+
+        Returns:
+            list: 本次提交任务的 Future 列表
+        """
+        now = now or datetime.now()
+        futures = []
+        with self._cond:
+            while True:
+                entry = self._peek()
+                if entry is None or entry[0] > now:
+                    break
+                _, _, job = heapq.heappop(self._heap)
+                job.next_run = job._compute_next_run(now + timedelta(seconds=1))
+                self._push(job)
+                futures.append(self._get_executor().submit(job.run))
+        return futures
+
+    def wait_for_next(self, timeout=None, should_stop=None):
+        """
+        阻塞直到最近任务到期、任务变化或被唤醒
+
+        Args:
+            timeout: 最长等待秒数，默认 MAX_WAIT_SECONDS
+            should_stop: 停止条件，在条件锁内检查后再等待；
+                         配合 clear()/wakeup() 不会丢失检查与等待之间发出的唤醒
+        """
+        with self._cond:
+            if should_stop is not None and should_stop():
+                return
+            entry = self._peek()
+            delay = self.MAX_WAIT_SECONDS if timeout is None else timeout
+            if entry is not None:
+                delay = min(delay, (entry[0] - datetime.now()).total_seconds())
+            if delay > 0:
+                self._cond.wait(delay)
 
     def get_jobs(self):
-        return sorted(
-            self.jobs,
-            key=lambda job: job.next_run or datetime.max,
-        )
-
+        with self._cond:
+            return sorted(
+                self.jobs,
+                key=lambda job: job.next_run or datetime.max,
+            )
 
-def _load_schedule_backend():
-    required_attrs = ("every", "clear", "run_pending", "get_jobs")
-    if _schedule_module and all(hasattr(_schedule_module, attr) for attr in required_attrs):
-        return _schedule_module
+    def shutdown(self, wait=False):
+        """关闭执行任务的线程池（下次提交任务时重新创建）"""
+        with self._cond:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
 
-    print("⚠️  检测到 schedule 包不可用或安装异常，已切换到内置调度器")
-    return _MiniSchedule()
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="pin-scheduler"
+            )
+        return self._executor
 
 
-schedule = _load_schedule_backend()
+schedule = _TimerScheduler()
 
 
 class PinReportScheduler:
@@ -180,16 +276,17 @@ class PinReportScheduler:
         print(f"   下次执行: {self._get_next_run_time()}")
     
     def stop(self):
-        """停止后台调度线程"""
+        """停止后台调度线程（clear 会立即唤醒调度线程）并关闭任务线程池"""
         self.running = False
         schedule.clear()
+        schedule.shutdown()
         print("🛑 调度器已停止")
     
     def _schedule_loop(self):
-        """后台调度循环"""
+        """后台调度循环：睡眠到下一个任务到期，到期任务交由线程池执行"""
         while self.running:
             schedule.run_pending()
-            time.sleep(60)  # 每分钟检查一次
+            schedule.wait_for_next(should_stop=lambda: not self.running)
     
     def _run_weekly_pin_job(self):
         """执行每周 Pin 审计任务"""
@@ -0,0 +1,168 @@
+"""
+已处理记录日志
+
+以追加写入（append-only）的方式持久化已处理的消息 ID，替代"全量读入 + 全量重写"：
+- 每次新增只追加若干行，写入后 fsync，进程崩溃最多丢失正在写的那一行
+- 内存中维护 dict，成员判断 O(1)
+- 定期压缩（compaction）：去除重复行、按保留期裁剪过旧记录，通过临时文件 + 原子替换完成
+
+文件格式（每行一条，兼容旧版仅含 message_id 的格式）:
+    <message_id>\t<pin_time_ms>
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Mapping, Optional, Union
+
+
+class ProcessedIdLog:
+    """
+    追加写入的已处理 ID 日志
+
+    支持 ``in`` / ``len`` / ``update``，可直接替换原先的 ``Set[str]`` 使用
+
+    Attributes:
+        path: 日志文件路径
+        compact_min_lines: 触发压缩的最小冗余行数
+
+    Example:
+        >>> log = ProcessedIdLog(Path(".processed_daily_pins.txt"))
+        >>> log.add("om_xxx", pin_time_ms=1739836800000)
+        >>> "om_xxx" in log
+        True
+    """
+
+    def __init__(self, path: Path, compact_min_lines: int = 200):
+        """
+        初始化并加载日志
+
+        Args:
+            path: 日志文件路径
+            compact_min_lines: 冗余行数（文件行数 - 有效记录数）超过该值时才压缩
+        """
+        self.path = Path(path)
+        self.compact_min_lines = compact_min_lines
+        self._entries: Dict[str, int] = {}
+        self._file_lines = 0
+        self._needs_newline = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self) -> None:
+        """读取日志文件，忽略空行；残缺的末行不影响其他记录"""
+        if not self.path.exists():
+            return
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"⚠️ 读取已处理记录失败({self.path.name}): {e}")
+            return
+
+        self._needs_newline = bool(data) and not data.endswith("\n")
+        for line in data.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            self._file_lines += 1
+            message_id, _, ts_raw = line.partition("\t")
+            try:
+                pin_time_ms = int(ts_raw) if ts_raw else 0
+            except ValueError:
+                pin_time_ms = 0
+            # 同一 ID 多次出现时保留最大的时间戳
+            self._entries[message_id] = max(pin_time_ms, self._entries.get(message_id, 0))
+
+    def __contains__(self, message_id: object) -> bool:
+        return message_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._entries))
+
+    def add(self, message_id: str, pin_time_ms: int = 0) -> None:
+        """
+        追加单条记录
+
+        Args:
+            message_id: 消息 ID
+            pin_time_ms: Pin 时间（毫秒），未知时为 0（不参与保留期裁剪）
+        """
+        self.update({message_id: pin_time_ms})
+
+    def update(self, entries: Union[Mapping[str, int], Iterable[str]]) -> None:
+        """
+        批量追加记录（与 ``set.update`` 用法兼容）
+
+        Args:
+            entries: ``{message_id: pin_time_ms}`` 映射，或 message_id 可迭代对象
+        """
+        if isinstance(entries, Mapping):
+            items = [(str(k), int(v or 0)) for k, v in entries.items() if k]
+        else:
+            items = [(str(k), 0) for k in entries if k]
+
+        with self._lock:
+            new_items = [(k, v) for k, v in items if k not in self._entries]
+            if not new_items:
+                return
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                if self._needs_newline:
+                    f.write("\n")
+                    self._needs_newline = False
+                f.write("".join(f"{k}\t{v}\n" for k, v in new_items))
+                f.flush()
+                os.fsync(f.fileno())
+
+            for k, v in new_items:
+                self._entries[k] = v
+            self._file_lines += len(new_items)
+
+    def prune(self, min_pin_time_ms: int) -> int:
+        """
+        在内存中移除 Pin 时间早于 min_pin_time_ms 的记录（时间未知的记录保留）
+
+        Returns:
+            移除的记录数，下次压缩时落盘
+        """
+        with self._lock:
+            expired = [k for k, v in self._entries.items() if 0 < v < min_pin_time_ms]
+            for k in expired:
+                del self._entries[k]
+            return len(expired)
+
+    def maybe_compact(self, min_pin_time_ms: Optional[int] = None) -> bool:
+        """
+        按需裁剪并压缩日志
+
+        Args:
+            min_pin_time_ms: 保留期下限（毫秒），为 None 时不裁剪
+
+        Returns:
+            是否执行了压缩
+        """
+        if min_pin_time_ms:
+            self.prune(min_pin_time_ms)
+        with self._lock:
+            if self._file_lines - len(self._entries) < self.compact_min_lines:
+                return False
+        self.compact()
+        return True
+
+    def compact(self) -> None:
+        """将当前有效记录写入临时文件后原子替换原日志"""
+        with self._lock:
+            tmp_path = self.path.with_name(f"{self.path.name}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write("".join(f"{k}\t{v}\n" for k, v in self._entries.items()))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self._file_lines = len(self._entries)
+            self._needs_newline = False
@@ -2,13 +2,15 @@
 API速率限制器
 
 防止API调用过快导致被飞书限流（HTTP 429错误）
-使用滑动窗口算法实现速率限制
+使用滑动窗口算法实现速率限制，可被多个线程共享
 """
 
+import threading
 import time
 from functools import wraps
 from typing import Callable, Dict, Any, List
 from config import API_RATE_LIMIT_CALLS, API_RATE_LIMIT_PERIOD
+from metrics_registry import API_LATENCY, RATE_LIMIT_WAIT
 
 
 class RateLimiter:
@@ -43,6 +45,8 @@ class RateLimiter:
         self.max_calls: int = max_calls
         self.period: int = period
         self.calls: List[float] = []
+        # 并发分片拉取等场景下多个线程共享同一限流器，检查与登记须原子完成
+        self._lock = threading.Lock()
 
     def is_allowed(self) -> bool:
         """
@@ -59,14 +63,15 @@ class RateLimiter:
             ...     # 执行API调用
             ...     pass
         """
-        now = time.time()
-        # 清理过期的记录
-        self.calls = [call_time for call_time in self.calls if now - call_time < self.period]
+        with self._lock:
+            now = time.time()
+            # 清理过期的记录
+            self.calls = [call_time for call_time in self.calls if now - call_time < self.period]
 
-        if len(self.calls) < self.max_calls:
-            self.calls.append(now)
-            return True
-        return False
+            if len(self.calls) < self.max_calls:
+                self.calls.append(now)
+                return True
+            return False
 
     def wait_if_needed(self) -> None:
         """
@@ -83,8 +88,10 @@ class RateLimiter:
         while not self.is_allowed():
             now = time.time()
             # 计算需要等待的时间
-            if self.calls:
-                wait_time = self.period - (now - self.calls[0])
+            with self._lock:
+                oldest = self.calls[0] if self.calls else None
+            if oldest is not None:
+                wait_time = self.period - (now - oldest)
                 if wait_time > 0:
                     # 显示友好提示
                     mins = int(wait_time // 60)
@@ -117,11 +124,13 @@ class RateLimiter:
             >>> status = limiter.get_status()
             >>> print(f"已使用: {status['used']}/{status['limit']}")
         """
-        now = time.time()
-        self.calls = [call_time for call_time in self.calls if now - call_time < self.period]
-        remaining = self.max_calls - len(self.calls)
+        with self._lock:
+            now = time.time()
+            self.calls = [call_time for call_time in self.calls if now - call_time < self.period]
+            used = len(self.calls)
+        remaining = self.max_calls - used
         return {
-            "used": len(self.calls),
+            "used": used,
             "remaining": remaining,
             "limit": self.max_calls,
             "period": self.period,
@@ -132,6 +141,16 @@ class RateLimiter:
 api_limiter = RateLimiter(max_calls=API_RATE_LIMIT_CALLS, period=API_RATE_LIMIT_PERIOD)
 
 
+def acquire_rate_limit() -> None:
+    """
+    占用一次全局限流额度（超限时等待），等待耗时记录到 /metrics
+
+    用于一次逻辑操作包含多个请求、只需整体占用一次额度的场景（如消息历史翻页）
+    """
+    with RATE_LIMIT_WAIT.time():
+        api_limiter.wait_if_needed()
+
+
 def with_rate_limit(func: Callable) -> Callable:
     """
     API限流装饰器
@@ -158,11 +177,14 @@ def with_rate_limit(func: Callable) -> Callable:
         - 所有使用此装饰器的函数共享同一个限流器
         - 限流参数从config.py读取
         - 如果超限会自动等待
+        - 限流等待与接口调用耗时分别记录到 /metrics 直方图（接口按函数限定名区分）
     """
+    endpoint = func.__qualname__
 
     @wraps(func)
     def wrapper(*args: Any, **kwargs: Any) -> Any:
-        api_limiter.wait_if_needed()
-        return func(*args, **kwargs)
+        acquire_rate_limit()
+        with API_LATENCY.time(endpoint=endpoint):
+            return func(*args, **kwargs)
 
     return wrapper
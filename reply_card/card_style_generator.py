@@ -3,9 +3,70 @@ import os
 import re
 import json
 import html
+import threading
+from functools import lru_cache
+from typing import Optional, Tuple
 from PIL import Image, ImageDraw, ImageFont, UnidentifiedImageError
 from pilmoji import Pilmoji
 
+from .text_layout import get_measurer
+
+
+def _font_paths(bold):
+    # 字体路径列表
+    return [
+        "/usr/share/fonts/chinese/msyhbd.ttc" if bold else "/usr/share/fonts/chinese/msyh.ttc",
+        "/usr/share/fonts/chinese/msyh.ttc",
+        "/usr/share/fonts/chinese/wqy-zenhei.ttc",
+        "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+        "msyh.ttc", "simhei.ttf"
+    ]
+
+
+@lru_cache(maxsize=32)
+def _load_font(size: int, bold: bool):
+    """按 (字号, 粗细) 缓存已加载的字体，进程内每种字体只读取一次 .ttc 文件"""
+    for path in _font_paths(bold):
+        try:
+            # 如果使用 Linux 字体，稍微加大 2 像素补偿
+            final_size = size + (2 if "wqy" in path else 0)
+            return ImageFont.truetype(path, final_size)
+        except Exception:
+            continue
+    return ImageFont.load_default()
+
+
+# 已缩放素材缓存：{(路径, 尺寸, 是否保持比例): Image}，只缓存加载成功的结果
+_assets = {}
+_assets_lock = threading.Lock()
+
+
+def _load_asset(path: str, box: Tuple[int, int], keep_ratio: bool) -> Optional[Image.Image]:
+    """
+    按 (路径, 尺寸, 是否保持比例) 缓存缩放好的 RGBA 素材
+
+    返回的图片为共享只读对象，只能作为 paste 的源图使用；
+    文件缺失或无法读取时返回 None 且不缓存，素材补上后下次调用即可加载
+    """
+    key = (path, tuple(box), keep_ratio)
+    asset = _assets.get(key)
+    if asset is not None:
+        return asset
+    if not os.path.exists(path):
+        return None
+    try:
+        asset = Image.open(path).convert("RGBA")
+        if keep_ratio:
+            w, h = asset.size
+            ratio = min(box[0] / w, box[1] / h)
+            box = (int(w * ratio), int(h * ratio))
+        asset = asset.resize(box, Image.Resampling.LANCZOS)
+    except (OSError, UnidentifiedImageError, ValueError):
+        return None
+    with _assets_lock:
+        return _assets.setdefault(key, asset)
+
+
 class CardStyleImageGenerator:
     WIDTH = 720
     BG_COLOR = (240, 242, 245)
@@ -21,121 +82,173 @@ class CardStyleImageGenerator:
     RIGHT_IMAGE_PATH = os.path.join(BASE_DIR, "至善者联盟下单链接.png")
 
     def get_font(self, size, bold=False):
-        # 字体路径列表
-        font_paths = [
-            "/usr/share/fonts/chinese/msyhbd.ttc" if bold else "/usr/share/fonts/chinese/msyh.ttc",
-            "/usr/share/fonts/chinese/msyh.ttc",
-            "/usr/share/fonts/chinese/wqy-zenhei.ttc",
-            "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
-            "msyh.ttc", "simhei.ttf"
-        ]
-        for path in font_paths:
-            try:
-                # 如果使用 Linux 字体，稍微加大 2 像素补偿
-                final_size = size + (2 if "wqy" in path else 0)
-                return ImageFont.truetype(path, final_size)
-            except: continue
-        return ImageFont.load_default()
+        return _load_font(size, bold)
+
+    # 版式参数
+    LINE_HEIGHT = 50  # 适中的行高
+    HEADER_HEIGHT = 130
+    CONTENT_MARGIN = 80
+    BOTTOM_AREA_HEIGHT = 420
+    CARD_MARGIN_X = 35
+    CARD_MARGIN_Y = 50
+    MAX_LINES = 15
+    TEXT_PADDING_X = 45  # 正文距卡片左右边缘的距离
+    BODY_WIDTH = WIDTH - 2 * (CARD_MARGIN_X + TEXT_PADDING_X)  # 正文行宽（像素）
+    LAST_LINE_WIDTH = 470  # 末行截断宽度（约 18 个汉字），其后接省略号
+    HINT_COLOR = (90, 145, 135)
+    PNG_COMPRESS_LEVEL = 3  # 速度优先，文件体积与默认级别相差不大
+
+    # 静态模板缓存：{(是否有标题栏, 正文行数): (Image, 是否绘制了图标)}，行数上限 15，最多 30 张
+    _templates = {}
+    _templates_lock = threading.Lock()
+
+    def _layout(self, has_header: bool, line_count: int) -> dict:
+        """计算给定高度档位的版式坐标"""
+        header_h = self.HEADER_HEIGHT if has_header else 0
+        total_height = (
+            header_h + line_count * self.LINE_HEIGHT + self.CONTENT_MARGIN
+            + self.BOTTOM_AREA_HEIGHT + self.CARD_MARGIN_Y * 2
+        )
+        card_rect = [self.CARD_MARGIN_X, self.CARD_MARGIN_Y, self.WIDTH - self.CARD_MARGIN_X, total_height - self.CARD_MARGIN_Y]
+        return {
+            "header_h": header_h,
+            "total_height": total_height,
+            "card_rect": card_rect,
+            "body_y": card_rect[1] + header_h + 45,
+        }
+
+    def _render_template(self, has_header: bool, line_count: int) -> Tuple[Image.Image, bool, bool]:
+        """
+        绘制与正文内容无关的静态层：阴影卡片、标题栏底色与图标、引流提示、底部双图、页脚
+
+        Returns:
+            (模板图片, 是否绘制了标题栏图标, 素材是否全部加载成功)
+        """
+        layout = self._layout(has_header, line_count)
+        total_height = layout["total_height"]
+        card_rect = layout["card_rect"]
+        header_h = layout["header_h"]
 
-    def generate_card_image(self, title: str, content: str) -> bytes:
-        clean_content = self._clean_markdown(content)
-        # 这里的 22 是每行字数，可以根据需要微调
-        raw_lines = self._wrap_text(clean_content, 22)
-        
-        limit = min(15, max(1, int(len(raw_lines) * 0.7)))
-        display_lines = raw_lines[:limit]
-        
-        header_h = 130 if title else 0
-        line_height = 50 # 适中的行高
-        content_margin = 80
-        bottom_area_h = 420 
-        card_margin_y = 50
-        
-        calculated_content_h = len(display_lines) * line_height
-        total_height = header_h + calculated_content_h + content_margin + bottom_area_h + (card_margin_y * 2)
-        
         img = Image.new('RGB', (self.WIDTH, total_height), self.BG_COLOR)
         draw = ImageDraw.Draw(img)
-        
+
         # 1. 绘制带有阴影效果的白色卡片
-        card_margin_x = 35
-        card_rect = [card_margin_x, card_margin_y, self.WIDTH - card_margin_x, total_height - card_margin_y]
         for i in range(12):
             c = 230 + i
             if c > 255: c = 255
             draw.rectangle([card_rect[0]+i, card_rect[1]+i, card_rect[2]+i, card_rect[3]+i], outline=(c, c, c), width=1)
         draw.rectangle(card_rect, fill=self.CARD_BG_COLOR)
 
-        title_font = self.get_font(32, bold=True)
-        content_font = self.get_font(26)
         footer_font = self.get_font(20)
+        has_icon = False
 
-        # 2. 顶部 Logo + 标题
+        # 2. 顶部标题栏与圆形图标
         if header_h > 0:
             header_rect = [card_rect[0], card_rect[1], card_rect[2], card_rect[1] + header_h]
             draw.rectangle(header_rect, fill=self.HEADER_BG_COLOR)
-            
-            cur_x = card_rect[0] + 40
-            # 绘制圆形图标
-            if os.path.exists(self.ICON_PATH):
-                try:
-                    icon = Image.open(self.ICON_PATH).convert("RGBA").resize((80, 80), Image.Resampling.LANCZOS)
-                    img.paste(icon, (cur_x, card_rect[1] + (header_h - 80)//2), icon)
-                    cur_x += 100
-                except: pass
-            
-            with Pilmoji(img) as pilmoji:
-                pilmoji.text((cur_x, card_rect[1] + 45), title[:20], fill=self.TITLE_COLOR, font=title_font)
+            icon = _load_asset(self.ICON_PATH, (80, 80), False)
+            if icon is not None:
+                img.paste(icon, (card_rect[0] + 40, card_rect[1] + (header_h - 80)//2), icon)
+                has_icon = True
+
+        # 3. 引流提示
+        hint_text = "— 内容过长，仅展示部分资料 —"
+        bbox = draw.textbbox((0, 0), hint_text, font=footer_font)
+        hint_y = layout["body_y"] + line_count * self.LINE_HEIGHT + 30
+        draw.text(((self.WIDTH - (bbox[2]-bbox[0]))//2, hint_y), hint_text, fill=self.HINT_COLOR, font=footer_font)
+
+        # 4. 底部双图 (还原核心排版)
+        img_area_y = total_height - self.CARD_MARGIN_Y - 350
+        left_ok = self._paste_aspect_fit(img, self.LEFT_IMAGE_PATH, (card_rect[0] + 45, img_area_y), (400, 300))
+        right_ok = self._paste_aspect_fit(img, self.RIGHT_IMAGE_PATH, (self.WIDTH - 250, img_area_y), (180, 180))
+
+        # 5. 页脚
+        draw.text((self.WIDTH//2 - 50, total_height - 95), "至善者联盟", fill=self.HINT_COLOR, font=footer_font)
+        complete = left_ok and right_ok and (has_icon or header_h == 0)
+        return img, has_icon, complete
+
+    def _get_template(self, has_header: bool, line_count: int) -> Tuple[Image.Image, bool]:
+        """
+        获取（首次时绘制）该高度档位的静态模板，调用方需 copy 后再绘制
+
+        素材缺失时绘制的模板不缓存，素材补上后下次调用重新绘制
+
+        Returns:
+            (模板图片, 是否绘制了标题栏图标)
+        """
+        key = (has_header, line_count)
+        template = self._templates.get(key)
+        if template is None:
+            with self._templates_lock:
+                template = self._templates.get(key)
+                if template is None:
+                    img, has_icon, complete = self._render_template(has_header, line_count)
+                    template = (img, has_icon)
+                    if complete:
+                        self._templates[key] = template
+        return template
+
+    def warm_up(self) -> None:
+        """预先绘制全部高度档位的模板，首个请求无需等待"""
+        for has_header in (True, False):
+            for line_count in range(1, self.MAX_LINES + 1):
+                self._get_template(has_header, line_count)
+
+    def generate_card_image(self, title: str, content: str) -> bytes:
+        title_font = self.get_font(32, bold=True)
+        content_font = self.get_font(26)
+
+        clean_content = self._clean_markdown(content)
+        raw_lines = self._wrap_text(clean_content, self.BODY_WIDTH, content_font)
+
+        limit = min(self.MAX_LINES, max(1, int(len(raw_lines) * 0.7)))
+        display_lines = raw_lines[:limit]
+
+        # 静态层按高度档位复用，每次只绘制标题与正文
+        has_header = bool(title)
+        layout = self._layout(has_header, len(display_lines))
+        card_rect = layout["card_rect"]
+        template, has_icon = self._get_template(has_header, len(display_lines))
+        img = template.copy()
+        content_measurer = get_measurer(content_font)
 
-        # 3. 正文渲染
-        y_offset = card_rect[1] + header_h + 45
         with Pilmoji(img) as pilmoji:
+            # 标题（图标已在模板中）
+            if has_header:
+                cur_x = card_rect[0] + 40
+                if has_icon:
+                    cur_x += 100
+                title_text = get_measurer(title_font).truncate(title[:20], card_rect[2] - 40 - cur_x)
+                pilmoji.text((cur_x, card_rect[1] + 45), title_text, fill=self.TITLE_COLOR, font=title_font)
+
+            # 正文渲染
+            y_offset = layout["body_y"]
             for i, line in enumerate(display_lines):
                 draw_color = self.TEXT_COLOR
                 draw_text = line
-                
+
                 # 特殊处理：最后一两行变淡并添加省略号
                 if i == len(display_lines) - 1:
                     draw_color = (209, 213, 219)
                     # 截断部分文字并添加省略号，增加引流感
-                    if len(line) > 18:
-                        draw_text = line[:18] + "......"
-                    else:
-                        draw_text = line + "......"
+                    draw_text = content_measurer.truncate(line, self.LAST_LINE_WIDTH) + "......"
                 elif i == len(display_lines) - 2:
                     draw_color = (156, 163, 175)
-                
-                pilmoji.text((card_rect[0] + 45, y_offset), draw_text, fill=draw_color, font=content_font)
-                y_offset += line_height
-
-        # 4. 引流提示
-        hint_text = "— 内容过长，仅展示部分资料 —"
-        hint_color = (90, 145, 135)
-        bbox = draw.textbbox((0, 0), hint_text, font=footer_font)
-        draw.text(((self.WIDTH - (bbox[2]-bbox[0]))//2, y_offset + 30), hint_text, fill=hint_color, font=footer_font)
 
-        # 5. 底部双图 (还原核心排版)
-        img_area_y = total_height - card_margin_y - 350
-        self._paste_aspect_fit(img, self.LEFT_IMAGE_PATH, (card_rect[0] + 45, img_area_y), (400, 300))
-        self._paste_aspect_fit(img, self.RIGHT_IMAGE_PATH, (self.WIDTH - 250, img_area_y), (180, 180))
-
-        # 6. 页脚
-        draw.text((self.WIDTH//2 - 50, total_height - 95), "至善者联盟", fill=hint_color, font=footer_font)
+                pilmoji.text((card_rect[0] + self.TEXT_PADDING_X, y_offset), draw_text, fill=draw_color, font=content_font)
+                y_offset += self.LINE_HEIGHT
 
         buf = io.BytesIO()
-        img.save(buf, format='PNG')
+        img.save(buf, format='PNG', compress_level=self.PNG_COMPRESS_LEVEL)
         return buf.getvalue()
 
-    def _paste_aspect_fit(self, base_img, path, pos, max_size):
-        if not os.path.exists(path): return
-        try:
-            p_img = Image.open(path).convert("RGBA")
-            w, h = p_img.size
-            ratio = min(max_size[0]/w, max_size[1]/h)
-            new_size = (int(w * ratio), int(h * ratio))
-            p_img = p_img.resize(new_size, Image.Resampling.LANCZOS)
-            base_img.paste(p_img, pos, p_img)
-        except: pass
+    def _paste_aspect_fit(self, base_img, path, pos, max_size) -> bool:
+        """按比例缩放后粘贴素材，返回是否粘贴成功"""
+        p_img = _load_asset(path, tuple(max_size), True)
+        if p_img is None:
+            return False
+        base_img.paste(p_img, pos, p_img)
+        return True
 
     def _clean_markdown(self, text):
         cleaned = html.unescape(str(text or "")).replace("\\n", "\n")
@@ -147,12 +260,19 @@ class CardStyleImageGenerator:
         cleaned = re.sub(r"\n{3,}", "\n\n", cleaned)
         return cleaned.strip()
 
-    def _wrap_text(self, text, max_chars):
-        lines = []
-        for p in text.split('\n'):
-            if not p:
-                lines.append("")
-                continue
-            for i in range(0, len(p), max_chars):
-                lines.append(p[i:i+max_chars])
-        return lines
+    def _wrap_text(self, text, max_width, font):
+        # 按字体实际字宽折行（字宽按字体缓存，emoji 按字号计宽）
+        return get_measurer(font).wrap(text, max_width)
+
+
+_shared_generator = None
+_shared_generator_lock = threading.Lock()
+
+
+def get_card_generator() -> CardStyleImageGenerator:
+    """进程内共享的生成器实例（字体与素材缓存为模块级，实例本身无状态）"""
+    global _shared_generator
+    with _shared_generator_lock:
+        if _shared_generator is None:
+            _shared_generator = CardStyleImageGenerator()
+        return _shared_generator
@@ -3,8 +3,26 @@
 """
 
 from PIL import Image, ImageDraw, ImageFont
+from functools import lru_cache
 import io
 
+from .text_layout import get_measurer
+
+
+@lru_cache(maxsize=1)
+def _load_fonts():
+    """加载并缓存 (标题, 正文, 小字) 字体，字宽缓存依赖同一字体对象"""
+    try:
+        return (
+            ImageFont.truetype("msyh.ttc", 32),  # 微软雅黑
+            ImageFont.truetype("msyh.ttc", 18),
+            ImageFont.truetype("msyh.ttc", 14),
+        )
+    except Exception:
+        # 使用默认字体
+        default_font = ImageFont.load_default()
+        return default_font, default_font, default_font
+
 class DocImageGenerator:
     """文档摘要图片生成器"""
     
@@ -44,16 +62,8 @@ class DocImageGenerator:
         img = Image.new('RGB', (self.WIDTH, self.HEIGHT), self.BG_COLOR)
         draw = ImageDraw.Draw(img)
         
-        # 尝试加载字体（如果失败则使用默认字体）
-        try:
-            title_font = ImageFont.truetype("msyh.ttc", 32)  # 微软雅黑
-            content_font = ImageFont.truetype("msyh.ttc", 18)
-            small_font = ImageFont.truetype("msyh.ttc", 14)
-        except Exception:
-            # 使用默认字体
-            title_font = ImageFont.load_default()
-            content_font = ImageFont.load_default()
-            small_font = ImageFont.load_default()
+        # 加载字体（如果失败则使用默认字体）
+        title_font, content_font, small_font = _load_fonts()
         
         y_offset = self.PADDING
         
@@ -101,7 +111,7 @@ class DocImageGenerator:
         y_offset += 35
         
         # 5. 分行显示内容（使用全宽）
-        lines = self._wrap_text(content, 45)  # 增加每行字符数
+        lines = self._wrap_text(content, self.WIDTH - 2 * self.PADDING, content_font)
         
         for line in lines[:12]:  # 最多显示12行
             draw.text(
@@ -128,31 +138,16 @@ class DocImageGenerator:
         
         return img_byte_arr.getvalue()
     
-    def _wrap_text(self, text: str, max_chars: int) -> list:
+    def _wrap_text(self, text: str, max_width: int, font) -> list:
         """
-        将长文本按指定字符数分行
-        
+        将长文本按像素宽度分行
+
         Args:
             text: 原始文本
-            max_chars: 每行最大字符数
-            
+            max_width: 每行最大宽度（像素）
+            font: 绘制所用字体（字宽按字体缓存）
+
         Returns:
             分行后的文本列表
         """
-        lines = []
-        current_line = ""
-        
-        for char in text:
-            if char == '\n':
-                lines.append(current_line)
-                current_line = ""
-            elif len(current_line) >= max_chars:
-                lines.append(current_line)
-                current_line = char
-            else:
-                current_line += char
-        
-        if current_line:
-            lines.append(current_line)
-        
-        return lines
+        return get_measurer(font).wrap(text, max_width)
@@ -1,7 +1,13 @@
+import threading
+
 import requests
-from typing import Dict, Any, Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, List, Optional
 from auth import FeishuAuth
+from config import MCP_DOC_CACHE_SIZE, MCP_DOC_CACHE_TTL_SECONDS, MCP_MAX_CONCURRENCY, MCP_TIMEOUT_SECONDS
 from logger import get_logger
+from utils import TTLCache
 
 logger = get_logger(__name__)
 
@@ -9,12 +15,31 @@ class MCPClient:
     """
     飞书 MCP 服务客户端
     用于调用飞书官方部署的远程 MCP 工具
+
+    - 复用同一个 HTTP 会话（连接池），避免每次调用重新建立 TLS 连接
+    - fetch_doc 结果按文档 ID 短期缓存，同一文档的并发请求只调用一次；
+      调用方提供文档版本号时，版本变化即丢弃旧内容，不必等 TTL 过期
+    - fetch_doc_first 并发请求多种文档标识（token / URL），取最先返回内容的结果
     """
     
     BASE_URL = "https://mcp.feishu.cn/mcp"
     
     def __init__(self, auth: FeishuAuth):
         self.auth = auth
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MCP_MAX_CONCURRENCY)
+        self.session.mount("https://", adapter)
+        # 文档 ID -> 文档内容；获取失败不做负缓存
+        self.doc_cache = TTLCache(capacity=MCP_DOC_CACHE_SIZE, ttl=MCP_DOC_CACHE_TTL_SECONDS, negative_ttl=0)
+        # 文档 ID -> 缓存内容对应的版本号
+        self._doc_revisions: Dict[str, Any] = {}
+        self._revisions_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=MCP_MAX_CONCURRENCY, thread_name_prefix="mcp-fetch")
+
+    def close(self) -> None:
+        """关闭并发获取线程池与 HTTP 会话（进程退出时调用）"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
 
     def call_tool(self, tool_name: str, arguments: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
@@ -50,7 +75,7 @@ class MCPClient:
             logger.info(f"🌐 请求URL: {self.BASE_URL}")
             logger.info(f"🔑 使用Token前缀: {token[:20]}...")
             
-            response = requests.post(self.BASE_URL, headers=headers, json=payload, timeout=20)
+            response = self.session.post(self.BASE_URL, headers=headers, json=payload, timeout=MCP_TIMEOUT_SECONDS)
             
             logger.info(f"📡 HTTP状态码: {response.status_code}")
             logger.info(f"📡 响应内容: {response.text[:500]}...")
@@ -68,7 +93,7 @@ class MCPClient:
             logger.info(f"✅ MCP 调用成功")
             return result.get("result")
         except requests.exceptions.Timeout:
-            logger.error(f"❌ MCP 请求超时（20秒）")
+            logger.error(f"❌ MCP 请求超时（{MCP_TIMEOUT_SECONDS}秒）")
             return None
         except requests.exceptions.ConnectionError as e:
             logger.error(f"❌ MCP 连接失败: {str(e)}")
@@ -82,14 +107,75 @@ class MCPClient:
 
     def fetch_doc(self, doc_id: str) -> Optional[str]:
         """
-        获取云文档内容
+        获取云文档内容（带缓存）
         
         Args:
-            doc_id: 文档的 token (docx_token)
+            doc_id: 文档的 token (docx_token) 或文档 URL
             
         Returns:
             文档内容字符串（通常是 JSON 格式的字符串）
         """
+        return self.doc_cache.get_or_load(doc_id, lambda: self._fetch_doc_uncached(doc_id))
+
+    def fetch_doc_first(self, doc_ids: List[str], revision: Any = None) -> Optional[str]:
+        """
+        并发获取多种文档标识的内容，返回最先取到的非空内容
+
+        较慢的请求不再等待，其结果仍会写入缓存
+
+        Args:
+            doc_ids: 同一文档的不同标识，如 [obj_token, url]
+            revision: 文档当前版本号（可选）；与缓存内容的版本不一致时丢弃缓存重新获取，
+                      为 None 时仅按 TTL 过期
+
+        Returns:
+            文档内容；全部失败返回 None
+        """
+        doc_ids = [doc_id for doc_id in dict.fromkeys(doc_ids) if doc_id]
+        if revision is not None:
+            self._drop_stale(doc_ids, revision)
+        content = self._fetch_first(doc_ids)
+        if content and revision is not None:
+            with self._revisions_lock:
+                for doc_id in doc_ids:
+                    self._doc_revisions[doc_id] = revision
+        return content
+
+    def _drop_stale(self, doc_ids: List[str], revision: Any) -> None:
+        """丢弃版本号与当前版本不一致（或版本未知）的缓存内容"""
+        with self._revisions_lock:
+            stale = [doc_id for doc_id in doc_ids if self._doc_revisions.get(doc_id) != revision]
+            for doc_id in stale:
+                self._doc_revisions.pop(doc_id, None)
+        for doc_id in stale:
+            if doc_id in self.doc_cache:
+                logger.info(f"♻️ 文档版本已变化，丢弃旧缓存: {doc_id}")
+                self.doc_cache.delete(doc_id)
+
+    def _fetch_first(self, doc_ids: List[str]) -> Optional[str]:
+        """优先返回缓存内容，否则并发请求各标识，取最先返回的非空内容"""
+        for doc_id in doc_ids:
+            cached = self.doc_cache.get(doc_id)
+            if cached:
+                return cached
+        if len(doc_ids) <= 1:
+            return self.fetch_doc(doc_ids[0]) if doc_ids else None
+
+        pending = {self._executor.submit(self.fetch_doc, doc_id) for doc_id in doc_ids}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    content = future.result()
+                except Exception as e:
+                    logger.error(f"❌ MCP 并发获取文档异常: {e}")
+                    continue
+                if content:
+                    return content
+        return None
+
+    def _fetch_doc_uncached(self, doc_id: str) -> Optional[str]:
+        """调用 fetch-doc 工具并从多种返回结构中提取文档内容"""
         result = self.call_tool("fetch-doc", {"docID": doc_id})
         if not result:
             return None
@@ -2,15 +2,45 @@ import re
 import requests
 import json
 import html
+import hashlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Optional, Tuple, Dict, Any, List, Set
 from urllib.parse import urlparse
 from .mcp_client import MCPClient
 from .card_builder import CardBuilder
+from .render_service import get_render_service
+from .wiki_token_store import WikiTokenStore
 from auth import FeishuAuth
+from config import (
+    CACHE_NEGATIVE_TTL_SECONDS,
+    CACHE_RENDERED_CARD_SIZE,
+    CACHE_RENDERED_CARD_TTL_SECONDS,
+    WIKI_RESOLVE_API_BUDGET,
+    WIKI_SEARCH_WORKERS,
+)
 from logger import get_logger
+from utils import TTLCache
 
 logger = get_logger(__name__)
 
+
+class _ApiBudget:
+    """单次解析内各线程共享的接口调用额度"""
+
+    def __init__(self, limit: int):
+        self.remaining = limit
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
 class DocCardProcessor:
     """
     文档卡片处理流程类
@@ -22,10 +52,20 @@ class DocCardProcessor:
     WIKI_SPACES_URL = "https://open.feishu.cn/open-apis/wiki/v2/spaces"
     WIKI_NODES_URL_TEMPLATE = "https://open.feishu.cn/open-apis/wiki/v2/spaces/{space_id}/nodes"
     WIKI_GET_NODE_URL = "https://open.feishu.cn/open-apis/wiki/v2/spaces/get_node"
+    DOCX_GET_DOCUMENT_URL = "https://open.feishu.cn/open-apis/docx/v1/documents/{document_id}"
 
-    def __init__(self, auth: FeishuAuth):
+    def __init__(self, auth: FeishuAuth, wiki_token_store: Optional[WikiTokenStore] = None):
         self.auth = auth
         self.mcp_client = MCPClient(auth)
+        # wiki token -> obj_token：持久化的解析结果，默认仅内存
+        self.wiki_token_store = wiki_token_store or WikiTokenStore()
+        # 进程内解析合并：同一链接的并发请求只解析一次，解析失败短期内不再重复遍历
+        self.wiki_resolutions = TTLCache(capacity=200, negative_ttl=CACHE_NEGATIVE_TTL_SECONDS)
+        # (doc_id, 内容哈希) -> {"png": bytes, "image_key": str | None}
+        # 渲染失败不做负缓存，下次请求重新渲染
+        self.rendered_cards = TTLCache(
+            capacity=CACHE_RENDERED_CARD_SIZE, ttl=CACHE_RENDERED_CARD_TTL_SECONDS, negative_ttl=0
+        )
 
     def _parse_doc_url(self, doc_url: str) -> Optional[Tuple[str, str]]:
         """解析飞书文档 URL，返回 (doc_type, token)"""
@@ -107,7 +147,7 @@ class DocCardProcessor:
 
         return data.get("data") or {}
 
-    def _list_wiki_spaces(self) -> List[Dict[str, Any]]:
+    def _list_wiki_spaces(self, budget: Optional[_ApiBudget] = None) -> List[Dict[str, Any]]:
         """分页获取有权限访问的知识空间列表"""
         items: List[Dict[str, Any]] = []
         page_token: Optional[str] = None
@@ -117,6 +157,9 @@ class DocCardProcessor:
             if page_token:
                 params["page_token"] = page_token
 
+            if budget is not None and not budget.take():
+                logger.warning("⚠️ Wiki 解析接口额度已用尽，停止拉取知识空间列表")
+                break
             data = self._wiki_get(self.WIKI_SPACES_URL, params)
             if data is None:
                 break
@@ -139,29 +182,45 @@ class DocCardProcessor:
         node = data.get("node")
         return node if isinstance(node, dict) else None
 
-    def _find_wiki_node_token_in_space(self, space_id: str, target_token: str) -> Optional[str]:
+    def _find_wiki_node_token_in_space(
+        self,
+        space_id: str,
+        target_token: str,
+        cancel: Optional[threading.Event] = None,
+        budget: Optional[_ApiBudget] = None,
+    ) -> Optional[str]:
         """
-        在知识空间内分页扫描节点，找到目标 token 对应的 node_token
+        在知识空间内按层分页扫描节点，找到目标 token 对应的 node_token
         target_token 可匹配 node_token 或 obj_token
+
+        Args:
+            cancel: 其他空间已找到目标时置位，本空间随即停止扫描
+            budget: 本次解析共享的接口调用额度，用尽时停止扫描
         """
         if not space_id:
             return None
 
-        pending_parents: List[Optional[str]] = [None]
+        nodes_url = self.WIKI_NODES_URL_TEMPLATE.format(space_id=space_id)
+        pending_parents = deque([None])
         visited_parents: Set[str] = set()
 
         while pending_parents:
-            parent_node_token = pending_parents.pop(0)
+            parent_node_token = pending_parents.popleft()
             page_token: Optional[str] = None
 
             while True:
+                if cancel is not None and cancel.is_set():
+                    return None
+                if budget is not None and not budget.take():
+                    logger.warning(f"⚠️ Wiki 解析接口额度已用尽，停止扫描空间 {space_id}")
+                    return None
+
                 params: Dict[str, Any] = {"page_size": 50}
                 if parent_node_token:
                     params["parent_node_token"] = parent_node_token
                 if page_token:
                     params["page_token"] = page_token
 
-                nodes_url = self.WIKI_NODES_URL_TEMPLATE.format(space_id=space_id)
                 data = self._wiki_get(nodes_url, params)
                 if data is None:
                     break
@@ -186,32 +245,86 @@ class DocCardProcessor:
 
         return None
 
+    def _search_wiki_spaces(self, space_ids: List[str], target_token: str, budget: _ApiBudget) -> Optional[str]:
+        """并发扫描多个知识空间，任一空间找到目标即取消其余扫描"""
+        if not space_ids:
+            return None
+
+        cancel = threading.Event()
+        executor = ThreadPoolExecutor(
+            max_workers=min(WIKI_SEARCH_WORKERS, len(space_ids)), thread_name_prefix="wiki-search"
+        )
+        try:
+            futures = [
+                executor.submit(self._find_wiki_node_token_in_space, space_id, target_token, cancel=cancel, budget=budget)
+                for space_id in space_ids
+            ]
+            for future in as_completed(futures):
+                try:
+                    node_token = future.result()
+                except Exception as e:
+                    logger.error(f"❌ 扫描知识空间异常: {e}")
+                    continue
+                if node_token:
+                    cancel.set()
+                    return node_token
+            return None
+        finally:
+            cancel.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+
     def _resolve_wiki_document_id(self, wiki_token: str) -> Optional[str]:
         """
         将 Wiki URL token 解析为可用于 fetch-doc 的 document_id(obj_token)
-        1) 先尝试直接 get_node
-        2) 失败则按 spaces -> nodes -> get_node 三步解析
+        0) 先查持久化的解析结果；同一 token 的并发请求只解析一次
+        1) 再尝试直接 get_node
+        2) 失败则按 spaces -> nodes -> get_node 三步解析（各空间并发扫描，接口调用有总额度）
         """
+        obj_token = self.wiki_token_store.get(wiki_token)
+        if obj_token:
+            return obj_token
+        return self.wiki_resolutions.get_or_load(wiki_token, lambda: self._resolve_wiki_document_id_remote(wiki_token))
+
+    def _resolve_wiki_document_id_remote(self, wiki_token: str) -> Optional[str]:
+        """通过 Wiki 接口解析，成功后写入持久化存储"""
         node = self._fetch_wiki_node_info(wiki_token)
         if node and node.get("obj_token"):
+            self.wiki_token_store.set(wiki_token, node.get("obj_token"))
             return node.get("obj_token")
 
         logger.info("ℹ️ 直接 get_node 未命中，尝试 spaces -> nodes -> get_node 链路解析 Wiki 文档")
-        spaces = self._list_wiki_spaces()
-        for space in spaces:
-            space_id = space.get("space_id")
-            if not space_id:
-                continue
-            node_token = self._find_wiki_node_token_in_space(space_id, wiki_token)
-            if not node_token:
-                continue
-
-            node_info = self._fetch_wiki_node_info(node_token)
-            if node_info and node_info.get("obj_token"):
-                return node_info.get("obj_token")
+        budget = _ApiBudget(WIKI_RESOLVE_API_BUDGET)
+        spaces = self._list_wiki_spaces(budget=budget)
+        space_ids = [space.get("space_id") for space in spaces if space.get("space_id")]
+        node_token = self._search_wiki_spaces(space_ids, wiki_token, budget)
+        if not node_token:
+            return None
 
+        node_info = self._fetch_wiki_node_info(node_token)
+        if node_info and node_info.get("obj_token"):
+            self.wiki_token_store.set(wiki_token, node_info.get("obj_token"))
+            return node_info.get("obj_token")
         return None
 
+    def _get_document_revision(self, document_id: str) -> Optional[int]:
+        """查询新版文档当前版本号（revision_id），失败返回 None（此时缓存仅按 TTL 过期）"""
+        url = self.DOCX_GET_DOCUMENT_URL.format(document_id=document_id)
+        try:
+            response = requests.get(url, headers=self.auth.get_headers(), timeout=10)
+            data = response.json()
+        except Exception as e:
+            logger.warning(f"⚠️ 获取文档版本号异常: {document_id}, error={e}")
+            return None
+
+        if response.status_code != 200 or data.get("code") != 0:
+            logger.warning(f"⚠️ 获取文档版本号失败: {document_id}, code={data.get('code')}, msg={data.get('msg')}")
+            return None
+        return ((data.get("data") or {}).get("document") or {}).get("revision_id")
+
+    def close(self) -> None:
+        """释放 MCP 客户端的线程池与连接（进程退出时调用）"""
+        self.mcp_client.close()
+
     def _sanitize_preview_text(self, text: str) -> str:
         """清洗飞书 markdown 中的富文本标签，避免渲染出 <text>/<mention-doc>"""
         cleaned = html.unescape(str(text or "")).replace("\\n", "\n")
@@ -238,6 +351,31 @@ class DocCardProcessor:
         doc_ref = self.extract_doc_reference(message_text)
         if not doc_ref:
             return False
+        return self.reply_document(doc_ref, chat_id)
+
+    def is_doc_cached(self, doc_ref: Tuple[str, str, str]) -> bool:
+        """
+        文档内容是否已在缓存中（无需调用 Wiki / MCP 接口，可省略占位提示）
+
+        不查询文档版本号；版本已变化时由 reply_document 在后台丢弃旧缓存并重新获取
+        """
+        doc_type, token, doc_url = doc_ref
+        doc_id = self.wiki_token_store.get(token) if doc_type == "wiki" else token
+        return bool(doc_id and doc_id in self.mcp_client.doc_cache) or bool(
+            doc_url and doc_url in self.mcp_client.doc_cache
+        )
+
+    def reply_document(self, doc_ref: Tuple[str, str, str], chat_id: str) -> bool:
+        """
+        获取文档内容并回复卡片图片
+
+        Args:
+            doc_ref: extract_doc_reference 返回的 (doc_type, token, url)
+            chat_id: 聊天会话 ID
+
+        Returns:
+            是否成功处理（失败时已向用户发送错误提示）
+        """
         doc_type, token, doc_url = doc_ref
         doc_id = token
 
@@ -255,14 +393,11 @@ class DocCardProcessor:
             doc_id = resolved_doc_id
             logger.info(f"✅ Wiki document_id 解析成功: {doc_id}")
 
-        # 2. 调用 MCP 获取内容
-        logger.info(f"⏳ 正在通过 MCP 获取文档内容，doc_id={doc_id} ...")
-        doc_content = self.mcp_client.fetch_doc(doc_id)
-
-        # token 失败时，再尝试 URL 兜底
-        if not doc_content and doc_url:
-            logger.info("🔄 token 模式未取到内容，尝试 URL 模式...")
-            doc_content = self.mcp_client.fetch_doc(doc_url)
+        # 2. 调用 MCP 获取内容（token 与 URL 两种模式并发请求，取先返回内容者）
+        # 新版文档按版本号校验缓存，文档编辑后不再返回旧内容
+        revision = self._get_document_revision(doc_id) if doc_type in ("docx", "wiki") else None
+        logger.info(f"⏳ 正在通过 MCP 获取文档内容，doc_id={doc_id}, revision={revision} ...")
+        doc_content = self.mcp_client.fetch_doc_first([doc_id, doc_url], revision=revision)
         
         # [调试日志] 显示 MCP 返回结果
         if doc_content:
@@ -316,13 +451,10 @@ class DocCardProcessor:
         # card_content = CardBuilder.build_doc_card(doc_content, token)
         # card_success = self._send_card_reply(chat_id, card_content)
         
-        # 5. 生成并发送卡片样式图片
+        # 5. 生成并发送卡片样式图片（相同内容复用已上传的图片）
         try:
-            from .card_style_generator import CardStyleImageGenerator
-            generator = CardStyleImageGenerator()
-            image_data = generator.generate_card_image(doc_title, doc_preview)
-            self._send_image_reply(chat_id, image_data)
-            logger.info("✅ 卡片样式图片发送成功")
+            if self.send_card_image(chat_id, doc_title, doc_preview, doc_id=doc_id):
+                logger.info("✅ 卡片样式图片发送成功")
         except Exception as e:
             logger.error(f"⚠️ 图片生成或发送失败: {e}")
             import traceback
@@ -333,14 +465,42 @@ class DocCardProcessor:
 
     def _send_text_reply(self, chat_id: str, text: str):
         """发送纯文本回复"""
+        self._send_text_message(chat_id, text)
+
+    def _send_text_message(self, chat_id: str, text: str) -> Optional[str]:
+        """发送纯文本消息，返回 message_id；失败返回 None"""
         url = f"https://open.feishu.cn/open-apis/im/v1/messages?receive_id_type=chat_id"
         headers = self.auth.get_headers()
         payload = {
             "receive_id": chat_id,
             "msg_type": "text",
-            "content": f'{{"text":"{text}"}}'
+            "content": json.dumps({"text": text}, ensure_ascii=False)
         }
-        requests.post(url, headers=headers, json=payload)
+
+        try:
+            response = requests.post(url, headers=headers, json=payload, timeout=10)
+            res_data = response.json()
+            if res_data.get("code") == 0:
+                return (res_data.get("data") or {}).get("message_id")
+            logger.error(f"❌ 文本消息发送失败: {res_data.get('msg')}")
+            return None
+        except Exception as e:
+            logger.error(f"❌ 发送文本异常: {str(e)}")
+            return None
+
+    def recall_message(self, message_id: str) -> bool:
+        """撤回机器人发送的消息（用于替换占位提示）"""
+        url = f"https://open.feishu.cn/open-apis/im/v1/messages/{message_id}"
+        try:
+            response = requests.delete(url, headers=self.auth.get_headers(), timeout=10)
+            res_data = response.json()
+            if res_data.get("code") == 0:
+                return True
+            logger.warning(f"⚠️ 撤回消息失败: {res_data.get('msg')}")
+            return False
+        except Exception as e:
+            logger.warning(f"⚠️ 撤回消息异常: {str(e)}")
+            return False
 
     def _send_card_reply(self, chat_id: str, card_content: dict) -> bool:
         """发送卡片回复"""
@@ -365,56 +525,106 @@ class DocCardProcessor:
             logger.error(f"❌ 发送卡片异常: {str(e)}")
             return False
 
+    def send_card_image(self, chat_id: str, title: str, content: str, doc_id: str = "") -> bool:
+        """
+        渲染并发送卡片样式图片
+
+        渲染出的 PNG 与上传得到的 image_key 按 (doc_id, 标题与正文哈希) 缓存，
+        同一文档内容的重复请求只需一次发送消息调用
+
+        Returns:
+            是否发送成功
+        """
+        digest = hashlib.sha256(f"{title}\x00{content}".encode("utf-8")).hexdigest()
+        cache_key = (doc_id, digest)
+
+        def render():
+            # 在渲染进程池中绘制，不占用监听线程的 GIL
+            image_data = get_render_service().render_card(title, content)
+            return {"png": image_data, "image_key": None} if image_data else None
+
+        entry = self.rendered_cards.get_or_load(cache_key, render)
+        if entry is None:
+            logger.error("❌ 卡片图片渲染失败")
+            return False
+
+        image_key = entry["image_key"]
+        if not image_key:
+            image_key = self._upload_image(entry["png"])
+            if not image_key:
+                return False
+            self.rendered_cards.set(cache_key, {"png": entry["png"], "image_key": image_key})
+        else:
+            logger.info(f"♻️ 复用已上传的卡片图片: {image_key}")
+
+        if self._send_image_message(chat_id, image_key):
+            return True
+        # 发送失败可能是 image_key 已失效，下次请求用缓存的 PNG 重新上传
+        self.rendered_cards.set(cache_key, {"png": entry["png"], "image_key": None})
+        return False
+
     def _send_image_reply(self, chat_id: str, image_data: bytes) -> bool:
-        """发送图片回复"""
-        # 第一步：上传图片获取 image_key
+        """发送图片回复（上传后发送，不经过缓存）"""
+        image_key = self._upload_image(image_data)
+        if not image_key:
+            return False
+        return self._send_image_message(chat_id, image_key)
+
+    def _upload_image(self, image_data: bytes) -> Optional[str]:
+        """上传图片，返回 image_key；失败返回 None"""
         upload_url = "https://open.feishu.cn/open-apis/im/v1/images"
-        
+
         # 上传文件时，只需要 Authorization，不要 Content-Type
         token = self.auth.get_tenant_access_token()
         upload_headers = {
             "Authorization": f"Bearer {token}"
         }
-        
+
         files = {
             'image': ('doc_summary.png', image_data, 'image/png')
         }
         data = {
             'image_type': 'message'
         }
-        
+
         try:
-            # 上传图片
             upload_response = requests.post(upload_url, headers=upload_headers, files=files, data=data, timeout=10)
             upload_data = upload_response.json()
-            
+
             if upload_data.get("code") != 0:
                 logger.error(f"❌ 图片上传失败: {upload_data.get('msg')}")
-                return False
-            
+                return None
+
             image_key = upload_data.get("data", {}).get("image_key")
             if not image_key:
                 logger.error("❌ 未获取到 image_key")
-                return False
-            
-            # 第二步：发送图片消息
-            send_url = "https://open.feishu.cn/open-apis/im/v1/messages?receive_id_type=chat_id"
-            send_headers = self.auth.get_headers()
-            payload = {
-                "receive_id": chat_id,
-                "msg_type": "image",
-                "content": json.dumps({"image_key": image_key})
-            }
-            
+                return None
+            return image_key
+
+        except Exception as e:
+            logger.error(f"❌ 上传图片异常: {str(e)}")
+            return None
+
+    def _send_image_message(self, chat_id: str, image_key: str) -> bool:
+        """发送图片消息"""
+        send_url = "https://open.feishu.cn/open-apis/im/v1/messages?receive_id_type=chat_id"
+        send_headers = self.auth.get_headers()
+        payload = {
+            "receive_id": chat_id,
+            "msg_type": "image",
+            "content": json.dumps({"image_key": image_key})
+        }
+
+        try:
             send_response = requests.post(send_url, headers=send_headers, json=payload, timeout=10)
             send_data = send_response.json()
-            
+
             if send_data.get("code") == 0:
                 return True
             else:
                 logger.error(f"❌ 图片消息发送失败: {send_data.get('msg')}")
                 return False
-                
+
         except Exception as e:
             logger.error(f"❌ 发送图片异常: {str(e)}")
             return False
@@ -0,0 +1,217 @@
+"""
+卡片图片渲染服务
+
+Pillow / Pilmoji 绘制是 CPU 密集型操作，在事件线程中执行会长时间持有 GIL，
+单聊消息集中到达时会拖慢群消息统计。本模块将渲染放到独立的进程池中：
+- 每个 worker 进程启动时加载字体、素材并预绘制全部卡片模板，之后的渲染无需再预热
+- 排队与进行中的任务数有上限，超出时直接放弃本次渲染，不在监听线程中排队堆积
+- 等待结果有超时，超时或 worker 异常退出时返回 None，由调用方决定是否降级
+- 使用 spawn 方式创建进程，不继承监听进程中的线程与锁状态；worker 会把入口脚本作为
+  __mp_main__ 重新导入，因此入口模块只在 main() 中创建运行时组件（见 long_connection_listener.init_components）
+
+调用线程在等待结果期间释放 GIL，其他事件处理与后台线程不受影响
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+from config import RENDER_QUEUE_SIZE, RENDER_TIMEOUT_SECONDS, RENDER_WORKERS
+from logger import get_logger
+from metrics_registry import STAGE_LATENCY
+
+logger = get_logger(__name__)
+
+RENDER_CARD = "card"
+RENDER_DOC_IMAGE = "doc"
+
+# worker 进程内的渲染函数表：{渲染类型: callable(title, content) -> bytes}
+_renderers = {}
+
+
+def _init_worker() -> None:
+    """worker 进程初始化：创建生成器并预热字体、素材与模板"""
+    from .card_style_generator import get_card_generator
+    from .image_generator import DocImageGenerator
+
+    card_generator = get_card_generator()
+    card_generator.warm_up()
+    _renderers[RENDER_CARD] = card_generator.generate_card_image
+    _renderers[RENDER_DOC_IMAGE] = DocImageGenerator().generate_doc_image
+
+
+def _render_in_worker(kind: str, args: Tuple) -> bytes:
+    """在 worker 进程（或 RENDER_WORKERS=0 时的调用线程）中执行渲染"""
+    if not _renderers:
+        _init_worker()
+    return _renderers[kind](*args)
+
+
+def _ping() -> bool:
+    return True
+
+
+class RenderService:
+    """
+    进程池渲染服务
+
+    Attributes:
+        workers: 渲染进程数，0 表示在调用线程内直接渲染
+        max_pending: 排队与进行中的任务上限
+        timeout: 单次渲染等待上限（秒）
+        stats: 渲染计数（rendered / rejected / timeouts / failures）
+
+    Example:
+        >>> service = RenderService(workers=2)
+        >>> png = service.render_card("标题", "正文")
+        >>> png is None or png.startswith(b"\\x89PNG")
+        True
+    """
+
+    def __init__(
+        self,
+        workers: int = RENDER_WORKERS,
+        max_pending: int = RENDER_QUEUE_SIZE,
+        timeout: float = RENDER_TIMEOUT_SECONDS,
+    ):
+        self.workers = max(0, workers)
+        self.max_pending = max(1, max_pending)
+        self.timeout = timeout
+        self.stats = {"rendered": 0, "rejected": 0, "timeouts": 0, "failures": 0}
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _acquire_slot(self) -> bool:
+        if not self._slots.acquire(blocking=False):
+            return False
+        with self._lock:
+            self._in_flight += 1
+        return True
+
+    def _release_slot(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+        self._slots.release()
+
+    @property
+    def pending(self) -> int:
+        """排队与进行中的任务数"""
+        with self._lock:
+            return self._in_flight
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        with self._lock:
+            if self._pool is None and self.workers > 0:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self._pool
+
+    def _reset_pool(self, pool: ProcessPoolExecutor) -> None:
+        """worker 异常退出后丢弃进程池，下次渲染时重建"""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def start(self) -> None:
+        """提前启动并预热全部 worker，避免首个请求承担进程启动与模板绘制耗时"""
+        pool = self._get_pool()
+        if pool is None:
+            return
+        for _ in range(self.workers):
+            pool.submit(_ping)
+        logger.info(f"🎨 渲染进程池已启动: workers={self.workers}, 队列上限={self.max_pending}")
+
+    def shutdown(self) -> None:
+        """关闭进程池，取消尚未开始的任务"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def render_card(self, title: str, content: str) -> Optional[bytes]:
+        """渲染白卡样式图片（CardStyleImageGenerator），失败返回 None"""
+        return self._render(RENDER_CARD, (title, content))
+
+    def render_doc_image(self, title: str, content: str) -> Optional[bytes]:
+        """渲染文档摘要图片（DocImageGenerator），失败返回 None"""
+        return self._render(RENDER_DOC_IMAGE, (title, content))
+
+    def _render(self, kind: str, args: Tuple) -> Optional[bytes]:
+        with STAGE_LATENCY.time(stage="render"):
+            return self._render_timed(kind, args)
+
+    def _render_timed(self, kind: str, args: Tuple) -> Optional[bytes]:
+        if not self._acquire_slot():
+            self._count("rejected")
+            logger.error(f"❌ 渲染队列已满({self.max_pending})，放弃本次渲染")
+            return None
+
+        pool = self._get_pool()
+        if pool is None:
+            try:
+                data = _render_in_worker(kind, args)
+                self._count("rendered")
+                return data
+            except Exception as e:
+                self._count("failures")
+                logger.error(f"❌ 图片渲染失败: {e}")
+                return None
+            finally:
+                self._release_slot()
+
+        try:
+            future = pool.submit(_render_in_worker, kind, args)
+        except RuntimeError as e:
+            # 进程池已损坏或已关闭
+            self._release_slot()
+            self._count("failures")
+            self._reset_pool(pool)
+            logger.error(f"❌ 渲染进程池不可用: {e}")
+            return None
+        # 名额在任务真正结束（或被取消）时归还，超时放弃等待的任务仍计入上限
+        future.add_done_callback(lambda _: self._release_slot())
+
+        try:
+            data = future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self._count("timeouts")
+            logger.error(f"❌ 图片渲染超时({self.timeout}s)")
+            return None
+        except BrokenProcessPool as e:
+            self._count("failures")
+            self._reset_pool(pool)
+            logger.error(f"❌ 渲染进程异常退出，进程池将重建: {e}")
+            return None
+        except Exception as e:
+            self._count("failures")
+            logger.error(f"❌ 图片渲染失败: {e}")
+            return None
+
+        self._count("rendered")
+        return data
+
+
+_shared_service = None
+_shared_service_lock = threading.Lock()
+
+
+def get_render_service() -> RenderService:
+    """进程内共享的渲染服务实例"""
+    global _shared_service
+    with _shared_service_lock:
+        if _shared_service is None:
+            _shared_service = RenderService()
+        return _shared_service
@@ -0,0 +1,122 @@
+"""
+按像素宽度折行
+
+原先按固定字数折行：纯英文行明显偏短，全角字符与 emoji 较多的行又可能超出卡片。
+本模块按字体的实际字宽折行，一次遍历得到最终行：
+- 每种字体的单字宽度只测量一次并缓存（font.getlength），折行过程中不再调用 textbbox
+- emoji 按 Pilmoji 的绘制宽度（等于字号）整体计算，不会被拆开
+- 连续的英文、数字按单词整体换行，超过整行宽度的单词（如链接）再按字符拆分
+"""
+
+import re
+from functools import lru_cache
+from typing import Iterator, List, Tuple
+
+from pilmoji.helpers import EMOJI_REGEX, language_pack
+
+# emoji 的首字符（非 ASCII 部分）；ASCII 开头的 emoji 均为键帽组合，必含 U+20E3
+_EMOJI_STARTS = frozenset(e[0] for e in language_pack.values() if not e[0].isascii())
+
+# 英文单词（含紧随的半角标点）/ 单个空白 / 其他单个字符
+_TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_'\-.,:;!?/@#%&+=~]+|\s|.", re.DOTALL)
+
+
+def _may_contain_emoji(text: str) -> bool:
+    return "\u20e3" in text or "<" in text or not _EMOJI_STARTS.isdisjoint(text)
+
+
+class TextMeasurer:
+    """
+    单个字体的字宽缓存与折行器
+
+    Example:
+        >>> measurer = get_measurer(font)
+        >>> measurer.wrap("中文 mixed with English", 560)
+        ['中文 mixed with English']
+    """
+
+    def __init__(self, font):
+        self.font = font
+        self.emoji_width = round(getattr(font, "size", 10))
+        self._widths = {}
+
+    def char_width(self, char: str) -> float:
+        """单字宽度（首次测量后缓存）"""
+        width = self._widths.get(char)
+        if width is None:
+            width = self.font.getlength(char)
+            self._widths[char] = width
+        return width
+
+    def _tokens(self, paragraph: str) -> Iterator[Tuple[str, float, bool]]:
+        """切分为 (片段, 宽度, 是否为 emoji)"""
+        # EMOJI_REGEX 带一个捕获组，split 结果中奇数下标为 emoji；
+        # 该正则是全部 emoji 的多选分支，较慢，仅在段落可能含 emoji 时使用
+        chunks = EMOJI_REGEX.split(paragraph) if _may_contain_emoji(paragraph) else [paragraph]
+        for i, chunk in enumerate(chunks):
+            if not chunk:
+                continue
+            if i % 2:
+                yield chunk, self.emoji_width, True
+                continue
+            for token in _TOKEN_PATTERN.findall(chunk):
+                yield token, sum(self.char_width(c) for c in token), False
+
+    def width(self, text: str) -> float:
+        """单行文本宽度"""
+        return sum(width for _, width, _ in self._tokens(text))
+
+    def wrap(self, text: str, max_width: float) -> List[str]:
+        """
+        按最大像素宽度折行
+
+        Args:
+            text: 原始文本（保留换行，空段落输出空行）
+            max_width: 每行最大宽度（像素）
+
+        Returns:
+            折行后的文本列表
+        """
+        lines = []
+        for paragraph in text.split("\n"):
+            parts, line_width = [], 0.0
+            for token, width, is_emoji in self._tokens(paragraph):
+                if token.isspace() and not parts:
+                    continue  # 行首空白
+                if width > max_width and not is_emoji:
+                    # 超长单词（如链接）接在当前行后按字符拆分
+                    for char in token:
+                        char_width = self.char_width(char)
+                        if line_width + char_width > max_width and parts:
+                            lines.append("".join(parts))
+                            parts, line_width = [], 0.0
+                        parts.append(char)
+                        line_width += char_width
+                    continue
+                if line_width + width > max_width and parts:
+                    lines.append("".join(parts).rstrip())
+                    parts, line_width = [], 0.0
+                    if token.isspace():
+                        continue
+                parts.append(token)
+                line_width += width
+            lines.append("".join(parts).rstrip())
+        return lines
+
+    def truncate(self, text: str, max_width: float) -> str:
+        """截取不超过最大宽度的最长前缀（emoji 不会被截断一半）"""
+        parts, line_width = [], 0.0
+        for token, width, is_emoji in self._tokens(text):
+            units = [(token, width)] if is_emoji else [(c, self.char_width(c)) for c in token]
+            for unit, unit_width in units:
+                if line_width + unit_width > max_width:
+                    return "".join(parts)
+                parts.append(unit)
+                line_width += unit_width
+        return "".join(parts)
+
+
+@lru_cache(maxsize=16)
+def get_measurer(font) -> TextMeasurer:
+    """按字体对象缓存测量器（字体本身已按字号缓存，同一字体得到同一测量器）"""
+    return TextMeasurer(font)
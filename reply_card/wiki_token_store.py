@@ -0,0 +1,92 @@
+"""
+Wiki 节点解析结果存储
+
+Wiki 链接中的 token 需要换取实际文档的 obj_token(document_id)。直接 get_node 失败时
+需要遍历全部知识空间的节点树，一次解析可能调用上百次接口。节点与文档的对应关系不会改变，
+解析成功后持久化到 SQLite，之后同一链接（包括重启后）无需再调用 Wiki 接口。
+"""
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class WikiTokenStore:
+    """
+    wiki token -> obj_token 持久化映射
+
+    Example:
+        >>> store = WikiTokenStore(":memory:")
+        >>> store.set("wikcnXXX", "doxcnYYY")
+        >>> store.get("wikcnXXX")
+        'doxcnYYY'
+    """
+
+    def __init__(self, path: Union[str, Path] = ":memory:"):
+        """
+        Args:
+            path: SQLite 文件路径，":memory:" 表示仅内存
+        """
+        self.path = str(path)
+        self._lock = threading.Lock()
+        self._conn = self._open()
+
+    def _open(self) -> sqlite3.Connection:
+        try:
+            if self.path != ":memory:":
+                Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ 打开 Wiki 解析缓存库失败({self.path})，降级为内存存储: {e}")
+            conn = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS wiki_tokens ("
+            "wiki_token TEXT PRIMARY KEY, obj_token TEXT NOT NULL, resolved_at REAL NOT NULL)"
+        )
+        return conn
+
+    def get(self, wiki_token: str) -> Optional[str]:
+        """读取已解析的 obj_token，未解析过返回 None"""
+        with self._lock:
+            try:
+                row = self._conn.execute(
+                    "SELECT obj_token FROM wiki_tokens WHERE wiki_token = ?", (wiki_token,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ 查询 Wiki 解析缓存失败: {e}")
+                return None
+        return row[0] if row else None
+
+    def set(self, wiki_token: str, obj_token: str) -> None:
+        """保存解析结果，写入失败时仅打印警告"""
+        if not wiki_token or not obj_token:
+            return
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO wiki_tokens (wiki_token, obj_token, resolved_at) VALUES (?, ?, ?)",
+                    (wiki_token, obj_token, time.time()),
+                )
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ 写入 Wiki 解析缓存失败: {e}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM wiki_tokens").fetchone()[0]
+
+    def clear(self) -> None:
+        """清空全部解析结果"""
+        with self._lock:
+            self._conn.execute("DELETE FROM wiki_tokens")
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
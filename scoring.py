@@ -0,0 +1,167 @@
+"""
+活跃度评分引擎
+
+统一管理活跃度分数的计算，替代 storage.py / calculator.py 中手工展开的加权公式：
+- 按固定指标顺序将用户指标表示为 用户 × 指标 的列式矩阵
+- 一次矩阵与权重向量的点积得到全部用户分数
+- 一次排序同时得到排名与百分位
+- 支持权重调整后对整月数据批量重算
+"""
+
+import bisect
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from config import ACTIVITY_WEIGHTS
+
+
+# 指标顺序（矩阵列顺序）
+METRIC_KEYS: Tuple[str, ...] = (
+    "message_count",
+    "char_count",
+    "reply_received",
+    "mention_received",
+    "topic_initiated",
+    "reaction_given",
+    "reaction_received",
+    "pin_received",
+)
+
+# 指标 -> 多维表格字段名
+METRIC_FIELD_NAMES: Dict[str, str] = {
+    "message_count": "发言次数",
+    "char_count": "发言字数",
+    "reply_received": "被回复数",
+    "mention_received": "单独被@次数",
+    "topic_initiated": "发起话题数",
+    "reaction_given": "点赞数",
+    "reaction_received": "被点赞数",
+    "pin_received": "被Pin次数",
+}
+
+SCORE_FIELD_NAME = "活跃度分数"
+
+
+def _to_number(value) -> float:
+    """将多维表格字段值转换为数值，无法转换时视为 0"""
+    if value is None or value == "":
+        return 0.0
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class ScoringEngine:
+    """
+    活跃度评分引擎
+
+    Attributes:
+        weights: 指标权重，缺省的指标权重为 0
+
+    Example:
+        >>> engine = ScoringEngine({"message_count": 1.0, "char_count": 0.01})
+        >>> engine.score({"message_count": 2, "char_count": 100})
+        3.0
+    """
+
+    def __init__(self, weights: Optional[Mapping[str, float]] = None):
+        """
+        初始化评分引擎
+
+        Args:
+            weights: 指标权重，默认使用 config.ACTIVITY_WEIGHTS
+        """
+        self.weights = dict(ACTIVITY_WEIGHTS if weights is None else weights)
+        self._weight_vector = [float(self.weights.get(key, 0)) for key in METRIC_KEYS]
+
+    # ---------- 单用户 ----------
+
+    def score(self, metrics: Mapping[str, float]) -> float:
+        """按指标名（message_count 等）计算单个用户分数"""
+        total = sum(
+            _to_number(metrics.get(key, 0)) * weight
+            for key, weight in zip(METRIC_KEYS, self._weight_vector)
+        )
+        return round(total, 2)
+
+    def score_fields(self, fields: Mapping[str, object]) -> float:
+        """按多维表格字段名（发言次数 等）计算单个用户分数"""
+        return self.score(self.fields_to_metrics(fields))
+
+    @staticmethod
+    def fields_to_metrics(fields: Mapping[str, object]) -> Dict[str, float]:
+        """多维表格字段 -> 指标字典"""
+        return {key: _to_number(fields.get(name, 0)) for key, name in METRIC_FIELD_NAMES.items()}
+
+    # ---------- 批量 ----------
+
+    @staticmethod
+    def build_matrix(rows: Iterable[Mapping[str, float]]) -> List[List[float]]:
+        """将指标字典列表转换为 用户 × 指标 矩阵（二维 list）"""
+        return [[_to_number(row.get(key, 0)) for key in METRIC_KEYS] for row in rows]
+
+    def score_matrix(self, matrix) -> List[float]:
+        """对指标矩阵整体打分（一次点积），返回保留两位小数的分数列表"""
+        return [
+            round(sum(value * weight for value, weight in zip(row, self._weight_vector)), 2)
+            for row in matrix
+        ]
+
+    def score_many(self, rows: Sequence[Mapping[str, float]]) -> List[float]:
+        """批量计算指标字典列表的分数"""
+        return self.score_matrix(self.build_matrix(rows))
+
+    @staticmethod
+    def rank(scores: Sequence[float]) -> List[Tuple[int, float]]:
+        """
+        一次排序同时计算排名与百分位
+
+        排名按并列同名次（1, 2, 2, 4）；百分位为分数严格低于该用户的人数占比（0~100）
+
+        Returns:
+            与 scores 同序的 (rank, percentile) 列表
+        """
+        n = len(scores)
+        if n == 0:
+            return []
+
+        ordered = sorted(scores)
+        return [
+            (
+                n - bisect.bisect_right(ordered, s) + 1,
+                round(bisect.bisect_left(ordered, s) * 100 / n, 2),
+            )
+            for s in scores
+        ]
+
+    def rescore_records(self, records: Sequence[Mapping[str, object]]) -> List[Dict[str, object]]:
+        """
+        按当前权重批量重算多维表格记录的活跃度分数
+
+        Args:
+            records: 多维表格记录列表（含 record_id 与 fields）
+
+        Returns:
+            分数有变化的记录更新列表 [{"record_id": ..., "fields": {"活跃度分数": ...}}]
+        """
+        scores = self.score_many([self.fields_to_metrics(r.get("fields", {})) for r in records])
+        updates = []
+        for record, new_score in zip(records, scores):
+            old_score = _to_number(record.get("fields", {}).get(SCORE_FIELD_NAME))
+            if round(old_score, 2) != new_score:
+                updates.append({"record_id": record["record_id"], "fields": {SCORE_FIELD_NAME: new_score}})
+        return updates
+
+
+# 默认评分引擎（使用 config.ACTIVITY_WEIGHTS）
+default_engine = ScoringEngine()
+
+
+def compute_score(metrics: Mapping[str, float]) -> float:
+    """按指标名计算活跃度分数（默认权重）"""
+    return default_engine.score(metrics)
+
+
+def compute_score_from_fields(fields: Mapping[str, object]) -> float:
+    """按多维表格字段名计算活跃度分数（默认权重）"""
+    return default_engine.score_fields(fields)
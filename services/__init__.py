@@ -5,6 +5,7 @@
 - FileUploadService: 统一文件上传服务
 - PinService: Pin 消息处理服务
 - UserService: 用户信息获取服务
+- IdentityService: 进程内共享的用户昵称解析服务
 - AsyncCardService: 异步卡片回复服务
 - AnnouncementService: 公告识别服务
 
@@ -15,6 +16,7 @@ __all__ = [
     "FileUploadService",
     "PinService",
     "UserService",
+    "IdentityService",
     "AsyncCardService",
     "AnnouncementService",
 ]
@@ -35,6 +37,11 @@ try:
 except ImportError:
     pass
 
+try:
+    from .identity_service import IdentityService
+except ImportError:
+    pass
+
 try:
     from .async_card_service import AsyncCardService
 except ImportError:
@@ -57,7 +57,7 @@ class AnnouncementService:
         判断消息内容是否为公告消息
 
         Args:
-            content: 飞书消息 content（str 或 dict）
+            content: 飞书消息 content（str、dict 或 ParsedContent）
             tags: 标签列表，不传则使用默认值
         """
         text, _ = MetricsCalculator.extract_text_from_content(content)
@@ -0,0 +1,119 @@
+"""
+异步卡片回复服务
+
+单聊发送文档链接后，Wiki 解析、MCP 获取、渲染与上传可能耗时数秒到数十秒。
+本服务将回复分为两个阶段，首次响应时间与 MCP 延迟解耦：
+1. 同步阶段：识别到文档链接后立即发送占位提示（一次发送消息调用），随即返回监听线程
+2. 异步阶段：后台线程完成 解析 -> 获取 -> 渲染 -> 上传，发送卡片图片后撤回占位提示
+
+文档内容已在缓存中时不发送占位提示，但渲染与上传仍在后台线程完成，不占用监听线程
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from config import ASYNC_CARD_WORKERS
+from logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class AsyncCardService:
+    """
+    异步卡片回复服务类
+
+    Example:
+        >>> service = AsyncCardService(DocCardProcessor(auth))
+        >>> service.process_message("请看 https://xxx.feishu.cn/docx/doxcnXXX", chat_id)
+        True
+    """
+
+    PLACEHOLDER_TEXT = "⏳ 已收到文档链接，正在生成文档卡片，请稍候..."
+
+    def __init__(self, processor, max_workers: int = ASYNC_CARD_WORKERS):
+        """
+        Args:
+            processor: DocCardProcessor 实例
+            max_workers: 后台线程数
+        """
+        self.processor = processor
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="async-card")
+        self._pending = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self) -> int:
+        """排队与进行中的后台任务数"""
+        with self._lock:
+            return self._pending
+
+    def process_message(self, message_text: str, chat_id: str) -> bool:
+        """
+        处理单聊消息中的文档链接
+
+        Args:
+            message_text: 用户发送的消息文本
+            chat_id: 聊天会话 ID
+
+        Returns:
+            是否识别到文档链接并已受理（后台生成的结果不影响返回值；服务已关闭时返回 False）
+        """
+        doc_ref = self.processor.extract_doc_reference(message_text)
+        if not doc_ref:
+            return False
+
+        if self._closed:
+            logger.warning("⚠️ 异步卡片服务已关闭，忽略文档链接")
+            return False
+
+        if self.processor.is_doc_cached(doc_ref):
+            logger.info("⚡ 文档内容已缓存，跳过占位提示")
+            placeholder_id = None
+        else:
+            placeholder_id = self.processor._send_text_message(chat_id, self.PLACEHOLDER_TEXT)
+
+        try:
+            self.submit(doc_ref, chat_id, placeholder_id)
+        except RuntimeError:
+            # 检查之后服务恰好关闭：撤回已发送的占位提示
+            logger.warning("⚠️ 异步卡片服务已关闭，未能提交后台任务")
+            if placeholder_id:
+                self.processor.recall_message(placeholder_id)
+            return False
+        return True
+
+    def submit(self, doc_ref, chat_id: str, placeholder_id: Optional[str] = None) -> Future:
+        """提交后台生成任务，完成后撤回占位提示"""
+        with self._lock:
+            self._pending += 1
+        try:
+            future = self._executor.submit(self._complete, doc_ref, chat_id, placeholder_id)
+        except RuntimeError:
+            # 服务已关闭
+            self._task_done(None)
+            raise
+        future.add_done_callback(self._task_done)
+        return future
+
+    def _task_done(self, _future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _complete(self, doc_ref, chat_id: str, placeholder_id: Optional[str]) -> bool:
+        try:
+            return self.processor.reply_document(doc_ref, chat_id)
+        except Exception as e:
+            logger.error(f"❌ 后台生成文档卡片失败: {e}")
+            self.processor._send_text_reply(chat_id, "❌ 生成文档卡片失败，请稍后重试。")
+            return False
+        finally:
+            # 结果（卡片或错误提示）已发送，撤回占位提示
+            if placeholder_id:
+                self.processor.recall_message(placeholder_id)
+
+    def shutdown(self, wait: bool = True) -> None:
+        """停止接收新任务；wait=True 时等待进行中的任务完成"""
+        self._closed = True
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,184 @@
+"""
+用户身份服务
+
+进程内统一的"用户ID → 群内昵称"解析，替代监听、调度任务与各服务中各自维护的昵称缓存：
+1. 全进程共享一份带过期时间的昵称缓存（群备注修改后自动刷新，查无此人做负缓存）
+2. 并发线程的未命中合并为一次批量查询（群成员列表一次返回全部成员，顺带预热）
+3. 各模块传入自己的查询函数（如 collector.get_user_names），由合并批次的执行者调用
+
+昵称按作用域（群 ID, ID 类型）隔离：同一用户在不同群的备注、open_id 与 user_id 互不覆盖；
+未命中只与同一作用域的请求合并，批次由该作用域的查询函数执行
+"""
+
+import threading
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from config import CACHE_NEGATIVE_TTL_SECONDS, CACHE_USER_NAME_SIZE, CACHE_USER_NAME_TTL_SECONDS
+from utils import TTLCache
+
+# (user_ids) -> {user_id: name}
+NameFetcher = Callable[[List[str]], Dict[str, str]]
+
+# 作用域 (群 ID, ID 类型)；群 ID 为 None 表示默认群（环境变量 CHAT_ID，即 collector.get_user_names）
+Scope = Tuple[Optional[str], str]
+DEFAULT_SCOPE: Scope = (None, "open_id")
+
+
+class IdentityService:
+    """
+    用户身份服务类
+
+    Example:
+        >>> service = IdentityService(fetch_names=collector.get_user_names)
+        >>> service.get_name("ou_xxx")
+        '张三'
+    """
+
+    def __init__(
+        self,
+        fetch_names: Optional[NameFetcher] = None,
+        capacity: int = CACHE_USER_NAME_SIZE,
+        ttl: float = CACHE_USER_NAME_TTL_SECONDS,
+        negative_ttl: float = CACHE_NEGATIVE_TTL_SECONDS,
+    ):
+        """
+        Args:
+            fetch_names: 默认批量查询函数，调用时未传入 fetch_names 则使用它
+            capacity: 昵称缓存容量
+            ttl: 昵称缓存过期时间（秒）
+            negative_ttl: 查无结果的负缓存时间（秒）
+        """
+        self.fetch_names = fetch_names
+        self.cache = TTLCache(capacity=capacity, ttl=ttl, negative_ttl=negative_ttl)
+        self._lock = threading.Lock()
+        self._waiting: Dict[Tuple[Hashable, str], threading.Event] = {}
+        self._queues: Dict[Hashable, List[str]] = {}
+        self._fetching: Set[Hashable] = set()
+        self.batch_calls = 0
+
+    def get_names(
+        self,
+        user_ids: Iterable[str],
+        fetch_names: Optional[NameFetcher] = None,
+        scope: Hashable = DEFAULT_SCOPE,
+    ) -> Dict[str, str]:
+        """
+        批量获取昵称
+
+        缓存未命中的 ID 进入该作用域的队列：该作用域当前没有查询在进行时由本线程执行查询，
+        并持续处理查询期间其他线程加入的 ID；否则等待进行中的批次完成。
+
+        Args:
+            user_ids: 用户ID列表
+            fetch_names: 本次使用的批量查询函数，默认使用构造时的 fetch_names
+            scope: 作用域 (群 ID, ID 类型)，须与 fetch_names 查询的群和返回的 ID 类型一致
+
+        Returns:
+            {user_id: name}，查不到的用户不出现在结果中
+        """
+        fetch_names = fetch_names or self.fetch_names
+        result: Dict[str, str] = {}
+        misses = []
+        for user_id in dict.fromkeys(uid for uid in user_ids if uid):
+            found, name = self.cache.lookup((scope, user_id))
+            if not found:
+                misses.append(user_id)
+            elif name:
+                result[user_id] = name
+        if not misses:
+            return result
+        if fetch_names is None:
+            raise ValueError("IdentityService 未配置昵称查询函数")
+
+        events = []
+        with self._lock:
+            queue = self._queues.setdefault(scope, [])
+            for user_id in misses:
+                event = self._waiting.get((scope, user_id))
+                if event is None:
+                    event = threading.Event()
+                    self._waiting[(scope, user_id)] = event
+                    queue.append(user_id)
+                events.append(event)
+            leader = scope not in self._fetching
+            if leader:
+                self._fetching.add(scope)
+
+        if leader:
+            self._drain(scope, fetch_names)
+        for event in events:
+            event.wait()
+
+        for user_id in misses:
+            found, name = self.cache.lookup((scope, user_id))
+            if found and name:
+                result[user_id] = name
+        return result
+
+    def _drain(self, scope: Hashable, fetch_names: NameFetcher) -> None:
+        """循环处理该作用域队列中的 ID，直到队列为空"""
+        while True:
+            with self._lock:
+                batch = self._queues.pop(scope, [])
+                if not batch:
+                    self._fetching.discard(scope)
+                    return
+
+            try:
+                self.batch_calls += 1
+                names = fetch_names(batch) or {}
+            except Exception as e:
+                print(f"⚠️ [IdentityService] 批量获取昵称失败: {e}")
+                names = {}
+
+            try:
+                self.prime(names, scope)
+                for user_id in batch:
+                    if not names.get(user_id):
+                        self.cache.set_negative((scope, user_id))
+            finally:
+                with self._lock:
+                    for user_id in batch:
+                        event = self._waiting.pop((scope, user_id), None)
+                        if event:
+                            event.set()
+
+    def get_name(
+        self,
+        user_id: Optional[str],
+        fetch_names: Optional[NameFetcher] = None,
+        default: Optional[str] = None,
+        scope: Hashable = DEFAULT_SCOPE,
+    ) -> Optional[str]:
+        """
+        获取单个用户昵称
+
+        Returns:
+            昵称；查不到时返回 default（默认为 user_id 本身）
+        """
+        if not user_id:
+            return default if default is not None else user_id
+        name = self.get_names([user_id], fetch_names, scope).get(user_id)
+        if name:
+            return name
+        return default if default is not None else user_id
+
+    def prime(self, names: Dict[str, str], scope: Hashable = DEFAULT_SCOPE) -> None:
+        """写入已知昵称（如其他接口顺带返回的成员信息）"""
+        for user_id, name in names.items():
+            if user_id and name:
+                self.cache.set((scope, user_id), name)
+
+    def clear(self) -> None:
+        """清空昵称缓存"""
+        self.cache.clear()
+
+    def stats(self) -> dict:
+        """缓存统计与批量查询次数"""
+        stats = self.cache.stats()
+        stats["batch_calls"] = self.batch_calls
+        return stats
+
+
+# 进程内共享实例：监听、调度任务与各服务共用同一份昵称缓存
+identity_service = IdentityService()
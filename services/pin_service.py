@@ -6,7 +6,7 @@ Pin 处理服务
 2. 获取消息详情（含附件）
 3. 附件转存
 4. Bitable 归档
-5. 用户信息获取（带缓存）
+5. 用户信息获取（共享身份服务缓存）
 6. 去重机制
 7. 精华文档写入
 
@@ -20,13 +20,22 @@ import os
 import time
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Any
+from typing import Dict, List, Optional, Any
 
 import requests
 
+from config import (
+    CACHE_NEGATIVE_TTL_SECONDS,
+    CACHE_PIN_DETAIL_SIZE,
+    CACHE_PIN_DETAIL_TTL_SECONDS,
+    PROCESSED_LOG_COMPACT_MIN_LINES,
+    PROCESSED_PIN_RETENTION_DAYS,
+)
+from processed_log import ProcessedIdLog
 from rate_limiter import with_rate_limit
-from utils import ThreadSafeLRUCache
+from utils import TTLCache
 from services.file_upload_service import FileUploadService
+from services.identity_service import identity_service
 
 
 class PinService:
@@ -47,8 +56,9 @@ class PinService:
     MAX_PIN_PAGE_SIZE = 50
 
     # 类级别的缓存（所有实例共享）
-    _user_name_cache = ThreadSafeLRUCache(capacity=500)
-    _pin_details_cache = ThreadSafeLRUCache(capacity=200)
+    _pin_details_cache = TTLCache(
+        capacity=CACHE_PIN_DETAIL_SIZE, ttl=CACHE_PIN_DETAIL_TTL_SECONDS, negative_ttl=CACHE_NEGATIVE_TTL_SECONDS
+    )
 
     @staticmethod
     @with_rate_limit
@@ -123,7 +133,6 @@ class PinService:
         return all_pins
 
     @staticmethod
-    @with_rate_limit
     def get_message_detail(message_id: str, auth_token: str) -> Optional[dict]:
         """
         获取消息详情（含附件）
@@ -143,11 +152,18 @@ class PinService:
             - file_key: 文件 key
             - file_name: 文件名
             - image_key: 图片 key
+
+        Note:
+            结果带过期时间缓存，命中缓存时不占用 API 限流额度；获取失败时短期负缓存
         """
-        # 检查缓存
-        if message_id in PinService._pin_details_cache:
-            return PinService._pin_details_cache.get(message_id)
+        return PinService._pin_details_cache.get_or_load(
+            message_id, lambda: PinService._fetch_message_detail(message_id, auth_token)
+        )
 
+    @staticmethod
+    @with_rate_limit
+    def _fetch_message_detail(message_id: str, auth_token: str) -> Optional[dict]:
+        """请求消息详情接口并整理字段，失败返回 None"""
         headers = {
             "Authorization": auth_token if auth_token.startswith("Bearer ") else f"Bearer {auth_token}",
             "Content-Type": "application/json",
@@ -191,8 +207,6 @@ class PinService:
                     "image_key": content_obj.get("image_key"),
                 }
 
-                # 存入缓存
-                PinService._pin_details_cache.set(message_id, details)
                 return details
             else:
                 print(f"  > [PinService] ❌ 获取消息详情失败: {data.get('msg')}")
@@ -250,7 +264,7 @@ class PinService:
     @staticmethod
     def get_user_name(user_id: str, chat_id: str, auth_token: str) -> str:
         """
-        获取用户昵称（带缓存，群备注优先）
+        获取用户昵称（进程内共享缓存，群备注优先）
 
         Args:
             user_id: 用户 ID
@@ -263,35 +277,44 @@ class PinService:
         if not user_id:
             return user_id
 
-        # 检查缓存
-        if user_id in PinService._user_name_cache:
-            return PinService._user_name_cache.get(user_id)
+        return identity_service.get_name(
+            user_id,
+            fetch_names=lambda user_ids: PinService._fetch_chat_member_names(user_ids, chat_id, auth_token),
+            scope=(chat_id, "user_id"),
+        )
 
+    @staticmethod
+    def _fetch_chat_member_names(user_ids: List[str], chat_id: str, auth_token: str) -> Dict[str, str]:
+        """批量查询群成员备注名（每次最多 50 个），未找到的用户不出现在结果中"""
         headers = {
             "Authorization": auth_token if auth_token.startswith("Bearer ") else f"Bearer {auth_token}",
         }
+        url = f"{PinService.BASE_URL}/im/v1/chats/{chat_id}/members"
+        names = {}
 
-        try:
-            # 获取群成员信息（群备注）
-            url = f"{PinService.BASE_URL}/im/v1/chats/{chat_id}/members"
-            params = {"member_id_type": "user_id", "member_ids": user_id}
-
-            response = requests.get(url, headers=headers, params=params, timeout=10)
-            data = response.json()
-
-            if data.get("code") == 0:
-                items = data.get("data", {}).get("items", [])
-                if items:
-                    name = items[0].get("name") or user_id
-                    PinService._user_name_cache.set(user_id, name)
-                    return name
-
-        except Exception as e:
-            print(f"  > [PinService] ⚠️ 获取群成员信息失败: {e}")
-
-        # 缓存并返回 user_id
-        PinService._user_name_cache.set(user_id, user_id)
-        return user_id
+        for i in range(0, len(user_ids), 50):
+            batch_ids = user_ids[i:i + 50]
+            params = {"member_id_type": "user_id", "member_ids": ",".join(batch_ids)}
+            try:
+                response = requests.get(url, headers=headers, params=params, timeout=10)
+                data = response.json()
+            except Exception as e:
+                print(f"  > [PinService] ⚠️ 获取群成员信息失败: {e}")
+                continue
+
+            if data.get("code") != 0:
+                continue
+            items = data.get("data", {}).get("items", [])
+            for item in items:
+                member_id = item.get("member_id")
+                if isinstance(member_id, dict):
+                    member_id = member_id.get("user_id")
+                # 单个查询时接口可能不返回 member_id
+                member_id = member_id or (batch_ids[0] if len(batch_ids) == 1 else None)
+                if member_id and item.get("name"):
+                    names[member_id] = item["name"]
+
+        return names
 
     @staticmethod
     def download_and_upload_resource(
@@ -472,45 +495,46 @@ class PinService:
             return False
 
     @staticmethod
-    def load_processed_ids() -> Set[str]:
+    def load_processed_ids() -> ProcessedIdLog:
         """
-        加载已处理的 Pin 消息 ID 集合
+        加载已处理的 Pin 消息 ID 日志
 
         Returns:
-            已处理的消息 ID 集合
+            追加写入的 ID 日志，支持 ``in`` 判断（O(1)）
         """
-        if not PinService.PROCESSED_FILE.exists():
-            return set()
-
-        try:
-            with open(PinService.PROCESSED_FILE, "r", encoding="utf-8") as f:
-                return {line.strip() for line in f if line.strip()}
-        except Exception as e:
-            print(f"  > [PinService] ⚠️ 读取已处理记录失败: {e}")
-            return set()
+        return ProcessedIdLog(PinService.PROCESSED_FILE, compact_min_lines=PROCESSED_LOG_COMPACT_MIN_LINES)
 
     @staticmethod
-    def save_processed_ids(processed_ids: Set[str]) -> bool:
+    def save_processed_ids(processed_ids, retention_days: int = PROCESSED_PIN_RETENTION_DAYS) -> bool:
         """
-        保存已处理的 Pin 消息 ID 集合
+        保存已处理的 Pin 消息 ID
+
+        只追加尚未记录的 ID，并按保留期裁剪、按需压缩，不再全量重写文件
 
         Args:
-            processed_ids: 已处理的消息 ID 集合
+            processed_ids: ``{message_id: pin_time_ms}`` 映射、ID 集合或 ProcessedIdLog
+            retention_days: 保留天数，早于该时间的 Pin 记录会在压缩时移除
 
         Returns:
             成功返回 True，失败返回 False
         """
         try:
-            with open(PinService.PROCESSED_FILE, "w", encoding="utf-8") as f:
-                for msg_id in processed_ids:
-                    f.write(f"{msg_id}\n")
+            log = (
+                processed_ids
+                if isinstance(processed_ids, ProcessedIdLog)
+                else PinService.load_processed_ids()
+            )
+            if log is not processed_ids:
+                log.update(processed_ids)
+            retention_start_ms = int((time.time() - retention_days * 86400) * 1000)
+            log.maybe_compact(min_pin_time_ms=retention_start_ms)
             return True
         except Exception as e:
             print(f"  > [PinService] ⚠️ 保存处理记录失败: {e}")
             return False
 
     @staticmethod
-    def is_processed(message_id: str, processed_ids: Set[str]) -> bool:
+    def is_processed(message_id: str, processed_ids) -> bool:
         """
         检查消息是否已处理
 
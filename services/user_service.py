@@ -5,7 +5,7 @@
 1. 单个用户信息获取
 2. 批量用户信息获取
 3. 群备注优先逻辑
-4. 缓存优化
+4. 缓存优化：昵称经 identity_service 统一缓存（带过期时间、负缓存、并发合并查询），本地仅缓存头像
 """
 
 import os
@@ -13,8 +13,13 @@ from typing import Dict, List, Optional
 
 import requests
 
+from config import CACHE_NEGATIVE_TTL_SECONDS, CACHE_USER_NAME_SIZE, CACHE_USER_NAME_TTL_SECONDS
 from rate_limiter import with_rate_limit
-from utils import ThreadSafeLRUCache
+from utils import TTLCache
+from services.identity_service import Scope, identity_service
+
+# 通讯录昵称作用域（不区分群）；群备注使用 (群 ID, "user_id") 作用域
+CONTACT_SCOPE: Scope = ("contact", "user_id")
 
 
 class UserService:
@@ -30,15 +35,15 @@ class UserService:
 
     # API 端点
     BASE_URL = "https://open.feishu.cn/open-apis"
-    USER_INFO_URL = f"{BASE_URL}/contact/v3/users"
     BATCH_USER_INFO_URL = f"{BASE_URL}/contact/v3/users/batch_get"
     CHAT_MEMBERS_URL = f"{BASE_URL}/im/v1/chats"
 
-    # 类级别的缓存（所有实例共享）
-    _cache = ThreadSafeLRUCache(capacity=500)
+    # 类级别的头像缓存（所有实例共享）；昵称统一由 identity_service 缓存，此处只缓存其不持有的头像
+    _avatars = TTLCache(
+        capacity=CACHE_USER_NAME_SIZE, ttl=CACHE_USER_NAME_TTL_SECONDS, negative_ttl=CACHE_NEGATIVE_TTL_SECONDS
+    )
 
     @staticmethod
-    @with_rate_limit
     def get_user_info(
         user_id: str,
         auth_token: str,
@@ -67,84 +72,9 @@ class UserService:
         if not user_id:
             return None
 
-        # 检查缓存
-        cache_key = f"user:{user_id}:{chat_id or 'default'}"
-        if cache_key in UserService._cache:
-            return UserService._cache.get(cache_key)
-
-        headers = {
-            "Authorization": auth_token if auth_token.startswith("Bearer ") else f"Bearer {auth_token}",
-        }
-
-        # 如果提供了 chat_id，优先获取群备注
-        if chat_id:
-            user_info = UserService._get_chat_member_info(user_id, chat_id, headers)
-            if user_info:
-                UserService._cache.set(cache_key, user_info)
-                return user_info
-
-        # 降级：获取用户基本信息
-        url = f"{UserService.USER_INFO_URL}/{user_id}"
-        try:
-            response = requests.get(url, headers=headers, timeout=10)
-            data = response.json()
-
-            if data.get("code") == 0:
-                user_data = data.get("data", {}).get("user", {})
-                user_info = {
-                    "user_id": user_id,
-                    "name": user_data.get("name", user_id),
-                    "avatar_url": user_data.get("avatar", {}).get("avatar_240")
-                }
-                UserService._cache.set(cache_key, user_info)
-                return user_info
-            else:
-                print(f"  > [UserService] ⚠️ 获取用户信息失败: {data.get('msg')}")
-                return None
-
-        except Exception as e:
-            print(f"  > [UserService] ❌ 获取用户信息异常: {e}")
-            return None
+        return UserService.get_batch_user_info([user_id], auth_token, chat_id).get(user_id)
 
     @staticmethod
-    def _get_chat_member_info(user_id: str, chat_id: str, headers: dict) -> Optional[dict]:
-        """
-        获取群成员信息（群备注优先）
-
-        Args:
-            user_id: 用户 ID
-            chat_id: 群组 ID
-            headers: 请求头
-
-        Returns:
-            用户信息字典，失败返回 None
-        """
-        url = f"{UserService.CHAT_MEMBERS_URL}/{chat_id}/members"
-        params = {
-            "member_id_type": "user_id",
-            "member_ids": user_id
-        }
-
-        try:
-            response = requests.get(url, headers=headers, params=params, timeout=10)
-            data = response.json()
-
-            if data.get("code") == 0:
-                items = data.get("data", {}).get("items", [])
-                if items:
-                    member = items[0]
-                    return {
-                        "user_id": user_id,
-                        "name": member.get("name", user_id),
-                        "avatar_url": None  # 群成员接口不返回头像
-                    }
-        except Exception as e:
-            print(f"  > [UserService] ⚠️ 获取群成员信息失败: {e}")
-
-        return None
-
-    @staticmethod
-    @with_rate_limit
     def get_batch_user_info(
         user_ids: List[str],
         auth_token: str,
@@ -153,6 +83,10 @@ class UserService:
         """
         批量获取用户信息
 
+        昵称经 identity_service 解析：群备注按 (群 ID, "user_id") 作用域缓存（与 PinService 共享），
+        不在群内的用户回落通讯录昵称（CONTACT_SCOPE）。命中缓存时不占用 API 限流额度，
+        并发查询的未命中合并为一次批量请求。
+
         Args:
             user_ids: 用户 ID 列表
             auth_token: 认证 Token
@@ -169,18 +103,49 @@ class UserService:
         if not user_ids:
             return {}
 
-        result = {}
+        names = {}
 
-        # 如果提供了 chat_id，优先使用群成员接口
+        # 如果提供了 chat_id，优先使用群成员备注
         if chat_id:
-            result = UserService._batch_get_chat_members(user_ids, chat_id, auth_token)
-
-        # 对于未获取到的用户，使用批量用户信息接口
-        remaining_ids = [uid for uid in user_ids if uid not in result]
+            names = identity_service.get_names(
+                user_ids,
+                fetch_names=lambda ids: UserService._fetch_chat_member_names(ids, chat_id, auth_token),
+                scope=(chat_id, "user_id"),
+            )
+
+        # 对于未获取到的用户，使用通讯录昵称
+        remaining_ids = [uid for uid in user_ids if uid not in names]
         if remaining_ids:
-            result.update(UserService._batch_get_user_info(remaining_ids, auth_token))
+            names.update(identity_service.get_names(
+                remaining_ids,
+                fetch_names=lambda ids: UserService._fetch_contact_names(ids, auth_token),
+                scope=CONTACT_SCOPE,
+            ))
+
+        return {
+            uid: {"user_id": uid, "name": name, "avatar_url": UserService._avatars.get(uid)}
+            for uid, name in names.items()
+        }
 
-        return result
+    @staticmethod
+    @with_rate_limit
+    def _fetch_chat_member_names(user_ids: List[str], chat_id: str, auth_token: str) -> Dict[str, str]:
+        """查询群备注名（identity_service 的批量查询函数）"""
+        return UserService._names_of(UserService._batch_get_chat_members(user_ids, chat_id, auth_token))
+
+    @staticmethod
+    @with_rate_limit
+    def _fetch_contact_names(user_ids: List[str], auth_token: str) -> Dict[str, str]:
+        """查询通讯录昵称（identity_service 的批量查询函数），顺带缓存头像"""
+        return UserService._names_of(UserService._batch_get_user_info(user_ids, auth_token))
+
+    @staticmethod
+    def _names_of(infos: Dict[str, dict]) -> Dict[str, str]:
+        """缓存用户信息中的头像，返回 {user_id: name}"""
+        for uid, info in infos.items():
+            if info.get("avatar_url"):
+                UserService._avatars.set(uid, info["avatar_url"])
+        return {uid: info.get("name") for uid, info in infos.items()}
 
     @staticmethod
     def _batch_get_chat_members(
@@ -267,11 +232,17 @@ class UserService:
 
     @staticmethod
     def clear_cache():
-        """清空缓存"""
-        UserService._cache.clear()
+        """清空缓存（头像缓存与进程内共享的昵称缓存）"""
+        UserService._avatars.clear()
+        identity_service.clear()
         print("  > [UserService] ✅ 用户缓存已清空")
 
     @staticmethod
     def get_cache_size() -> int:
-        """获取缓存大小"""
-        return len(UserService._cache)
+        """获取头像缓存大小"""
+        return len(UserService._avatars)
+
+    @staticmethod
+    def get_cache_stats() -> dict:
+        """获取头像缓存命中 / 未命中 / 淘汰等统计（昵称缓存见 identity_service.stats()）"""
+        return UserService._avatars.stats()
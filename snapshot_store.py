@@ -0,0 +1,290 @@
+"""
+撤回回滚快照存储
+
+撤回回滚依赖每条消息的计分贡献快照。原先快照存放在 1000 条容量的内存 LRU 中，
+群内消息较多时，较早消息被撤回会因快照已被挤出而无法回滚，重启后更是全部丢失。
+本模块将快照持久化：
+- 每条快照打包为紧凑的定长布局二进制记录（struct），不在内存中保留 Python dict
+- SQLite 主键索引按 message_id 查找，常驻内存仅为 SQLite 页缓存，不随消息量增长
+- 保留期与飞书消息可撤回时限一致，定期清理过期快照
+- 已回滚标记与快照存放在同一行，重启后撤回回滚仍然幂等
+
+记录布局（小端）:
+    头部   char_count:uint32 | flags:uint8 | mention_count:uint8
+    ID 槽  length:uint8 | open_id:63 字节（依次为发送者、被回复者[flags 含 REPLY 时]、各被@者）
+"""
+
+import sqlite3
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+from config import MESSAGE_SNAPSHOT_PURGE_EVERY, MESSAGE_SNAPSHOT_RETENTION_SECONDS
+
+_HEADER = struct.Struct("<IBB")
+_ID_SLOT = struct.Struct("<B63s")
+_MAX_ID_BYTES = 63
+_MAX_MENTIONS = 255
+
+FLAG_TOPIC_INITIATED = 0x01
+FLAG_HAS_REPLY_TARGET = 0x02
+
+
+def _pack_id(user_id: str) -> bytes:
+    raw = (user_id or "").encode("utf-8")
+    if len(raw) > _MAX_ID_BYTES:
+        raise ValueError(f"用户ID超过 {_MAX_ID_BYTES} 字节: {user_id}")
+    return _ID_SLOT.pack(len(raw), raw)
+
+
+def _unpack_id(record: bytes, offset: int) -> str:
+    length, raw = _ID_SLOT.unpack_from(record, offset)
+    return raw[:length].decode("utf-8")
+
+
+def pack_contribution(contribution: Dict) -> bytes:
+    """
+    将贡献快照打包为定长布局记录
+
+    仅保存回滚所需的字段；昵称不落盘，回滚时按 user_id 重新获取
+
+    Raises:
+        ValueError: 用户ID过长或被@人数超过 255 时
+    """
+    sender_metrics = contribution.get("sender_metrics") or {}
+    reply_target = contribution.get("reply_target") or {}
+    mention_ids = [t.get("user_id") for t in contribution.get("mention_targets") or [] if t.get("user_id")]
+    if len(mention_ids) > _MAX_MENTIONS:
+        raise ValueError(f"被@人数超过 {_MAX_MENTIONS}")
+
+    flags = 0
+    if sender_metrics.get("topic_initiated"):
+        flags |= FLAG_TOPIC_INITIATED
+    if reply_target.get("user_id"):
+        flags |= FLAG_HAS_REPLY_TARGET
+
+    parts = [
+        _HEADER.pack(int(sender_metrics.get("char_count") or 0), flags, len(mention_ids)),
+        _pack_id(contribution.get("sender_id")),
+    ]
+    if flags & FLAG_HAS_REPLY_TARGET:
+        parts.append(_pack_id(reply_target["user_id"]))
+    parts.extend(_pack_id(user_id) for user_id in mention_ids)
+    return b"".join(parts)
+
+
+def unpack_contribution(message_id: str, record: bytes) -> Dict:
+    """将定长布局记录还原为贡献快照（昵称字段为 None）"""
+    char_count, flags, mention_count = _HEADER.unpack_from(record, 0)
+    offset = _HEADER.size
+    sender_id = _unpack_id(record, offset)
+    offset += _ID_SLOT.size
+
+    reply_target = None
+    if flags & FLAG_HAS_REPLY_TARGET:
+        reply_target = {"user_id": _unpack_id(record, offset), "user_name": None}
+        offset += _ID_SLOT.size
+
+    mention_targets = []
+    for _ in range(mention_count):
+        mention_targets.append({"user_id": _unpack_id(record, offset), "user_name": None})
+        offset += _ID_SLOT.size
+
+    return {
+        "message_id": message_id,
+        "sender_id": sender_id,
+        "sender_name": None,
+        "sender_metrics": {
+            "message_count": 1,
+            "char_count": char_count,
+            "reply_received": 0,
+            "mention_received": 0,
+            "topic_initiated": 1 if flags & FLAG_TOPIC_INITIATED else 0,
+        },
+        "reply_target": reply_target,
+        "mention_targets": mention_targets,
+    }
+
+
+class _RetractedMarks:
+    """已回滚标记视图，兼容 LRU 缓存的 ``in`` / ``set`` / ``clear`` 用法"""
+
+    def __init__(self, store: "MessageSnapshotStore"):
+        self._store = store
+
+    def __contains__(self, message_id: object) -> bool:
+        return self._store.is_retracted(str(message_id))
+
+    def set(self, message_id: str, value: object = True) -> None:
+        self._store.mark_retracted(message_id)
+
+    def clear(self) -> None:
+        self._store.clear_retracted()
+
+
+class MessageSnapshotStore:
+    """
+    持久化的消息贡献快照存储
+
+    兼容 ``ThreadSafeLRUCache`` 的 ``in`` / ``get`` / ``set`` / ``clear`` 用法，
+    可直接作为 StreamingMetricsEngine 的 contributions；``retracted`` 属性可作为其 retracted
+
+    Attributes:
+        path: SQLite 文件路径（":memory:" 表示不落盘）
+        retention_seconds: 快照保留期（秒）
+        purge_every: 每新增多少条快照清理一次过期快照
+
+    Example:
+        >>> store = MessageSnapshotStore(":memory:")
+        >>> store.set("om_1", {"sender_id": "ou_a", "sender_metrics": {"char_count": 5}})
+        >>> store.get("om_1")["sender_metrics"]["char_count"]
+        5
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        retention_seconds: float = MESSAGE_SNAPSHOT_RETENTION_SECONDS,
+        purge_every: int = MESSAGE_SNAPSHOT_PURGE_EVERY,
+    ):
+        self.path = str(path)
+        self.retention_seconds = retention_seconds
+        self.purge_every = max(1, purge_every)
+        self.retracted = _RetractedMarks(self)
+        self._lock = threading.Lock()
+        self._inserted_since_purge = 0
+        self._conn = self._open()
+
+    def _open(self) -> sqlite3.Connection:
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        try:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        except sqlite3.Error as e:
+            # 快照是撤回回滚的唯一依据，磁盘不可用时退化为进程内数据库，重启后丢失
+            print(f"⚠️ 打开撤回快照库失败({self.path})，降级为内存存储: {e}")
+            conn = sqlite3.connect(":memory:", check_same_thread=False, isolation_level=None)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS message_snapshots ("
+            "message_id TEXT PRIMARY KEY, created_at REAL NOT NULL, "
+            "retracted INTEGER NOT NULL DEFAULT 0, record BLOB)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_message_snapshots_created_at ON message_snapshots(created_at)"
+        )
+        return conn
+
+    def _row(self, message_id: str, now: float):
+        row = self._conn.execute(
+            "SELECT created_at, retracted, record FROM message_snapshots WHERE message_id = ?",
+            (message_id,),
+        ).fetchone()
+        if row and now - row[0] < self.retention_seconds:
+            return row
+        return None
+
+    def set(self, message_id: str, contribution: Dict, now: Optional[float] = None) -> None:
+        """
+        保存贡献快照（覆盖同一消息的旧快照）
+
+        无法打包或写入失败时打印警告并跳过，不影响实时统计
+        """
+        if not message_id:
+            return
+        now = time.time() if now is None else now
+        try:
+            record = pack_contribution(contribution)
+        except ValueError as e:
+            print(f"⚠️ 消息 {message_id} 快照无法保存，撤回时将无法回滚: {e}")
+            return
+
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO message_snapshots (message_id, created_at, retracted, record) "
+                    "VALUES (?, ?, 0, ?)",
+                    (message_id, now, record),
+                )
+            except sqlite3.Error as e:
+                print(f"⚠️ 写入撤回快照失败: {e}")
+                return
+            self._inserted_since_purge += 1
+            if self._inserted_since_purge >= self.purge_every:
+                self._purge_locked(now)
+
+    def get(self, message_id: str, default: Optional[Dict] = None, now: Optional[float] = None) -> Optional[Dict]:
+        """读取保留期内的贡献快照"""
+        now = time.time() if now is None else now
+        with self._lock:
+            row = self._row(message_id, now)
+        if not row or row[2] is None:
+            return default
+        return unpack_contribution(message_id, row[2])
+
+    def __contains__(self, message_id: object) -> bool:
+        with self._lock:
+            row = self._row(str(message_id), time.time())
+        return bool(row) and row[2] is not None
+
+    def is_retracted(self, message_id: str) -> bool:
+        with self._lock:
+            row = self._row(message_id, time.time())
+        return bool(row and row[1])
+
+    def mark_retracted(self, message_id: str, now: Optional[float] = None) -> None:
+        """标记消息已回滚；快照已过期或不存在时写入仅含标记的记录"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO message_snapshots (message_id, created_at, retracted, record) VALUES (?, ?, 1, NULL) "
+                "ON CONFLICT(message_id) DO UPDATE SET retracted = 1",
+                (message_id, now),
+            )
+
+    def _purge_locked(self, now: float) -> int:
+        self._inserted_since_purge = 0
+        try:
+            cursor = self._conn.execute(
+                "DELETE FROM message_snapshots WHERE created_at < ?", (now - self.retention_seconds,)
+            )
+            return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"⚠️ 清理撤回快照失败: {e}")
+            return 0
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """
+        删除保留期外的快照
+
+        Returns:
+            删除的记录数
+        """
+        with self._lock:
+            return self._purge_locked(time.time() if now is None else now)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM message_snapshots WHERE record IS NOT NULL"
+            ).fetchone()[0]
+
+    def clear_retracted(self) -> None:
+        """清除全部已回滚标记"""
+        with self._lock:
+            self._conn.execute("DELETE FROM message_snapshots WHERE record IS NULL")
+            self._conn.execute("UPDATE message_snapshots SET retracted = 0 WHERE retracted = 1")
+
+    def clear(self) -> None:
+        """清空全部快照与标记"""
+        with self._lock:
+            self._inserted_since_purge = 0
+            self._conn.execute("DELETE FROM message_snapshots")
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
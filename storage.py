@@ -3,13 +3,30 @@ import time
 import os
 from datetime import datetime
 from dotenv import load_dotenv
-from config import ACTIVITY_WEIGHTS
+from scoring import compute_score_from_fields, ScoringEngine, METRIC_FIELD_NAMES
 from rate_limiter import with_rate_limit
 import json  # Added json import
 
 load_dotenv()
 
 
+def _field_text(value) -> str:
+    """多维表格文本字段值转为字符串（搜索接口返回 [{"type": "text", "text": ...}] 分段列表）"""
+    if isinstance(value, list):
+        return "".join(
+            str(seg.get("text", "")) if isinstance(seg, dict) else str(seg) for seg in value
+        )
+    return "" if value is None else str(value)
+
+
+def _field_int(value) -> int:
+    """多维表格数值字段值转为整数，无法转换时视为 0"""
+    try:
+        return int(float(value or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
 class BitableStorage:
     def __init__(self, auth):
         self.auth = auth
@@ -88,17 +105,7 @@ class BitableStorage:
                 }
             )
             # 重新计算分数（使用配置文件中的权重）
-            score = (
-                fields["发言次数"] * ACTIVITY_WEIGHTS["message_count"]
-                + fields["发言字数"] * ACTIVITY_WEIGHTS["char_count"]
-                + fields["被回复数"] * ACTIVITY_WEIGHTS["reply_received"]
-                + fields["单独被@次数"] * ACTIVITY_WEIGHTS["mention_received"]
-                + fields["发起话题数"] * ACTIVITY_WEIGHTS["topic_initiated"]
-                + fields["点赞数"] * ACTIVITY_WEIGHTS["reaction_given"]
-                + fields["被点赞数"] * ACTIVITY_WEIGHTS["reaction_received"]
-                + int(old_fields.get("被Pin次数", 0)) * ACTIVITY_WEIGHTS.get("pin_received", 0)
-            )
-            fields["活跃度分数"] = round(score, 2)
+            fields["活跃度分数"] = compute_score_from_fields({**old_fields, **fields})
 
             url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.app_token}/tables/{self.table_id}/records/{record_id}"
             print(f"  > [API] 正在更新记录 {record_id}...")
@@ -134,17 +141,7 @@ class BitableStorage:
                     "被Pin次数": 0,
                 }
             )
-            score = (
-                fields["发言次数"] * ACTIVITY_WEIGHTS["message_count"]
-                + fields["发言字数"] * ACTIVITY_WEIGHTS["char_count"]
-                + fields["被回复数"] * ACTIVITY_WEIGHTS["reply_received"]
-                + fields["单独被@次数"] * ACTIVITY_WEIGHTS["mention_received"]
-                + fields["发起话题数"] * ACTIVITY_WEIGHTS["topic_initiated"]
-                + fields["点赞数"] * ACTIVITY_WEIGHTS["reaction_given"]
-                + fields["被点赞数"] * ACTIVITY_WEIGHTS["reaction_received"]
-                + fields["被Pin次数"] * ACTIVITY_WEIGHTS.get("pin_received", 0)
-            )
-            fields["活跃度分数"] = round(score, 2)
+            fields["活跃度分数"] = compute_score_from_fields(fields)
 
             url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.app_token}/tables/{self.table_id}/records"
             print(f"  > [API] 正在创建新记录...")
@@ -293,19 +290,10 @@ class BitableStorage:
             new_count = current_count + 1
 
             # 重新计算分数
-            score = (
-                int(old_fields.get("发言次数", 0)) * ACTIVITY_WEIGHTS["message_count"]
-                + int(old_fields.get("发言字数", 0)) * ACTIVITY_WEIGHTS["char_count"]
-                + int(old_fields.get("被回复数", 0)) * ACTIVITY_WEIGHTS["reply_received"]
-                + int(old_fields.get("单独被@次数", 0)) * ACTIVITY_WEIGHTS["mention_received"]
-                + int(old_fields.get("发起话题数", 0)) * ACTIVITY_WEIGHTS["topic_initiated"]
-                + int(old_fields.get("点赞数", 0)) * ACTIVITY_WEIGHTS["reaction_given"]
-                + int(old_fields.get("被点赞数", 0)) * ACTIVITY_WEIGHTS["reaction_received"]
-                + new_count * ACTIVITY_WEIGHTS.get("pin_received", 0)
-            )
+            score = compute_score_from_fields({**old_fields, "被Pin次数": new_count})
 
             url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.app_token}/tables/{self.table_id}/records/{record_id}"
-            fields = {"被Pin次数": new_count, "活跃度分数": round(score, 2)}
+            fields = {"被Pin次数": new_count, "活跃度分数": score}
 
             try:
                 response = requests.put(
@@ -333,9 +321,9 @@ class BitableStorage:
                 "发起话题数": 0,
                 "点赞数": 0,
                 "被点赞数": 0,
-                "活跃度分数": 0,
                 "更新时间": int(datetime.now().timestamp() * 1000),
             }
+            fields["活跃度分数"] = compute_score_from_fields(fields)
 
             url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.app_token}/tables/{self.table_id}/records"
             try:
@@ -358,6 +346,127 @@ class BitableStorage:
         print(f"[Pin统计] ℹ️ 检测到取消Pin操作，但配置为不扣除活跃度/次数")
         return
 
+    @with_rate_limit
+    def _search_month_page(self, month, page_token=None, page_size=500):
+        """分页查询某统计周期的全部记录（单页）"""
+        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.app_token}/tables/{self.table_id}/records/search"
+        params = {"page_size": page_size}
+        if page_token:
+            params["page_token"] = page_token
+        payload = {
+            "filter": {
+                "conjunction": "and",
+                "conditions": [{"field_name": "统计周期", "operator": "is", "value": [month]}],
+            }
+        }
+        response = requests.post(url, headers=self.auth.get_headers(), params=params, json=payload, timeout=10)
+        data = response.json()
+        if data.get("code") != 0:
+            raise Exception(f"Bitable API 返回错误: {data}")
+        data_obj = data.get("data") or {}
+        next_token = data_obj.get("page_token") if data_obj.get("has_more") else None
+        return data_obj.get("items") or [], next_token
+
+    @with_rate_limit
+    def _batch_update_records(self, records):
+        """批量更新记录（单次最多 500 条）"""
+        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.app_token}/tables/{self.table_id}/records/batch_update"
+        response = requests.post(url, headers=self.auth.get_headers(), json={"records": records}, timeout=30)
+        result = response.json()
+        if result.get("code") != 0:
+            raise Exception(f"Bitable API 返回错误: {result}")
+
+    @with_rate_limit
+    def _batch_create_records(self, records):
+        """批量创建记录（单次最多 500 条）"""
+        url = f"https://open.feishu.cn/open-apis/bitable/v1/apps/{self.app_token}/tables/{self.table_id}/records/batch_create"
+        response = requests.post(url, headers=self.auth.get_headers(), json={"records": records}, timeout=30)
+        result = response.json()
+        if result.get("code") != 0:
+            raise Exception(f"Bitable API 返回错误: {result}")
+
+    def bulk_upsert_month(self, month, user_metrics, batch_size=500, metric_keys=None):
+        """
+        以重建结果覆盖某月的活跃度指标（批量更新已有记录、批量创建缺失记录）
+
+        只覆盖 metric_keys 中重建过的指标；其余指标（被Pin次数、未重新统计的点赞数等）
+        保留表中已有值并参与分数计算
+
+        Args:
+            month: 统计周期 (YYYY-MM)
+            user_metrics: {user_id: {"user_name": str, "metrics": {指标名: 值}}}
+            batch_size: 每次批量请求的记录数
+            metric_keys: 本次重建的指标名集合，默认除被Pin次数外的全部指标
+
+        Returns:
+            tuple: (更新条数, 创建条数)
+        """
+        existing, page_token = self._search_month_page(month)
+        while page_token:
+            page_items, page_token = self._search_month_page(month, page_token)
+            existing.extend(page_items)
+        records_by_user = {_field_text(r.get("fields", {}).get("用户ID")): r for r in existing}
+        if metric_keys is None:
+            metric_keys = set(METRIC_FIELD_NAMES) - {"pin_received"}
+
+        now_ms = int(datetime.now().timestamp() * 1000)
+        to_update, to_create = [], []
+        for user_id, data in user_metrics.items():
+            metrics = data.get("metrics", {})
+            fields = {
+                "用户ID": user_id,
+                "用户名称": data.get("user_name") or user_id,
+                "人员": [{"id": user_id}],
+                "统计周期": month,
+                "更新时间": now_ms,
+            }
+            record = records_by_user.get(user_id)
+            old_fields = record.get("fields", {}) if record else {}
+            for key, field_name in METRIC_FIELD_NAMES.items():
+                if key in metric_keys:
+                    fields[field_name] = max(int(metrics.get(key, 0)), 0)
+                else:
+                    fields[field_name] = _field_int(old_fields.get(field_name))
+            fields["活跃度分数"] = compute_score_from_fields(fields)
+
+            if record:
+                to_update.append({"record_id": record["record_id"], "fields": fields})
+            else:
+                to_create.append({"fields": fields})
+
+        for i in range(0, len(to_update), batch_size):
+            self._batch_update_records(to_update[i : i + batch_size])
+        for i in range(0, len(to_create), batch_size):
+            self._batch_create_records(to_create[i : i + batch_size])
+
+        print(f"  > [API] ✅ {month} 指标批量写入完成: 更新 {len(to_update)} 条，新建 {len(to_create)} 条")
+        return len(to_update), len(to_create)
+
+    def rescore_month(self, month=None, weights=None, batch_size=500):
+        """
+        按当前（或指定）权重批量重算某月全部记录的活跃度分数
+
+        Args:
+            month: 统计周期 (YYYY-MM)，默认当月
+            weights: 指标权重，默认使用 config.ACTIVITY_WEIGHTS
+            batch_size: 每次批量更新的记录数
+
+        Returns:
+            int: 分数发生变化并已更新的记录数
+        """
+        month = month or datetime.now().strftime("%Y-%m")
+        records, page_token = self._search_month_page(month)
+        while page_token:
+            page_items, page_token = self._search_month_page(month, page_token)
+            records.extend(page_items)
+
+        updates = ScoringEngine(weights).rescore_records(records)
+        for i in range(0, len(updates), batch_size):
+            self._batch_update_records(updates[i : i + batch_size])
+
+        print(f"  > [API] ✅ {month} 活跃度分数重算完成: {len(updates)}/{len(records)} 条记录更新")
+        return len(updates)
+
 
 class MessageArchiveStorage:
     def __init__(self, auth):
@@ -0,0 +1,101 @@
+import threading
+import unittest
+from unittest.mock import MagicMock
+
+from services.async_card_service import AsyncCardService
+
+DOC_REF = ("docx", "doxcn_1", "https://x.feishu.cn/docx/doxcn_1")
+
+
+def _processor(cached=False):
+    processor = MagicMock()
+    processor.extract_doc_reference.side_effect = lambda text: DOC_REF if "feishu.cn" in text else None
+    processor.is_doc_cached.return_value = cached
+    processor._send_text_message.return_value = "om_placeholder"
+    processor.reply_document.return_value = True
+    return processor
+
+
+class TestAsyncCardService(unittest.TestCase):
+    def test_sends_placeholder_then_completes_in_background(self):
+        processor = _processor()
+        gate = threading.Event()
+        processor.reply_document.side_effect = lambda doc_ref, chat_id: gate.wait(5)
+        service = AsyncCardService(processor, max_workers=1)
+
+        # 后台任务未完成时已返回，且只发送了占位提示
+        self.assertTrue(service.process_message("看 https://x.feishu.cn/docx/doxcn_1", "oc_1"))
+        processor._send_text_message.assert_called_once_with("oc_1", AsyncCardService.PLACEHOLDER_TEXT)
+        processor.recall_message.assert_not_called()
+
+        gate.set()
+        service.shutdown()
+        processor.reply_document.assert_called_once_with(DOC_REF, "oc_1")
+        processor.recall_message.assert_called_once_with("om_placeholder")
+
+    def test_cached_doc_replies_in_background_without_placeholder(self):
+        processor = _processor(cached=True)
+        gate = threading.Event()
+        processor.reply_document.side_effect = lambda doc_ref, chat_id: gate.wait(5)
+        service = AsyncCardService(processor, max_workers=1)
+
+        # 缓存命中时渲染与上传仍不在监听线程执行
+        self.assertTrue(service.process_message("https://x.feishu.cn/docx/doxcn_1", "oc_1"))
+        self.assertEqual(service.pending, 1)
+
+        gate.set()
+        service.shutdown()
+
+        processor._send_text_message.assert_not_called()
+        processor.reply_document.assert_called_once_with(DOC_REF, "oc_1")
+        processor.recall_message.assert_not_called()
+        self.assertEqual(service.pending, 0)
+
+    def test_after_shutdown_no_placeholder_is_sent(self):
+        processor = _processor()
+        service = AsyncCardService(processor, max_workers=1)
+        service.shutdown()
+
+        self.assertFalse(service.process_message("https://x.feishu.cn/docx/doxcn_1", "oc_1"))
+        processor._send_text_message.assert_not_called()
+        processor.reply_document.assert_not_called()
+
+    def test_placeholder_is_recalled_when_submit_races_shutdown(self):
+        processor = _processor()
+        service = AsyncCardService(processor, max_workers=1)
+
+        def send_then_close(*_args):
+            # 占位提示发送后、提交任务前线程池被关闭
+            service._executor.shutdown()
+            return "om_placeholder"
+
+        processor._send_text_message.side_effect = send_then_close
+
+        self.assertFalse(service.process_message("https://x.feishu.cn/docx/doxcn_1", "oc_1"))
+        processor.recall_message.assert_called_once_with("om_placeholder")
+        processor.reply_document.assert_not_called()
+        self.assertEqual(service.pending, 0)
+
+    def test_non_doc_message_is_not_handled(self):
+        processor = _processor()
+        service = AsyncCardService(processor, max_workers=1)
+
+        self.assertFalse(service.process_message("你好", "oc_1"))
+        service.shutdown()
+        processor._send_text_message.assert_not_called()
+
+    def test_background_failure_sends_error_and_recalls_placeholder(self):
+        processor = _processor()
+        processor.reply_document.side_effect = RuntimeError("mcp down")
+        service = AsyncCardService(processor, max_workers=1)
+
+        future = service.submit(DOC_REF, "oc_1", "om_placeholder")
+
+        self.assertFalse(future.result(timeout=5))
+        processor._send_text_reply.assert_called_once()
+        processor.recall_message.assert_called_once_with("om_placeholder")
+        service.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import threading
+import time
+import unittest
+
+from services.identity_service import IdentityService
+
+
+class TestIdentityService(unittest.TestCase):
+    def test_concurrent_misses_are_batched_into_one_fetch(self):
+        calls = []
+        gate = threading.Event()
+
+        def fetch(user_ids):
+            calls.append(sorted(user_ids))
+            gate.wait(1)
+            return {uid: f"name-{uid}" for uid in user_ids if uid != "ou_ghost"}
+
+        service = IdentityService(fetch_names=fetch)
+        results = {}
+
+        def lookup(uid):
+            results[uid] = service.get_name(uid)
+
+        first = threading.Thread(target=lookup, args=("ou_1",))
+        first.start()
+        time.sleep(0.05)
+        # 第一次查询进行中到达的未命中，合并为下一批一次查询
+        others = [threading.Thread(target=lookup, args=(uid,)) for uid in ("ou_2", "ou_3", "ou_ghost", "ou_2")]
+        for t in others:
+            t.start()
+        time.sleep(0.05)
+        gate.set()
+        for t in [first, *others]:
+            t.join()
+
+        self.assertEqual(calls, [["ou_1"], ["ou_2", "ou_3", "ou_ghost"]])
+        self.assertEqual(results["ou_2"], "name-ou_2")
+        self.assertEqual(results["ou_ghost"], "ou_ghost")
+
+        # 命中与负缓存都不再请求
+        self.assertEqual(service.get_names(["ou_1", "ou_3", "ou_ghost"]), {"ou_1": "name-ou_1", "ou_3": "name-ou_3"})
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(service.stats()["batch_calls"], 2)
+
+    def test_member_list_warms_cache_and_fetch_errors_fall_back(self):
+        service = IdentityService()
+        service_calls = []
+
+        def member_list(user_ids):
+            service_calls.append(user_ids)
+            return {"ou_a": "A", "ou_b": "B"}
+
+        self.assertEqual(service.get_name("ou_a", fetch_names=member_list), "A")
+        self.assertEqual(service.get_name("ou_b", fetch_names=member_list), "B")
+        self.assertEqual(len(service_calls), 1)
+
+        def broken(user_ids):
+            raise RuntimeError("api down")
+
+        self.assertEqual(service.get_name("ou_c", fetch_names=broken), "ou_c")
+        with self.assertRaises(ValueError):
+            service.get_name("ou_d")
+
+    def test_concurrent_fetchers_for_different_scopes_are_not_mixed(self):
+        service = IdentityService()
+        chat_a_calls, chat_b_calls = [], []
+        a_started = threading.Event()
+        release_a = threading.Event()
+
+        def chat_a(user_ids):
+            chat_a_calls.append(sorted(user_ids))
+            a_started.set()
+            release_a.wait(2)
+            return {uid: f"a-{uid}" for uid in user_ids}
+
+        def chat_b(user_ids):
+            chat_b_calls.append(sorted(user_ids))
+            return {uid: f"b-{uid}" for uid in user_ids}
+
+        results = {}
+        thread_a = threading.Thread(
+            target=lambda: results.update(a=service.get_names(["ou_1"], chat_a, scope=("chat_a", "open_id")))
+        )
+        thread_a.start()
+        self.assertTrue(a_started.wait(2))
+        # chat_a 的批次进行中时，chat_b 的请求由 chat_b 自己的查询函数处理，同一用户昵称互不覆盖
+        thread_b = threading.Thread(
+            target=lambda: results.update(b=service.get_names(["ou_1", "ou_2"], chat_b, scope=("chat_b", "user_id")))
+        )
+        thread_b.start()
+        thread_b.join(2)
+        release_a.set()
+        thread_a.join(2)
+
+        self.assertEqual(results["a"], {"ou_1": "a-ou_1"})
+        self.assertEqual(results["b"], {"ou_1": "b-ou_1", "ou_2": "b-ou_2"})
+        self.assertEqual(chat_a_calls, [["ou_1"]])
+        self.assertEqual(chat_b_calls, [["ou_1", "ou_2"]])
+        self.assertEqual(service.get_name("ou_1", chat_b, scope=("chat_b", "user_id")), "b-ou_1")
+        self.assertEqual(service.get_name("ou_1", chat_a, scope=("chat_a", "open_id")), "a-ou_1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""
+UserService 单元测试
+
+测试昵称经 identity_service 统一缓存、本地仅缓存头像
+"""
+
+import os
+import sys
+from unittest.mock import Mock, patch
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from services.identity_service import identity_service
+from services.user_service import CONTACT_SCOPE, UserService
+
+
+def _response(payload):
+    response = Mock()
+    response.json.return_value = payload
+    return response
+
+
+@pytest.fixture(autouse=True)
+def _clean_caches():
+    UserService._avatars.clear()
+    identity_service.clear()
+    yield
+    UserService._avatars.clear()
+    identity_service.clear()
+
+
+class TestUserService:
+    """UserService 测试类"""
+
+    @patch('services.user_service.requests.post')
+    @patch('services.user_service.requests.get')
+    def test_names_are_read_from_identity_service(self, mock_get, mock_post):
+        """群备注与通讯录昵称只写入 identity_service，再次查询不请求接口"""
+        mock_get.return_value = _response({
+            "code": 0,
+            "data": {"items": [{"member_id": {"user_id": "u1"}, "name": "群备注"}]},
+        })
+        mock_post.return_value = _response({
+            "code": 0,
+            "data": {"user_list": [{"user_id": "u2", "name": "通讯录", "avatar": {"avatar_240": "http://a/u2"}}]},
+        })
+
+        first = UserService.get_batch_user_info(["u1", "u2"], "token", chat_id="oc_1")
+        second = UserService.get_batch_user_info(["u1", "u2"], "token", chat_id="oc_1")
+
+        assert first == second == {
+            "u1": {"user_id": "u1", "name": "群备注", "avatar_url": None},
+            "u2": {"user_id": "u2", "name": "通讯录", "avatar_url": "http://a/u2"},
+        }
+        assert mock_get.call_count == 1
+        assert mock_post.call_count == 1
+        assert identity_service.cache.lookup((("oc_1", "user_id"), "u1")) == (True, "群备注")
+        assert identity_service.cache.lookup((CONTACT_SCOPE, "u2")) == (True, "通讯录")
+        # 本地只缓存头像
+        assert UserService.get_cache_size() == 1
+
+    @patch('services.user_service.requests.get')
+    def test_renamed_member_is_seen_after_shared_cache_refresh(self, mock_get):
+        """其他模块（如 PinService）刷新共享缓存后，UserService 不会返回旧昵称"""
+        identity_service.prime({"u1": "旧名"}, scope=("oc_1", "user_id"))
+        assert UserService.get_user_info("u1", "token", chat_id="oc_1")["name"] == "旧名"
+
+        identity_service.prime({"u1": "新名"}, scope=("oc_1", "user_id"))
+
+        assert UserService.get_user_info("u1", "token", chat_id="oc_1")["name"] == "新名"
+        mock_get.assert_not_called()
+
+    @patch('services.user_service.requests.post')
+    def test_unknown_user_returns_none_and_is_negative_cached(self, mock_post):
+        """查无此人返回 None，负缓存期内不重复请求"""
+        mock_post.return_value = _response({"code": 0, "data": {"user_list": []}})
+
+        assert UserService.get_user_info("ghost", "token") is None
+        assert UserService.get_user_info("ghost", "token") is None
+        assert mock_post.call_count == 1
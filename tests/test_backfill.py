@@ -0,0 +1,205 @@
+import json
+from datetime import datetime
+from unittest.mock import Mock
+
+import pytest
+
+from backfill import HistoryBackfill
+from collector import MessageCollector
+
+
+def _ms(*args):
+    return str(int(datetime(*args).timestamp() * 1000))
+
+
+def _msg(message_id, sender, create_time, **kwargs):
+    msg = {
+        "message_id": message_id,
+        "create_time": create_time,
+        "sender": {"id": sender, "sender_type": "user"},
+        "body": {"content": json.dumps({"text": "hello"})},
+    }
+    msg.update(kwargs)
+    return msg
+
+
+class _FakeCollector:
+    # 复用真实的分片并发调度，仅替换单片拉取
+    iter_message_shards = MessageCollector.iter_message_shards
+
+    def __init__(self, messages, fail_on_day=None):
+        self.messages = messages
+        self.fail_on_day = fail_on_day
+        self.windows = []
+        self.get_message_sender = Mock(return_value=None)
+        self.get_user_names = Mock(side_effect=lambda ids: {uid: f"name-{uid}" for uid in ids})
+        self.get_message_reactions = Mock(
+            return_value=[{"operator": {"operator_id": "ou_b", "operator_type": "user"}}]
+        )
+
+    def iter_messages(self, start, end):
+        if self.fail_on_day and start.day == self.fail_on_day:
+            raise RuntimeError("api down")
+        self.windows.append(start)
+        start_ms, end_ms = start.timestamp() * 1000, end.timestamp() * 1000
+        for msg in self.messages:
+            if start_ms <= int(msg["create_time"]) < end_ms:
+                yield msg
+
+
+MESSAGES = [
+    _msg("om_1", "ou_a", _ms(2026, 1, 1, 10)),
+    _msg("om_2", "ou_b", _ms(2026, 1, 2, 10), parent_id="om_1", root_id="om_1"),
+    _msg("om_3", "ou_a", _ms(2026, 1, 2, 11), deleted=True),
+    _msg("om_4", "ou_a", _ms(2026, 2, 1, 9)),
+]
+
+
+def test_backfill_aggregates_per_month_and_bulk_writes(tmp_path):
+    collector = _FakeCollector(MESSAGES)
+    storage = Mock()
+    backfill = HistoryBackfill(collector, storage, checkpoint_file=tmp_path / "cp.json", with_reactions=True)
+
+    written = backfill.run("2026-01", "2026-02")
+
+    assert written == {"2026-01": 2, "2026-02": 2}
+    month, totals = storage.bulk_upsert_month.call_args_list[0][0]
+    assert month == "2026-01"
+    assert "reaction_given" in storage.bulk_upsert_month.call_args_list[0][1]["metric_keys"]
+    assert totals["ou_a"]["user_name"] == "name-ou_a"
+    assert totals["ou_a"]["metrics"]["message_count"] == 1
+    assert totals["ou_a"]["metrics"]["reply_received"] == 1
+    assert totals["ou_a"]["metrics"]["reaction_received"] == 1
+    assert totals["ou_b"]["metrics"]["reaction_given"] == 2
+    assert totals["ou_b"]["metrics"].get("topic_initiated", 0) == 0
+    collector.get_message_sender.assert_not_called()
+    assert not (tmp_path / "cp.json").exists()
+
+
+def test_backfill_resumes_from_checkpoint_after_failure(tmp_path):
+    checkpoint = tmp_path / "cp.json"
+    storage = Mock()
+
+    with pytest.raises(RuntimeError):
+        HistoryBackfill(_FakeCollector(MESSAGES, fail_on_day=3), storage, checkpoint_file=checkpoint).run("2026-01")
+
+    saved = json.loads(checkpoint.read_text(encoding="utf-8"))
+    assert saved["cursor_ms"] == int(datetime(2026, 1, 3).timestamp() * 1000)
+    assert saved["months"]["2026-01"]["ou_a"]["metrics"]["message_count"] == 1
+
+    collector = _FakeCollector(MESSAGES)
+    HistoryBackfill(collector, storage, checkpoint_file=checkpoint).run("2026-01")
+
+    assert min(collector.windows) == datetime(2026, 1, 3)
+    month, totals = storage.bulk_upsert_month.call_args[0]
+    assert month == "2026-01"
+    assert totals["ou_a"]["metrics"]["message_count"] == 1
+    assert "reaction_given" not in storage.bulk_upsert_month.call_args[1]["metric_keys"]
+    assert totals["ou_b"]["metrics"]["message_count"] == 1
+
+
+def test_bulk_upsert_month_keeps_pin_count_and_splits_update_create():
+    from storage import BitableStorage
+
+    storage = BitableStorage(Mock())
+    storage._search_month_page = Mock(
+        return_value=([{"record_id": "rec_a", "fields": {"用户ID": "ou_a", "被Pin次数": 2}}], None)
+    )
+    storage._batch_update_records = Mock()
+    storage._batch_create_records = Mock()
+
+    result = storage.bulk_upsert_month(
+        "2026-01",
+        {
+            "ou_a": {"user_name": "A", "metrics": {"message_count": 3}},
+            "ou_b": {"user_name": "B", "metrics": {"reaction_given": 1}},
+        },
+    )
+
+    assert result == (1, 1)
+    updated = storage._batch_update_records.call_args[0][0][0]
+    assert updated["record_id"] == "rec_a"
+    assert updated["fields"]["发言次数"] == 3
+    assert updated["fields"]["被Pin次数"] == 2
+    created = storage._batch_create_records.call_args[0][0][0]["fields"]
+    assert created["点赞数"] == 1
+    assert created["被Pin次数"] == 0
+
+
+def test_bulk_upsert_month_keeps_reaction_fields_when_not_recounted():
+    from backfill import MESSAGE_METRIC_KEYS
+    from storage import BitableStorage
+
+    storage = BitableStorage(Mock())
+    storage._search_month_page = Mock(
+        return_value=(
+            [{"record_id": "rec_a", "fields": {"用户ID": "ou_a", "点赞数": 7, "被点赞数": 9, "被Pin次数": 1}}],
+            None,
+        )
+    )
+    storage._batch_update_records = Mock()
+    storage._batch_create_records = Mock()
+
+    storage.bulk_upsert_month(
+        "2026-01",
+        {"ou_a": {"user_name": "A", "metrics": {"message_count": 3}}},
+        metric_keys=MESSAGE_METRIC_KEYS,
+    )
+
+    fields = storage._batch_update_records.call_args[0][0][0]["fields"]
+    assert fields["发言次数"] == 3
+    assert fields["点赞数"] == 7
+    assert fields["被点赞数"] == 9
+    assert fields["被Pin次数"] == 1
+
+
+def test_bulk_upsert_month_matches_segment_list_user_id():
+    from storage import BitableStorage
+
+    storage = BitableStorage(Mock())
+    storage._search_month_page = Mock(
+        return_value=(
+            [{"record_id": "rec_a", "fields": {"用户ID": [{"type": "text", "text": "ou_a"}], "被Pin次数": 2}}],
+            None,
+        )
+    )
+    storage._batch_update_records = Mock()
+    storage._batch_create_records = Mock()
+
+    result = storage.bulk_upsert_month("2026-01", {"ou_a": {"user_name": "A", "metrics": {"message_count": 1}}})
+
+    assert result == (1, 0)
+    updated = storage._batch_update_records.call_args[0][0][0]
+    assert updated["record_id"] == "rec_a"
+    assert updated["fields"]["被Pin次数"] == 2
+    storage._batch_create_records.assert_not_called()
+
+
+def test_backfill_and_batch_calculator_agree_on_same_messages(tmp_path):
+    from calculator import MetricsCalculator
+
+    messages = [
+        _msg("om_1", "ou_a", _ms(2026, 3, 1, 9)),
+        _msg("om_2", "ou_b", _ms(2026, 3, 1, 10), root_id="om_1", parent_id="om_1"),
+        _msg("om_3", "ou_c", _ms(2026, 3, 1, 11), root_id="om_1", parent_id="om_2"),
+        # 无人回复的根消息同样计为发起话题
+        _msg("om_4", "ou_b", _ms(2026, 3, 1, 12), mentions=[{"id": {"open_id": "ou_a"}}]),
+        _msg("om_5", "ou_c", _ms(2026, 3, 1, 13), parent_id="om_4"),
+        # 被@者本批次未发言
+        _msg("om_6", "ou_a", _ms(2026, 3, 1, 14), mentions=[{"id": {"open_id": "ou_silent"}}]),
+    ]
+    backfill = HistoryBackfill(_FakeCollector(messages), Mock(), checkpoint_file=tmp_path / "cp.json")
+    months = {}
+    for msg in messages:
+        backfill._feed_message(msg, months)
+
+    streamed = {uid: entry["metrics"] for uid, entry in months["2026-03"].items()}
+    batch = MetricsCalculator(messages).calculate()
+
+    keys = ("message_count", "char_count", "reply_received", "mention_received", "topic_initiated")
+    assert set(streamed) == set(batch)
+    for user_id, metrics in batch.items():
+        assert {key: streamed[user_id].get(key, 0) for key in keys} == {key: metrics[key] for key in keys}, user_id
+    assert batch["ou_a"]["topic_initiated"] == 2
+    assert batch["ou_b"]["topic_initiated"] == 1
+    assert batch["ou_silent"]["mention_received"] == 1
@@ -6,7 +6,9 @@ calculator.py 单元测试
 
 import unittest
 import json
-from calculator import MetricsCalculator
+from unittest.mock import patch
+
+from calculator import MetricsCalculator, ParsedContent
 
 
 class TestMetricsCalculator(unittest.TestCase):
@@ -151,8 +153,8 @@ class TestMetricsCalculator(unittest.TestCase):
         # user1发起了1个话题
         self.assertEqual(metrics["user1"]["topic_initiated"], 1)
 
-    def test_topic_not_initiated_without_replies(self):
-        """测试没有回复的消息不算话题"""
+    def test_root_message_initiates_topic_without_replies(self):
+        """测试根消息即使没有回复也计为发起话题（与实时监听规则一致）"""
         messages = [
             {
                 "message_id": "msg1",
@@ -164,8 +166,7 @@ class TestMetricsCalculator(unittest.TestCase):
         calc = MetricsCalculator(messages)
         metrics = calc.calculate()
 
-        # 没有回复，不算话题
-        self.assertEqual(metrics["user1"]["topic_initiated"], 0)
+        self.assertEqual(metrics["user1"]["topic_initiated"], 1)
 
     def test_score_calculation(self):
         """测试活跃度分数计算"""
@@ -182,8 +183,12 @@ class TestMetricsCalculator(unittest.TestCase):
         calc = MetricsCalculator(messages)
         metrics = calc.calculate()
 
-        # 1条消息，5个字符
-        expected_score = 1 * ACTIVITY_WEIGHTS["message_count"] + 5 * ACTIVITY_WEIGHTS["char_count"]
+        # 1条消息，5个字符，根消息计1次发起话题
+        expected_score = (
+            1 * ACTIVITY_WEIGHTS["message_count"]
+            + 5 * ACTIVITY_WEIGHTS["char_count"]
+            + 1 * ACTIVITY_WEIGHTS["topic_initiated"]
+        )
 
         self.assertAlmostEqual(metrics["user1"]["score"], expected_score, places=2)
 
@@ -509,6 +514,96 @@ class TestComplexScenarios(unittest.TestCase):
         self.assertIn("user1", metrics)
         self.assertIn("user2", metrics)
 
+    def test_topic_initiated_counts_each_root_once_in_large_history(self):
+        """测试大量消息下话题统计：每个根消息只计一次，回复不算话题"""
+        messages = []
+        for i in range(2000):
+            messages.append(
+                {
+                    "message_id": f"root{i}",
+                    "sender": {"id": f"user{i % 10}"},
+                    "body": {"content": '{"text": "Topic"}'},
+                }
+            )
+            messages.append(
+                {
+                    "message_id": f"reply{i}",
+                    "sender": {"id": "replier"},
+                    "root_id": f"root{i}",
+                    "parent_id": f"root{i}",
+                    "body": {"content": '{"text": "Reply"}'},
+                }
+            )
+            if i % 2 == 0:
+                messages.append(
+                    {
+                        "message_id": f"reply{i}_2",
+                        "sender": {"id": "replier"},
+                        "root_id": f"root{i}",
+                        "body": {"content": '{"text": "Reply"}'},
+                    }
+                )
+
+        metrics = MetricsCalculator(messages).calculate()
+
+        self.assertEqual(sum(m["topic_initiated"] for m in metrics.values()), 2000)
+        self.assertEqual(metrics["user0"]["topic_initiated"], 200)
+        self.assertEqual(metrics["user0"]["reply_received"], 200)
+        self.assertEqual(metrics["replier"]["topic_initiated"], 0)
+
+    def test_reply_to_unknown_message_ignored_and_mention_of_silent_user_credited(self):
+        """测试回复未知消息时不计分，@本批次未发言的用户时为其建立条目并计被@"""
+        messages = [
+            {
+                "message_id": "msg1",
+                "sender": {"id": "user1"},
+                "parent_id": "missing",
+                "body": {"content": '{"text": "Hi @ghost"}'},
+                "mentions": [{"id": {"open_id": "ghost"}}],
+            }
+        ]
+
+        metrics = MetricsCalculator(messages, user_names={"ghost": "Ghost"}).calculate()
+
+        self.assertEqual(sorted(metrics), ["ghost", "user1"])
+        self.assertEqual(metrics["user1"]["reply_received"], 0)
+        self.assertEqual(metrics["ghost"]["mention_received"], 1)
+        self.assertEqual(metrics["ghost"]["message_count"], 0)
+        self.assertEqual(metrics["ghost"]["user_name"], "Ghost")
+
+
+class TestParsedContent(unittest.TestCase):
+    """测试ParsedContent一次解析、多处复用"""
+
+    def test_parses_json_once_across_consumers(self):
+        """同一ParsedContent多次取文本/字数/图片只解析一次JSON"""
+        parsed = ParsedContent('{"text": "Hello @user2 World"}')
+
+        with patch("calculator.json.loads", wraps=json.loads) as mock_loads:
+            self.assertEqual(parsed.text, "Hello @user2 World")
+            self.assertEqual(parsed.text_length, 12)
+            self.assertEqual(MetricsCalculator.extract_text_from_content(parsed), ("Hello @user2 World", []))
+            self.assertEqual(MetricsCalculator([])._extract_text_length(parsed), 12)
+
+        self.assertEqual(mock_loads.call_count, 1)
+
+    def test_invalid_json_falls_back_to_raw_text(self):
+        """无效JSON返回原始字符串并标记解析失败"""
+        parsed = ParsedContent("not json")
+
+        self.assertTrue(parsed.parse_error)
+        self.assertIsNone(parsed.obj)
+        self.assertEqual(parsed.text, "not json")
+
+    def test_image_keys_are_copied(self):
+        """返回的图片列表可安全修改，不影响缓存"""
+        parsed = ParsedContent({"content": [[{"tag": "img", "image_key": "img_1"}]]})
+
+        parsed.image_keys.append("img_2")
+
+        self.assertEqual(parsed.image_keys, ["img_1"])
+        self.assertIs(ParsedContent.of(parsed), parsed)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,148 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+
+import pytest
+
+import rate_limiter
+from collector import MessageCollector
+
+
+@pytest.fixture(autouse=True)
+def _no_rate_limit():
+    """不占用全局 api_limiter 额度，避免拖慢其他测试"""
+    with patch("rate_limiter.api_limiter"):
+        yield
+
+
+def _ms(*args):
+    return str(int(datetime(*args).timestamp() * 1000))
+
+
+def _response(items, has_more=False, page_token=None):
+    response = Mock()
+    response.json.return_value = {
+        "code": 0,
+        "data": {"items": items, "has_more": has_more, "page_token": page_token},
+    }
+    return response
+
+
+def _collector():
+    auth = Mock()
+    auth.get_headers.return_value = {}
+    collector = MessageCollector(auth)
+    collector.chat_id = "oc_test"
+    return collector
+
+
+@patch("collector.requests.get")
+def test_iter_messages_streams_pages_with_server_side_time_filter(mock_get):
+    mock_get.side_effect = [
+        _response([{"message_id": "om_1", "create_time": _ms(2026, 1, 1, 10)}], has_more=True, page_token="p2"),
+        _response(
+            [
+                {"message_id": "om_2", "create_time": _ms(2026, 1, 1, 11)},
+                # 与右边界同一秒但晚于边界的毫秒，需在客户端截掉
+                {"message_id": "om_3", "create_time": str(int(datetime(2026, 1, 2).timestamp() * 1000) + 5)},
+            ]
+        ),
+    ]
+    collector = _collector()
+
+    stream = collector.iter_messages(datetime(2026, 1, 1), datetime(2026, 1, 2))
+    assert next(stream)["message_id"] == "om_1"
+    # 惰性翻页：消费完第一页之前不请求第二页
+    assert mock_get.call_count == 1
+
+    assert [msg["message_id"] for msg in stream] == ["om_2"]
+    first_params = mock_get.call_args_list[0].kwargs["params"]
+    assert first_params["start_time"] == str(int(datetime(2026, 1, 1).timestamp()))
+    assert first_params["end_time"] == str(int(datetime(2026, 1, 2).timestamp()))
+    assert first_params["sort_type"] == "ByCreateTimeAsc"
+    assert mock_get.call_args_list[1].kwargs["params"]["page_token"] == "p2"
+
+
+@patch("collector.time.sleep")
+@patch("collector.requests.get")
+def test_paging_takes_one_limiter_slot_per_fetch_and_stops_at_page_cap(mock_get, mock_sleep):
+    mock_get.side_effect = lambda *args, **kwargs: _response(
+        [{"message_id": "om_x", "create_time": "0"}], has_more=True, page_token="next"
+    )
+    collector = _collector()
+
+    with patch("collector.MAX_PAGES_PER_FETCH", 3):
+        pages = list(collector.iter_message_pages(datetime(2026, 1, 1)))
+
+    # has_more 一直为真时在页数上限处停止；整次拉取只占用一次限流额度，页间固定间隔
+    assert len(pages) == 3
+    assert rate_limiter.api_limiter.wait_if_needed.call_count == 1
+    assert mock_sleep.call_count == 2
+
+
+@patch("collector.requests.get")
+def test_get_messages_respects_limit_and_returns_partial_on_error(mock_get):
+    error = Mock()
+    error.json.return_value = {"code": 99991400, "msg": "rate limited"}
+    mock_get.side_effect = [
+        _response([{"message_id": f"om_{i}", "create_time": "0"} for i in range(3)], has_more=True, page_token="p2"),
+        error,
+    ]
+    collector = _collector()
+
+    assert len(collector.get_messages(hours=1, limit=2)) == 2
+    assert mock_get.call_count == 1
+
+    mock_get.side_effect = [
+        _response([{"message_id": "om_a", "create_time": "0"}], has_more=True, page_token="p2"),
+        error,
+    ]
+    messages = collector.get_messages(hours=1)
+    assert [msg["message_id"] for msg in messages] == ["om_a"]
+
+
+def test_iter_message_shards_fetches_concurrently_and_yields_in_order():
+    collector = _collector()
+    active, peak = [0], [0]
+    lock = threading.Lock()
+
+    def fake_iter(start, end):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        # 越早的分片越慢，验证结果仍按时间顺序交付
+        time.sleep(0.05 * (5 - start.day))
+        with lock:
+            active[0] -= 1
+        return iter([{"message_id": f"om_{start.day}"}])
+
+    collector.iter_messages = fake_iter
+    shards = list(
+        collector.iter_message_shards(datetime(2026, 1, 1), datetime(2026, 1, 4, 12), timedelta(days=1), max_workers=4)
+    )
+
+    assert [(s.day, e.day, [m["message_id"] for m in msgs]) for s, e, msgs in shards] == [
+        (1, 2, ["om_1"]),
+        (2, 3, ["om_2"]),
+        (3, 4, ["om_3"]),
+        (4, 4, ["om_4"]),
+    ]
+    assert shards[-1][1] == datetime(2026, 1, 4, 12)
+    assert peak[0] > 1
+
+
+def test_iter_message_shards_raises_at_failed_shard_after_earlier_ones():
+    collector = _collector()
+
+    def fake_iter(start, end):
+        if start.day == 2:
+            raise RuntimeError("api down")
+        return iter([{"message_id": f"om_{start.day}"}])
+
+    collector.iter_messages = fake_iter
+    stream = collector.iter_message_shards(datetime(2026, 1, 1), datetime(2026, 1, 4), timedelta(days=1))
+
+    assert next(stream)[2] == [{"message_id": "om_1"}]
+    with pytest.raises(RuntimeError):
+        next(stream)
@@ -0,0 +1,53 @@
+import threading
+
+from event_dedupe import EventDedupeStore
+
+
+def test_mark_if_new_survives_restart(tmp_path):
+    db_path = tmp_path / "dedupe.sqlite3"
+    store = EventDedupeStore(db_path)
+
+    assert store.mark_if_new("im.message.receive_v1:ev_1", now=1000)
+    assert not store.mark_if_new("im.message.receive_v1:ev_1", now=1001)
+    store.close()
+
+    # 模拟重启：新实例热层为空，仍能从磁盘识别重推事件
+    reopened = EventDedupeStore(db_path)
+    assert not reopened.mark_if_new("im.message.receive_v1:ev_1", now=1002)
+    assert reopened.mark_if_new("im.message.receive_v1:ev_2", now=1002)
+    assert len(reopened) == 2
+
+
+def test_expired_events_are_new_again_and_purged(tmp_path):
+    store = EventDedupeStore(tmp_path / "dedupe.sqlite3", ttl_seconds=60, recent_capacity=1, purge_every=2)
+
+    assert store.mark_if_new("a", now=0)
+    assert not store.mark_if_new("a", now=59)
+    assert store.mark_if_new("a", now=61)
+
+    # 第二次新增触发清理：b 写入时 a(61) 仍在窗口内
+    assert store.mark_if_new("b", now=100)
+    assert len(store) == 2
+    assert store.purge_expired(now=200) == 2
+    assert len(store) == 0
+
+
+def test_concurrent_handlers_process_each_event_once():
+    store = EventDedupeStore(":memory:")
+    accepted = []
+
+    def handler():
+        for i in range(200):
+            if store.mark_if_new(f"ev_{i}"):
+                accepted.append(i)
+
+    threads = [threading.Thread(target=handler) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(accepted) == list(range(200))
+    assert "ev_0" in store
+    store.clear()
+    assert "ev_0" not in store
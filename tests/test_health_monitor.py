@@ -0,0 +1,104 @@
+"""
+health_monitor 单元测试
+
+使用最小的 flask 替身（只记录路由、jsonify 原样返回），不依赖 Flask 安装。
+"""
+
+import sys
+import threading
+import types
+import unittest
+from unittest.mock import patch
+
+from metrics_registry import MetricsRegistry
+
+
+def _flask_stub():
+    flask = types.ModuleType("flask")
+
+    class Flask:  # noqa: N801
+        def __init__(self, name):  # noqa: ARG002
+            self.routes = {}
+
+        def route(self, path):
+            def decorator(func):
+                self.routes[path] = func
+                return func
+
+            return decorator
+
+    flask.Flask = Flask
+    flask.jsonify = lambda data: data
+    return flask
+
+
+def _import_health_monitor():
+    with patch.dict(sys.modules, {"flask": _flask_stub()}):
+        sys.modules.pop("health_monitor", None)
+        import health_monitor
+    return health_monitor
+
+
+class TestHealthMonitor(unittest.TestCase):
+    """测试 HealthMonitor"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.module = _import_health_monitor()
+
+    def setUp(self):
+        self.registry = MetricsRegistry(prefix="test")
+        self.monitor = self.module.HealthMonitor(registry=self.registry)
+
+    def test_concurrent_updates_report_same_totals_on_health_and_metrics(self):
+        """多线程并发 update_event 后，/health 与 /metrics 报告相同的合并总数"""
+
+        def work():
+            for i in range(2000):
+                self.monitor.update_event("message" if i % 2 else "reaction")
+            self.monitor.update_error()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        health, status_code = self.monitor.app.routes["/health"]()
+        metrics_text = self.monitor.app.routes["/metrics"]()[0]
+
+        self.assertEqual(status_code, 200)
+        self.assertEqual(health["total_events_processed"], 16000)
+        self.assertEqual(health["total_messages"], 8000)
+        self.assertEqual(health["total_reactions"], 8000)
+        self.assertEqual(health["total_errors"], 8)
+        self.assertIn("test_events_total 16000", metrics_text)
+        self.assertIn("test_messages_total 8000", metrics_text)
+        self.assertIn("test_reactions_total 8000", metrics_text)
+        self.assertIn("test_errors_total 8", metrics_text)
+
+    def test_instances_with_separate_registries_do_not_share_counts(self):
+        """使用独立注册表的实例计数互不影响"""
+        other = self.module.HealthMonitor(registry=MetricsRegistry(prefix="other"))
+
+        self.monitor.update_event("message")
+
+        self.assertEqual(self.monitor.status["total_events_processed"], 1)
+        self.assertEqual(other.status["total_events_processed"], 0)
+        self.assertNotIn("test_", other.app.routes["/metrics"]()[0])
+
+    def test_status_includes_state_and_websocket_gauge(self):
+        """/status 合并非计数状态，WebSocket 状态同时导出为仪表盘"""
+        self.monitor.update_websocket_status(True)
+        self.monitor.set_pin_monitor_status(True)
+
+        status = self.monitor.app.routes["/status"]()
+
+        self.assertEqual(status["status"], "running")
+        self.assertTrue(status["pin_monitor_enabled"])
+        self.assertEqual(status["total_events_processed"], 0)
+        self.assertIn("test_websocket_connected 1", self.registry.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
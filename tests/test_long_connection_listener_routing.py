@@ -1,5 +1,6 @@
 import importlib
 import json
+import os
 import sys
 import time
 import types
@@ -74,7 +75,11 @@ def _install_listener_stubs():
     sys.modules["health_monitor"] = health_monitor_stub
 
     # Ensure announcement service can be imported even when services package path is not resolved.
-    services_pkg = sys.modules.get("services", types.ModuleType("services"))
+    # Prefer the real services package so submodules such as services.identity_service import normally.
+    try:
+        services_pkg = sys.modules.get("services") or importlib.import_module("services")
+    except ImportError:
+        services_pkg = types.ModuleType("services")
     announcement_stub = types.ModuleType("services.announcement_service")
 
     class AnnouncementService:  # noqa: N801
@@ -128,6 +133,9 @@ class _RecordingDocxStorage:
         return True
 
 
+_SQLITE_PATH_ENVS = ("EVENT_DEDUPE_DB_PATH", "MESSAGE_SNAPSHOT_DB_PATH", "WIKI_TOKEN_DB_PATH")
+
+
 class TestLongConnectionListenerRouting(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -139,9 +147,18 @@ class TestLongConnectionListenerRouting(unittest.TestCase):
             "services.announcement_service": sys.modules.get("services.announcement_service"),
         }
         _install_listener_stubs()
+        # Use in-memory SQLite for the dedupe/snapshot stores so tests do not write into the repo.
+        cls._env_backup = {name: os.environ.get(name) for name in _SQLITE_PATH_ENVS}
+        for name in _SQLITE_PATH_ENVS:
+            os.environ[name] = ":memory:"
 
     @classmethod
     def tearDownClass(cls):
+        for name, original in cls._env_backup.items():
+            if original is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = original
         for name, original in cls._module_backup.items():
             if original is None:
                 sys.modules.pop(name, None)
@@ -153,6 +170,7 @@ class TestLongConnectionListenerRouting(unittest.TestCase):
             del sys.modules["long_connection_listener"]
 
         self.listener = importlib.import_module("long_connection_listener")
+        self.listener.init_components()
         self.listener.CHAT_ID = "oc_test_chat"
         self.listener.ARCHIVE_DOC_TOKEN = "doc_default"
         self.listener.TAG_MAPPING["个人思考"] = "doc_thinking"
@@ -162,7 +180,7 @@ class TestLongConnectionListenerRouting(unittest.TestCase):
         self.listener.pending_updates.clear()
         self.listener.message_counter = 0
         self.listener.last_flush_ts = time.time()
-        self.listener.user_name_cache.clear()
+        self.listener.identity_service.clear()
 
     @staticmethod
     def _message_with_post_text(text, message_id="om_test"):
@@ -365,6 +383,19 @@ class TestLongConnectionListenerRouting(unittest.TestCase):
         self.assertEqual(recorder.calls[1]["metrics_delta"], {"reply_received": -1})
         self.assertEqual(recorder.calls[2]["metrics_delta"], {"mention_received": -1})
 
+    def test_attachments_reuse_parsed_content(self):
+        msg = self._message_with_post_text("附件说明")
+        msg.message_type = "post"
+        parsed = self.listener.ParsedContent(msg.content)
+        msg.content = "not json"
+
+        file_tokens, text_content = self.listener._process_message_attachments(
+            msg, msg.message_id, parsed_content=parsed
+        )
+
+        self.assertEqual(file_tokens, [])
+        self.assertEqual(text_content, "附件说明")
+
     def test_force_flush_writes_pending_updates(self):
         recorder = _RecordingStorage()
         self.listener.storage = recorder
@@ -0,0 +1,140 @@
+"""
+metrics_registry 单元测试
+
+测试分片计数器、直方图分桶、仪表盘回调与 Prometheus 文本格式导出。
+"""
+
+import threading
+import unittest
+
+from metrics_registry import MetricsRegistry
+
+
+class TestCounter(unittest.TestCase):
+    """测试 Counter"""
+
+    def setUp(self):
+        self.registry = MetricsRegistry(prefix="test")
+
+    def test_concurrent_increments_from_short_lived_threads(self):
+        """多线程并发自增不丢失，线程退出后其计数仍保留"""
+        events = self.registry.counter("events_total", "事件数", ("type",))
+
+        def work():
+            for _ in range(5000):
+                events.inc(type="message")
+            events.inc(2, type="reaction")
+
+        for _round in range(2):
+            threads = [threading.Thread(target=work) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(events.value(type="message"), 80000)
+        self.assertEqual(events.value(type="reaction"), 32)
+        self.assertIn('test_events_total{type="message"} 80000', self.registry.render())
+
+    def test_unlabelled_counter_exports_zero_and_rejects_decrease(self):
+        """无标签计数器未计数时导出 0，且不允许减少"""
+        errors = self.registry.counter("errors_total", "错误数")
+
+        self.assertIn("# TYPE test_errors_total counter\ntest_errors_total 0", self.registry.render())
+        with self.assertRaises(ValueError):
+            errors.inc(-1)
+
+
+class TestHistogram(unittest.TestCase):
+    """测试 Histogram"""
+
+    def setUp(self):
+        self.registry = MetricsRegistry(prefix="test")
+        self.latency = self.registry.histogram("stage_seconds", "阶段耗时", ("stage",), buckets=(0.1, 1.0))
+
+    def test_buckets_are_cumulative_in_exposition(self):
+        """桶计数按 le 累计，并输出 _sum 与 _count"""
+        for value in (0.05, 0.1, 0.5, 3):
+            self.latency.observe(value, stage="render")
+
+        text = self.registry.render()
+
+        self.assertIn("# TYPE test_stage_seconds histogram", text)
+        self.assertIn('test_stage_seconds_bucket{stage="render",le="0.1"} 2', text)
+        self.assertIn('test_stage_seconds_bucket{stage="render",le="1"} 3', text)
+        self.assertIn('test_stage_seconds_bucket{stage="render",le="+Inf"} 4', text)
+        self.assertIn('test_stage_seconds_sum{stage="render"} 3.65', text)
+        self.assertIn('test_stage_seconds_count{stage="render"} 4', text)
+
+    def test_timed_records_even_when_function_raises(self):
+        """计时装饰器在函数抛出异常时仍记录耗时"""
+
+        @self.latency.timed(stage="flush")
+        def fail():
+            raise RuntimeError("boom")
+
+        with self.assertRaises(RuntimeError):
+            fail()
+
+        self.assertEqual(self.latency.snapshot(stage="flush")["count"], 1)
+        self.assertIsNone(self.latency.snapshot(stage="route"))
+
+    def test_labels_must_match_declaration(self):
+        """标签与声明不一致时报错"""
+        with self.assertRaises(ValueError):
+            self.latency.observe(0.1, handler="x")
+
+    def test_concurrent_observations_are_not_lost(self):
+        """多线程并发记录不丢失"""
+
+        def work():
+            for _ in range(1000):
+                self.latency.observe(0.01, stage="route")
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.latency.snapshot(stage="route")["count"], 8000)
+
+
+class TestGaugeAndRegistry(unittest.TestCase):
+    """测试 Gauge 与 MetricsRegistry"""
+
+    def test_gauge_callbacks_evaluated_at_render(self):
+        """回调仪表盘在导出时取值，回调异常的样本跳过"""
+        registry = MetricsRegistry(prefix="test")
+        depth = registry.gauge("queue_depth", "队列深度", ("queue",))
+        items = [1, 2]
+        depth.set_function(lambda: len(items), queue="render")
+        depth.set_function(lambda: 1 / 0, queue="broken")
+        depth.set(0.75, queue="fixed")
+        items.append(3)
+
+        text = registry.render()
+
+        self.assertIn('test_queue_depth{queue="render"} 3', text)
+        self.assertIn('test_queue_depth{queue="fixed"} 0.75', text)
+        self.assertNotIn('queue="broken"', text)
+
+    def test_register_returns_existing_metric(self):
+        """同名同类型重复登记返回已有实例，类型冲突时报错"""
+        registry = MetricsRegistry(prefix="test")
+        first = registry.gauge("pending", "待处理")
+
+        self.assertIs(registry.gauge("pending", "待处理"), first)
+        with self.assertRaises(ValueError):
+            registry.histogram("pending", "待处理")
+
+    def test_label_values_are_escaped(self):
+        """标签值中的引号与反斜杠按规范转义"""
+        registry = MetricsRegistry(prefix="test")
+        registry.gauge("info", "信息", ("name",)).set(1, name='a"b\\c')
+
+        self.assertIn('test_info{name="a\\"b\\\\c"} 1', registry.render())
+
+
+if __name__ == "__main__":
+    unittest.main()
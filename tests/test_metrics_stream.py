@@ -0,0 +1,83 @@
+from unittest.mock import Mock
+
+from metrics_stream import StreamingMetricsEngine
+
+
+def _event(message_id, sender_id, **kwargs):
+    event = {"message_id": message_id, "sender_id": sender_id, "char_count": 5}
+    event.update(kwargs)
+    return event
+
+
+def test_feed_applies_reply_mention_and_topic_rules():
+    engine = StreamingMetricsEngine()
+    engine.feed(_event("om_root", "ou_a"))
+    resolver = Mock(return_value="ou_remote")
+
+    contribution = engine.feed(
+        _event("om_reply", "ou_b", parent_id="om_root", root_id="om_root_other", mention_ids=["ou_a", "ou_c"]),
+        resolve_sender=resolver,
+    )
+
+    # 父消息发送者来自本地索引，无需远程查询；被回复者不再重复计@
+    resolver.assert_not_called()
+    assert contribution["reply_target"]["user_id"] == "ou_a"
+    assert [t["user_id"] for t in contribution["mention_targets"]] == ["ou_c"]
+
+    totals = engine.snapshot()
+    assert totals["ou_a"]["metrics"] == {
+        "message_count": 1,
+        "char_count": 5,
+        "topic_initiated": 1,
+        "reply_received": 1,
+    }
+    assert totals["ou_b"]["metrics"].get("topic_initiated", 0) == 0
+    assert totals["ou_c"]["metrics"] == {"mention_received": 1}
+
+
+def test_nested_topic_reply_credits_first_mention_and_falls_back_to_resolver():
+    engine = StreamingMetricsEngine()
+
+    nested = engine.feed(
+        _event("om_1", "ou_b", parent_id="om_root", root_id="om_root", mention_ids=["ou_x", "ou_y"])
+    )
+    remote = engine.feed(_event("om_2", "ou_b", parent_id="om_unknown"), resolve_sender=lambda _pid: "ou_p")
+
+    assert nested["reply_target"]["user_id"] == "ou_x"
+    assert [t["user_id"] for t in nested["mention_targets"]] == ["ou_y"]
+    assert remote["reply_target"]["user_id"] == "ou_p"
+    assert engine.feed(_event("om_2", "ou_b")) is None
+
+
+def test_retract_is_idempotent_and_restores_totals():
+    sink = Mock()
+    engine = StreamingMetricsEngine(sink=sink)
+    engine.feed(_event("om_root", "ou_a"))
+    engine.feed(_event("om_reply", "ou_b", parent_id="om_root", mention_ids=["ou_c"]))
+
+    deltas = engine.retract("om_reply")
+
+    assert deltas == [
+        ("ou_b", "ou_b", {"message_count": -1, "char_count": -5, "topic_initiated": -1}),
+        ("ou_a", "ou_a", {"reply_received": -1}),
+        ("ou_c", "ou_c", {"mention_received": -1}),
+    ]
+    assert engine.retract("om_reply") is None
+    assert engine.retract("om_missing") is None
+    assert sink.call_count == 1 + 3 + 3
+
+    totals = engine.snapshot()
+    assert all(value == 0 for value in totals["ou_b"]["metrics"].values())
+    assert totals["ou_a"]["metrics"]["reply_received"] == 0
+
+
+def test_feed_reaction_skips_self_reaction_and_drain_resets():
+    engine = StreamingMetricsEngine()
+
+    engine.feed_reaction("ou_a", "A", "ou_b", "B")
+    engine.feed_reaction("ou_a", "A", "ou_a", "A", sign=-1)
+
+    drained = engine.drain()
+    assert drained["ou_a"]["metrics"] == {"reaction_given": 0}
+    assert drained["ou_b"]["metrics"] == {"reaction_received": 1}
+    assert engine.snapshot() == {}
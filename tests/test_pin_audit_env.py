@@ -33,6 +33,7 @@ if "message_renderer" not in sys.modules:
     sys.modules["message_renderer"] = stub_module
 
 from pin_daily_audit import DailyPinAuditor
+from services.identity_service import identity_service
 
 
 class DummyAuth:
@@ -80,10 +81,15 @@ class TestPinAuditEnvironment(unittest.TestCase):
             docx_storage=self.docx_storage,
             essence_doc_token="doc_test_token",
         )
+        # 昵称缓存为进程内共享，避免用例之间互相影响
+        identity_service.clear()
 
     def tearDown(self):
         if DailyPinAuditor.PROCESSED_FILE.exists():
             DailyPinAuditor.PROCESSED_FILE.unlink()
+        high_water_mark_file = self.auditor._high_water_mark_file()
+        if high_water_mark_file.exists():
+            high_water_mark_file.unlink()
 
     def test_weekly_pin_audit_success_flow_with_stubbed_feishu_api(self):
         """
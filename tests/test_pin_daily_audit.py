@@ -99,6 +99,63 @@ def test_get_pinned_messages_supports_pagination():
     }
 
 
+def test_get_pinned_messages_passes_time_bounds_and_stops_after_window():
+    auditor = _build_auditor(_make_test_dir())
+    start_ms = int(dt.datetime(2026, 2, 16, 0, 0, 0).timestamp() * 1000)
+    end_ms = int(dt.datetime(2026, 2, 23, 0, 0, 0).timestamp() * 1000)
+
+    page1 = Mock()
+    page1.json.return_value = {
+        "code": 0,
+        "data": {
+            "items": [
+                {"message_id": "m_in", "create_time": str(start_ms + 1000)},
+                {"message_id": "m_before", "create_time": str(start_ms - 1000)},
+            ],
+            "page_token": "next_page",
+        },
+    }
+
+    with patch("pin_daily_audit.requests.get", side_effect=[page1]) as mock_get:
+        pins = auditor._get_pinned_messages(start_ms=start_ms, end_ms=end_ms)
+
+    assert [p["message_id"] for p in pins] == ["m_in", "m_before"]
+    assert mock_get.call_count == 1
+    assert mock_get.call_args.kwargs["params"]["start_time"] == str(start_ms)
+    assert mock_get.call_args.kwargs["params"]["end_time"] == str(end_ms)
+
+
+def test_run_for_last_week_uses_high_water_mark_to_skip_audited_range():
+    auditor = _build_auditor(_make_test_dir())
+
+    week_start = dt.datetime(2026, 2, 16, 0, 0, 0)
+    week_end = dt.datetime(2026, 2, 23, 0, 0, 0)
+    week_start_ms = int(week_start.timestamp() * 1000)
+    week_end_ms = int(week_end.timestamp() * 1000)
+
+    auditor._get_pinned_messages = Mock(return_value=[])
+    with patch.object(DailyPinAuditor, "_get_last_week_window", return_value=(week_start, week_end)):
+        assert auditor.run_for_last_week() == 0
+        assert auditor._load_high_water_mark() == (week_start_ms, week_end_ms)
+
+        auditor._get_pinned_messages.reset_mock()
+        assert auditor.run_for_last_week() == 0
+
+    auditor._get_pinned_messages.assert_not_called()
+
+
+def test_high_water_mark_restarts_for_non_contiguous_window():
+    auditor = _build_auditor(_make_test_dir())
+    day = 24 * 3600 * 1000
+
+    auditor._save_high_water_mark(10 * day, 12 * day)
+    auditor._save_high_water_mark(12 * day, 13 * day)
+    assert auditor._load_high_water_mark() == (10 * day, 13 * day)
+
+    auditor._save_high_water_mark(20 * day, 21 * day)
+    assert auditor._load_high_water_mark() == (20 * day, 21 * day)
+
+
 def test_run_for_last_week_accepts_second_timestamp():
     auditor = _build_auditor(_make_test_dir())
 
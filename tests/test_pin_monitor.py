@@ -0,0 +1,127 @@
+from unittest.mock import Mock, patch
+
+import pin_monitor
+
+
+def _build_monitor(**kwargs):
+    monitor = pin_monitor.PinMonitor(auth=Mock(), storage=Mock(), chat_id="oc_test", **kwargs)
+    monitor._handle_new_pin = Mock()
+    return monitor
+
+
+def test_check_pin_changes_skips_paging_when_first_page_unchanged():
+    monitor = _build_monitor()
+    page1 = [{"message_id": "om_1", "create_time": "2000"}]
+    page2 = [{"message_id": "om_0", "create_time": "1000"}]
+    monitor._get_pin_page = Mock(
+        side_effect=lambda token=None: (page1, "p2") if token is None else (page2, None)
+    )
+
+    assert monitor.check_pin_changes() is False
+    assert monitor.current_pin_ids == {"om_1", "om_0"}
+    assert monitor._get_pin_page.call_count == 2
+
+    # 首页签名未变化：仅拉取首页
+    assert monitor.check_pin_changes() is False
+    assert monitor._get_pin_page.call_count == 3
+    monitor._handle_new_pin.assert_not_called()
+
+
+def test_check_pin_changes_handles_new_pin_when_signature_changes():
+    monitor = _build_monitor()
+    pages = [[{"message_id": "om_1", "create_time": "1000"}]]
+    monitor._get_pin_page = Mock(side_effect=lambda token=None: (pages[-1], None))
+
+    monitor.check_pin_changes()
+    pages.append([{"message_id": "om_2", "create_time": "3000"}, *pages[-1]])
+
+    assert monitor.check_pin_changes() is True
+    monitor._handle_new_pin.assert_called_once()
+    assert monitor._handle_new_pin.call_args[0][0] == "om_2"
+
+
+def test_next_interval_backs_off_and_resets_on_change():
+    monitor = _build_monitor(interval=30, max_interval=100)
+
+    monitor.current_interval = monitor._next_interval(False)
+    assert monitor.current_interval == 60
+    monitor.current_interval = monitor._next_interval(False)
+    assert monitor.current_interval == 100
+    assert monitor._next_interval(True) == 30
+
+
+def test_check_pin_changes_ignores_poll_when_later_page_fails():
+    monitor = _build_monitor()
+    page1 = [{"message_id": "om_1", "create_time": "1000"}]
+    page2 = [{"message_id": "om_0", "create_time": "500"}]
+    monitor._get_pin_page = Mock(
+        side_effect=lambda token=None: (page1, "p2") if token is None else (page2, None)
+    )
+    monitor.check_pin_changes()
+    assert monitor.current_pin_ids == {"om_1", "om_0"}
+
+    # 新增Pin后第二页获取失败：不比对、不更新缓存
+    page1 = [{"message_id": "om_2", "create_time": "3000"}, {"message_id": "om_1", "create_time": "1000"}]
+    monitor._get_pin_page.side_effect = lambda token=None: (page1, "p2") if token is None else None
+    assert monitor.check_pin_changes() is False
+    assert monitor.current_pin_ids == {"om_1", "om_0"}
+    monitor._handle_new_pin.assert_not_called()
+
+    # 恢复后重新翻页，只有真正新增的Pin被处理
+    monitor._get_pin_page.side_effect = lambda token=None: (page1, "p2") if token is None else (page2, None)
+    assert monitor.check_pin_changes() is True
+    monitor._handle_new_pin.assert_called_once()
+    assert monitor._handle_new_pin.call_args[0][0] == "om_2"
+    assert monitor.current_pin_ids == {"om_2", "om_1", "om_0"}
+
+
+def test_unpin_on_later_page_then_repin_is_reported_as_new():
+    monitor = _build_monitor(full_sync_interval=600)
+    page1 = [{"message_id": "om_2", "create_time": "2000"}]
+    page2 = [{"message_id": "om_1", "create_time": "1000"}, {"message_id": "om_0", "create_time": "500"}]
+    monitor._get_pin_page = Mock(
+        side_effect=lambda token=None: (page1, "p2") if token is None else (page2, None)
+    )
+    clock = [1000.0]
+
+    with patch.object(pin_monitor.time, "monotonic", side_effect=lambda: clock[0]):
+        monitor.check_pin_changes()
+
+        # 第二页的 om_0 被取消Pin：首页签名不变，仅拉取首页
+        page2 = [{"message_id": "om_1", "create_time": "1000"}]
+        clock[0] += 60
+        assert monitor.check_pin_changes() is False
+        assert "om_0" in monitor.current_pin_ids
+
+        # 超过 full_sync_interval 后强制全量拉取，移除已取消的Pin
+        clock[0] += 600
+        assert monitor.check_pin_changes() is True
+        assert monitor.current_pin_ids == {"om_2", "om_1"}
+        monitor._handle_new_pin.assert_not_called()
+
+        # 重新Pin：作为新增处理
+        page1 = [{"message_id": "om_0", "create_time": "4000"}, {"message_id": "om_2", "create_time": "2000"}]
+        clock[0] += 60
+        assert monitor.check_pin_changes() is True
+
+    monitor._handle_new_pin.assert_called_once()
+    assert monitor._handle_new_pin.call_args[0][0] == "om_0"
+
+
+def test_repin_before_full_sync_is_reported_by_changed_pin_time():
+    monitor = _build_monitor(full_sync_interval=600)
+    page1 = [{"message_id": "om_2", "create_time": "2000"}]
+    page2 = [{"message_id": "om_0", "create_time": "500"}]
+    monitor._get_pin_page = Mock(
+        side_effect=lambda token=None: (page1, "p2") if token is None else (page2, None)
+    )
+
+    monitor.check_pin_changes()
+
+    # 第二页的 om_0 被取消后在下一次全量拉取前重新Pin，出现在首页且Pin时间更新
+    page1 = [{"message_id": "om_0", "create_time": "4000"}, {"message_id": "om_2", "create_time": "2000"}]
+    page2 = []
+
+    assert monitor.check_pin_changes() is True
+    monitor._handle_new_pin.assert_called_once()
+    assert monitor._handle_new_pin.call_args[0][0] == "om_0"
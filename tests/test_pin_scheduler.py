@@ -1,3 +1,4 @@
+import time
 from types import SimpleNamespace
 from unittest.mock import Mock, patch
 
@@ -26,6 +27,7 @@ def test_scheduler_registers_jobs_and_runs_startup_archive_check():
     fake_schedule = SimpleNamespace(
         every=Mock(side_effect=[weekly_job, archive_job]),
         clear=Mock(),
+        shutdown=Mock(),
         run_pending=Mock(),
         get_jobs=Mock(return_value=[]),
     )
@@ -42,6 +44,7 @@ def test_scheduler_registers_jobs_and_runs_startup_archive_check():
     archive_job.do.assert_called_once_with(scheduler._run_archive_job)
     scheduler.archiver.archive_and_clear.assert_called_once_with()
     fake_thread.start.assert_called_once()
+    fake_schedule.shutdown.assert_called_once_with()
 
 
 def test_run_archive_job_calls_archiver_when_schedule_window_allows():
@@ -62,3 +65,78 @@ def test_run_archive_job_skips_when_outside_window():
     scheduler._run_archive_job()
 
     scheduler.archiver.archive_and_clear.assert_not_called()
+
+
+def test_timer_scheduler_runs_due_jobs_on_executor_and_reschedules():
+    timer = pin_scheduler._TimerScheduler()
+    job_func = Mock()
+    job = timer.every().day.at("02:00").do(job_func, "arg")
+    first_run = job.next_run
+
+    assert timer.run_pending(now=first_run - pin_scheduler.timedelta(seconds=1)) == []
+
+    futures = timer.run_pending(now=first_run)
+    for future in futures:
+        future.result(timeout=5)
+
+    job_func.assert_called_once_with("arg")
+    assert job.next_run == first_run + pin_scheduler.timedelta(days=1)
+    assert timer.idle_seconds(now=first_run) == 86400
+
+
+def test_timer_scheduler_cancel_and_clear_wake_waiting_thread():
+    timer = pin_scheduler._TimerScheduler()
+    job = timer.every().monday.at("09:00").do(Mock())
+    other = timer.every().day.at("02:00").do(Mock())
+
+    job.cancel()
+    assert timer.get_jobs() == [other]
+    assert timer.run_pending(now=job.next_run + pin_scheduler.timedelta(days=7)) != []
+
+    waiter = pin_scheduler.threading.Thread(target=timer.wait_for_next)
+    waiter.start()
+    time.sleep(0.1)
+    timer.clear()
+    waiter.join(timeout=5)
+
+    assert not waiter.is_alive()
+    assert timer.get_jobs() == []
+    assert timer.idle_seconds() is None
+
+
+def test_stop_between_running_check_and_wait_is_not_lost():
+    timer = pin_scheduler._TimerScheduler()
+    scheduler = pin_scheduler.PinReportScheduler(auth=None)
+    real_wait_for_next = timer.wait_for_next
+
+    def stop_then_wait(*args, **kwargs):
+        # stop() 恰好发生在循环检查 running 之后、进入等待之前
+        scheduler.stop()
+        return real_wait_for_next(*args, **kwargs)
+
+    timer.wait_for_next = stop_then_wait
+    scheduler.running = True
+    with patch.object(pin_scheduler, "schedule", timer):
+        loop = pin_scheduler.threading.Thread(target=scheduler._schedule_loop, daemon=True)
+        loop.start()
+        loop.join(timeout=5)
+
+    assert not loop.is_alive()
+
+
+def test_timer_scheduler_shutdown_stops_executor_and_recreates_on_demand():
+    timer = pin_scheduler._TimerScheduler()
+    job = timer.every().day.at("02:00").do(Mock())
+    for future in timer.run_pending(now=job.next_run):
+        future.result(timeout=5)
+    executor = timer._executor
+
+    timer.shutdown(wait=True)
+
+    assert timer._executor is None
+    assert executor._shutdown
+    futures = timer.run_pending(now=job.next_run)
+    for future in futures:
+        future.result(timeout=5)
+    assert futures
+    timer.shutdown(wait=True)
@@ -0,0 +1,54 @@
+from pathlib import Path
+import tempfile
+
+from processed_log import ProcessedIdLog
+
+
+def _make_log_path() -> Path:
+    base_dir = Path(__file__).resolve().parents[1] / ".tmp"
+    base_dir.mkdir(exist_ok=True)
+    return Path(tempfile.mkdtemp(dir=base_dir)) / ".processed_daily_pins.txt"
+
+
+def test_update_appends_only_new_ids_and_survives_reload():
+    path = _make_log_path()
+    log = ProcessedIdLog(path)
+
+    log.update({"m1": 1000, "m2": 2000})
+    log.update({"m1": 1000, "m3": 3000})
+
+    assert path.read_text(encoding="utf-8").splitlines() == ["m1\t1000", "m2\t2000", "m3\t3000"]
+    reloaded = ProcessedIdLog(path)
+    assert {"m1", "m2", "m3"} == set(reloaded)
+
+
+def test_legacy_file_and_torn_last_line_are_loaded():
+    path = _make_log_path()
+    path.write_text("om_legacy\nom_torn", encoding="utf-8")
+
+    log = ProcessedIdLog(path)
+    log.add("om_new", 5000)
+
+    assert "om_legacy" in log
+    assert "om_torn" in log
+    assert path.read_text(encoding="utf-8").splitlines()[-1] == "om_new\t5000"
+
+
+def test_maybe_compact_prunes_expired_ids_and_rewrites_file():
+    path = _make_log_path()
+    path.write_text("old\t100\nold\t100\nkeep\t9000\nlegacy\n", encoding="utf-8")
+    log = ProcessedIdLog(path, compact_min_lines=1)
+
+    assert log.maybe_compact(min_pin_time_ms=5000) is True
+
+    assert "old" not in log
+    assert set(ProcessedIdLog(path)) == {"keep", "legacy"}
+    assert not path.with_name(f"{path.name}.tmp").exists()
+
+
+def test_maybe_compact_skips_when_redundancy_below_threshold():
+    path = _make_log_path()
+    log = ProcessedIdLog(path, compact_min_lines=10)
+    log.update({"m1": 1000})
+
+    assert log.maybe_compact() is False
@@ -331,6 +331,27 @@ class TestEdgeCases(unittest.TestCase):
         self.assertEqual(status2["used"], 2)
         self.assertEqual(status3["used"], 2)
 
+    def test_shared_across_threads_never_exceeds_limit(self):
+        """测试多线程共享限流器时放行次数不超过上限"""
+        import threading
+
+        limiter = RateLimiter(max_calls=50, period=60)
+        allowed = []
+
+        def worker():
+            for _ in range(100):
+                if limiter.is_allowed():
+                    allowed.append(1)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(allowed), 50)
+        self.assertEqual(len(limiter.calls), 50)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,96 @@
+"""
+reply_card.card_style_generator 单元测试
+
+测试素材缓存与静态模板复用。
+"""
+
+import os
+import shutil
+import tempfile
+import io
+import unittest
+from unittest.mock import patch
+
+from PIL import Image
+
+from reply_card import card_style_generator
+from reply_card.card_style_generator import CardStyleImageGenerator, _load_asset
+
+
+class TestLoadAsset(unittest.TestCase):
+    """测试 _load_asset"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "icon.png")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+        for key in [k for k in card_style_generator._assets if k[0] == self.path]:
+            del card_style_generator._assets[key]
+
+    def test_missing_or_unreadable_asset_is_not_cached(self):
+        """素材缺失或损坏时不缓存，修复后下次调用即可加载"""
+        self.assertIsNone(_load_asset(self.path, (80, 80), False))
+
+        with open(self.path, "wb") as f:
+            f.write(b"not an image")
+        self.assertIsNone(_load_asset(self.path, (80, 80), False))
+
+        shutil.copyfile(CardStyleImageGenerator.ICON_PATH, self.path)
+        asset = _load_asset(self.path, (80, 80), False)
+
+        self.assertIsNotNone(asset)
+        self.assertEqual(asset.size, (80, 80))
+        self.assertIs(_load_asset(self.path, (80, 80), False), asset)
+
+
+def _pixels(png_bytes):
+    return Image.open(io.BytesIO(png_bytes)).convert("RGB").tobytes()
+
+
+class TestTemplateReuse(unittest.TestCase):
+    """测试静态模板复用"""
+
+    TITLE = "Weekly notes"
+    CONTENT = "line of body text " * 60
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        patcher = patch.object(CardStyleImageGenerator, "_templates", {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_reused_template_output_is_pixel_identical_to_fresh_render(self):
+        """复用模板的输出与空缓存下全新绘制的结果逐像素一致，且不残留上一张卡片的文字"""
+        generator = CardStyleImageGenerator()
+        fresh = generator.generate_card_image(self.TITLE, self.CONTENT)
+
+        generator.warm_up()
+        generator.generate_card_image("Another title", "other body words " * 60)
+        reused = generator.generate_card_image(self.TITLE, self.CONTENT)
+
+        self.assertEqual(_pixels(reused), _pixels(fresh))
+        self.assertEqual(len(CardStyleImageGenerator._templates), 2 * CardStyleImageGenerator.MAX_LINES)
+
+    def test_title_offset_follows_whether_icon_was_drawn(self):
+        """图标文件存在但无法读取时，标题位置与没有图标时一致，且该模板不缓存"""
+        unreadable = os.path.join(self.tmpdir, "icon.jpg")
+        with open(unreadable, "wb") as f:
+            f.write(b"not an image")
+
+        generator = CardStyleImageGenerator()
+        generator.ICON_PATH = os.path.join(self.tmpdir, "missing.jpg")
+        without_icon = generator.generate_card_image(self.TITLE, self.CONTENT)
+        generator.ICON_PATH = unreadable
+        broken_icon = generator.generate_card_image(self.TITLE, self.CONTENT)
+
+        self.assertEqual(_pixels(broken_icon), _pixels(without_icon))
+        self.assertEqual(CardStyleImageGenerator._templates, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
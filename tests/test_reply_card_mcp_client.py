@@ -0,0 +1,112 @@
+"""
+reply_card.mcp_client 单元测试
+
+测试会话复用、文档内容缓存与并发获取。
+"""
+
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+from reply_card.mcp_client import MCPClient
+
+
+class FakeAuth:
+    """用于测试的最小认证对象"""
+
+    def get_tenant_access_token(self):
+        return "test_token_0123456789abcdef"
+
+
+class TestMCPClient(unittest.TestCase):
+    """测试 MCPClient"""
+
+    def setUp(self):
+        self.client = MCPClient(FakeAuth())
+
+    def test_call_tool_uses_pooled_session(self):
+        """工具调用复用客户端的 HTTP 会话"""
+        response = MagicMock(status_code=200, text="{}")
+        response.json.return_value = {"result": {"content": "doc body"}}
+        with patch.object(self.client.session, "post", return_value=response) as mock_post:
+            self.assertEqual(self.client.fetch_doc("doxcn_1"), "doc body")
+
+        self.assertEqual(mock_post.call_args.kwargs["json"]["params"]["arguments"], {"docID": "doxcn_1"})
+
+    def test_fetch_doc_caches_content_but_not_failures(self):
+        """成功结果缓存，失败结果下次重新请求"""
+        with patch.object(
+            self.client, "call_tool", side_effect=[None, {"content": "doc body"}]
+        ) as mock_call_tool:
+            self.assertIsNone(self.client.fetch_doc("doxcn_1"))
+            self.assertEqual(self.client.fetch_doc("doxcn_1"), "doc body")
+            self.assertEqual(self.client.fetch_doc("doxcn_1"), "doc body")
+
+        self.assertEqual(mock_call_tool.call_count, 2)
+
+    def test_fetch_doc_first_returns_fastest_content(self):
+        """token 与 URL 并发请求，返回最先取到的内容，不等待较慢的请求"""
+        release = threading.Event()
+
+        def fake_fetch(doc_id):
+            if doc_id == "doxcn_slow":
+                release.wait(5)
+                return "slow body"
+            return "url body"
+
+        try:
+            with patch.object(self.client, "_fetch_doc_uncached", side_effect=fake_fetch):
+                start = time.time()
+                content = self.client.fetch_doc_first(["doxcn_slow", "https://x.feishu.cn/docx/doxcn_slow"])
+                elapsed = time.time() - start
+        finally:
+            release.set()
+
+        self.assertEqual(content, "url body")
+        self.assertLess(elapsed, 2)
+
+    def test_fetch_doc_first_skips_failed_variant(self):
+        """某一标识获取失败时等待其他标识的结果"""
+        with patch.object(
+            self.client, "_fetch_doc_uncached", side_effect=lambda doc_id: None if doc_id == "doxcn_1" else "url body"
+        ):
+            self.assertEqual(self.client.fetch_doc_first(["doxcn_1", "https://x.feishu.cn/docx/doxcn_1"]), "url body")
+            self.assertIsNone(self.client.fetch_doc_first(["doxcn_1"]))
+
+    def test_fetch_doc_first_refetches_when_revision_changes(self):
+        """同一版本复用缓存，版本号变化后丢弃旧内容重新获取"""
+        doc_ids = ["doxcn_1"]
+        current = {"body": "v1 body"}
+        with patch.object(
+            self.client, "_fetch_doc_uncached", side_effect=lambda _doc_id: current["body"]
+        ) as mock_fetch:
+            self.assertEqual(self.client.fetch_doc_first(doc_ids, revision=1), "v1 body")
+            current["body"] = "v2 body"
+            calls = mock_fetch.call_count
+            # 版本未变：即使远端内容已变也返回缓存
+            self.assertEqual(self.client.fetch_doc_first(doc_ids, revision=1), "v1 body")
+            self.assertEqual(mock_fetch.call_count, calls)
+            self.assertEqual(self.client.fetch_doc_first(doc_ids, revision=2), "v2 body")
+
+    def test_cached_content_without_revision_is_refetched_once_revision_known(self):
+        """仅按 TTL 缓存（版本未知）的内容在得知版本号后重新获取一次"""
+        with patch.object(
+            self.client, "_fetch_doc_uncached", side_effect=["old body", "new body"]
+        ) as mock_fetch:
+            self.assertEqual(self.client.fetch_doc_first(["doxcn_1"]), "old body")
+            self.assertEqual(self.client.fetch_doc_first(["doxcn_1"], revision=7), "new body")
+            self.assertEqual(self.client.fetch_doc_first(["doxcn_1"], revision=7), "new body")
+
+        self.assertEqual(mock_fetch.call_count, 2)
+
+    def test_close_shuts_down_executor(self):
+        """close 后线程池不再接收任务"""
+        self.client.close()
+
+        with self.assertRaises(RuntimeError):
+            self.client._executor.submit(lambda: None)
+
+
+if __name__ == "__main__":
+    unittest.main()
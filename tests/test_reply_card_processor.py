@@ -1,13 +1,14 @@
 """
 reply_card.processor 单元测试
 
-测试 Wiki 文档 token 到 document_id(obj_token) 的解析逻辑。
+测试 Wiki 文档 token 到 document_id(obj_token) 的解析逻辑，以及卡片图片的渲染结果缓存。
 """
 
+import time
 import unittest
-from unittest.mock import patch, call
+from unittest.mock import ANY, MagicMock, patch, call
 
-from reply_card.processor import DocCardProcessor
+from reply_card.processor import DocCardProcessor, _ApiBudget
 
 
 class FakeAuth:
@@ -121,7 +122,97 @@ class TestDocCardProcessor(unittest.TestCase):
             [call("wikcnFromUrl"), call("wikcnNodeResolved")],
         )
         mock_spaces.assert_called_once()
-        mock_find_node.assert_called_once_with("space_1", "wikcnFromUrl")
+        mock_find_node.assert_called_once_with("space_1", "wikcnFromUrl", cancel=ANY, budget=ANY)
+
+    def test_resolve_wiki_document_id_uses_stored_result(self):
+        """解析成功后写入存储，同一 token 再次解析不调用 Wiki 接口"""
+        with patch.object(
+            self.processor, "_fetch_wiki_node_info", return_value={"obj_token": "docx_cached"}
+        ) as mock_get_node:
+            self.assertEqual(self.processor._resolve_wiki_document_id("wikcnCached"), "docx_cached")
+            self.assertEqual(self.processor._resolve_wiki_document_id("wikcnCached"), "docx_cached")
+
+        mock_get_node.assert_called_once_with("wikcnCached")
+        self.assertEqual(self.processor.wiki_token_store.get("wikcnCached"), "docx_cached")
+
+    def test_search_wiki_spaces_returns_first_match_and_cancels_others(self):
+        """各空间并发扫描，找到目标后其余空间停止翻页"""
+        def fake_wiki_get(url, params):
+            if "space_hit" in url:
+                return {"items": [{"node_token": "node_target", "obj_token": "obj_target"}], "has_more": False}
+            # 其余空间无限翻页，只能靠取消信号停止；每页稍作等待，避免命中空间的线程被调度前额度已被耗尽
+            time.sleep(0.001)
+            return {"items": [{"node_token": "n", "obj_token": "o"}], "has_more": True, "page_token": "next"}
+
+        budget = _ApiBudget(1000)
+        with patch.object(self.processor, "_wiki_get", side_effect=fake_wiki_get):
+            node_token = self.processor._search_wiki_spaces(
+                ["space_a", "space_hit", "space_b"], "obj_target", budget
+            )
+
+        self.assertEqual(node_token, "node_target")
+        # 未被取消时两个空间会一直翻页直到额度用尽
+        self.assertGreater(budget.remaining, 0)
+
+    def test_find_wiki_node_token_stops_when_budget_exhausted(self):
+        """接口额度用尽时停止扫描"""
+        with patch.object(
+            self.processor,
+            "_wiki_get",
+            return_value={"items": [{"node_token": "n", "has_child": False}], "has_more": True, "page_token": "next"},
+        ) as mock_wiki_get:
+            node_token = self.processor._find_wiki_node_token_in_space("space_1", "obj_target", budget=_ApiBudget(3))
+
+        self.assertIsNone(node_token)
+        self.assertEqual(mock_wiki_get.call_count, 3)
+
+    def test_reply_document_passes_docx_revision_to_mcp_cache(self):
+        """新版文档按当前版本号获取内容，版本号接口失败时退化为仅按 TTL 缓存"""
+        response = MagicMock(status_code=200)
+        response.json.return_value = {"code": 0, "data": {"document": {"revision_id": 42}}}
+        with patch("reply_card.processor.requests.get", return_value=response):
+            self.assertEqual(self.processor._get_document_revision("doxcn_1"), 42)
+
+        with patch.object(self.processor, "_get_document_revision", return_value=42), patch.object(
+            self.processor.mcp_client, "fetch_doc_first", return_value=None
+        ) as mock_fetch, patch.object(self.processor, "_send_text_reply"):
+            self.processor.reply_document(("docx", "doxcn_1", "https://x.feishu.cn/docx/doxcn_1"), "oc_1")
+
+        mock_fetch.assert_called_once_with(["doxcn_1", "https://x.feishu.cn/docx/doxcn_1"], revision=42)
+
+        with patch("reply_card.processor.requests.get", side_effect=RuntimeError("down")):
+            self.assertIsNone(self.processor._get_document_revision("doxcn_1"))
+
+    def test_send_card_image_reuses_uploaded_image_key(self):
+        """相同文档内容的重复请求不再渲染和上传，只发送消息"""
+        render_service = MagicMock()
+        render_service.render_card.return_value = b"png"
+        with patch("reply_card.processor.get_render_service", return_value=render_service), patch.object(
+            self.processor, "_upload_image", return_value="img_1"
+        ) as mock_upload, patch.object(self.processor, "_send_image_message", return_value=True) as mock_send:
+            self.assertTrue(self.processor.send_card_image("oc_1", "标题", "正文", doc_id="doc_1"))
+            self.assertTrue(self.processor.send_card_image("oc_2", "标题", "正文", doc_id="doc_1"))
+
+        render_service.render_card.assert_called_once_with("标题", "正文")
+        mock_upload.assert_called_once_with(b"png")
+        self.assertEqual(mock_send.call_args_list, [call("oc_1", "img_1"), call("oc_2", "img_1")])
+
+    def test_send_card_image_reuploads_cached_png_after_send_failure(self):
+        """发送失败后下次请求用缓存的 PNG 重新上传，不重新渲染；内容变化时重新渲染"""
+        render_service = MagicMock()
+        render_service.render_card.return_value = b"png"
+        with patch("reply_card.processor.get_render_service", return_value=render_service), patch.object(
+            self.processor, "_upload_image", side_effect=["img_old", "img_new", "img_v2"]
+        ) as mock_upload, patch.object(
+            self.processor, "_send_image_message", side_effect=[False, True, True]
+        ) as mock_send:
+            self.assertFalse(self.processor.send_card_image("oc_1", "标题", "正文", doc_id="doc_1"))
+            self.assertTrue(self.processor.send_card_image("oc_1", "标题", "正文", doc_id="doc_1"))
+            self.assertTrue(self.processor.send_card_image("oc_1", "标题", "正文已修改", doc_id="doc_1"))
+
+        self.assertEqual(render_service.render_card.call_count, 2)
+        self.assertEqual(mock_upload.call_count, 3)
+        self.assertEqual(mock_send.call_args_list[1], call("oc_1", "img_new"))
 
 
 if __name__ == "__main__":
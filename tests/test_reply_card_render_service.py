@@ -0,0 +1,67 @@
+"""
+reply_card.render_service 单元测试
+
+测试渲染服务的队列上限、超时与失败降级。进程池替换为线程池，避免测试中启动子进程。
+"""
+
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from reply_card.render_service import RenderService
+
+
+class TestRenderService(unittest.TestCase):
+    """测试 RenderService"""
+
+    def test_inline_render_returns_png(self):
+        """workers=0 时在调用线程内渲染并返回 PNG"""
+        service = RenderService(workers=0)
+
+        data = service.render_card("标题", "正文内容\n第二行")
+
+        self.assertTrue(data.startswith(b"\x89PNG"))
+        self.assertEqual(service.stats["rendered"], 1)
+
+    def test_render_failure_returns_none(self):
+        """渲染异常时返回 None 并归还名额"""
+        service = RenderService(workers=0, max_pending=1)
+
+        with patch("reply_card.render_service._render_in_worker", side_effect=OSError("font missing")):
+            self.assertIsNone(service.render_card("标题", "正文"))
+
+        self.assertEqual(service.stats["failures"], 1)
+        self.assertTrue(service._slots.acquire(blocking=False))
+
+    def test_rejects_when_queue_full_and_times_out(self):
+        """名额用尽时直接拒绝；超时放弃等待的任务在真正结束后才归还名额"""
+        service = RenderService(workers=1, max_pending=1, timeout=0.05)
+        release = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=1)
+
+        def slow_render(kind, args):
+            release.wait(5)
+            return b"png"
+
+        try:
+            with patch.object(service, "_get_pool", return_value=executor), patch(
+                "reply_card.render_service._render_in_worker", side_effect=slow_render
+            ):
+                self.assertIsNone(service.render_card("标题", "正文"))
+                self.assertEqual(service.stats["timeouts"], 1)
+
+                # 超时的任务仍在运行，占用唯一名额
+                self.assertIsNone(service.render_card("标题", "正文"))
+                self.assertEqual(service.stats["rejected"], 1)
+
+                release.set()
+                executor.shutdown(wait=True)
+                self.assertTrue(service._slots.acquire(blocking=False))
+        finally:
+            release.set()
+            executor.shutdown(wait=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
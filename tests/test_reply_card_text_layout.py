@@ -0,0 +1,60 @@
+"""
+reply_card.text_layout 单元测试
+
+使用固定字宽的假字体（全角 20px、半角 10px），不依赖系统字体。
+"""
+
+import unittest
+
+from reply_card.text_layout import TextMeasurer
+
+
+class FakeFont:
+    """全角字符 20px、其他字符 10px 的假字体，记录测量次数"""
+
+    size = 20
+
+    def __init__(self):
+        self.calls = 0
+
+    def getlength(self, text):
+        self.calls += 1
+        return sum(20 if ord(c) > 0x2E80 else 10 for c in text)
+
+
+class TestTextMeasurer(unittest.TestCase):
+    """测试 TextMeasurer"""
+
+    def setUp(self):
+        self.font = FakeFont()
+        self.measurer = TextMeasurer(self.font)
+
+    def test_wraps_mixed_text_by_width_without_splitting_words(self):
+        """中英文混排按像素宽度折行，英文单词整体换行"""
+        lines = self.measurer.wrap("中文内容 hello world 继续", 120)
+
+        self.assertEqual(lines, ["中文内容", "hello world", "继续"])
+        self.assertTrue(all(self.measurer.width(line) <= 120 for line in lines))
+
+    def test_splits_overlong_word_and_keeps_paragraphs(self):
+        """超过整行宽度的单词按字符拆分，空段落保留为空行"""
+        lines = self.measurer.wrap("ab https://x.cn/abcdef\n\n尾", 100)
+
+        self.assertEqual(lines, ["ab https:/", "/x.cn/abcd", "ef", "", "尾"])
+
+    def test_emoji_measured_as_one_unit(self):
+        """emoji 按字号计宽且不会被拆开或截断一半"""
+        self.assertEqual(self.measurer.width("a😀"), 30)
+        self.assertEqual(self.measurer.wrap("中中中😀", 70), ["中中中", "😀"])
+        self.assertEqual(self.measurer.truncate("ab😀cd", 35), "ab")
+
+    def test_glyph_widths_measured_once(self):
+        """同一字符只测量一次"""
+        self.measurer.wrap("重复重复重复 aaa aaa", 1000)
+        self.measurer.wrap("重复重复重复 aaa aaa", 1000)
+
+        self.assertEqual(self.font.calls, 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+from unittest.mock import Mock
+
+import scoring
+from config import ACTIVITY_WEIGHTS
+from scoring import ScoringEngine
+from storage import BitableStorage
+
+
+def _expected(metrics, weights=ACTIVITY_WEIGHTS):
+    return round(sum(metrics.get(k, 0) * w for k, w in weights.items()), 2)
+
+
+def test_score_fields_matches_hand_expanded_formula():
+    fields = {
+        "发言次数": 10,
+        "发言字数": "250",
+        "被回复数": 3,
+        "单独被@次数": 2,
+        "发起话题数": 1,
+        "点赞数": 4,
+        "被点赞数": 5,
+        "被Pin次数": 1,
+    }
+    metrics = ScoringEngine.fields_to_metrics(fields)
+
+    assert scoring.compute_score_from_fields(fields) == _expected(metrics)
+    assert scoring.compute_score({"message_count": 2}) == 2 * ACTIVITY_WEIGHTS["message_count"]
+
+
+def test_score_many_matches_single_user_scores():
+    rows = [
+        {"message_count": 3, "char_count": 120},
+        {"reply_received": 2, "pin_received": 1},
+        {},
+    ]
+    engine = ScoringEngine()
+    expected = [_expected(r) for r in rows]
+
+    assert engine.score_many(rows) == expected
+    assert engine.score_many(rows) == [engine.score(r) for r in rows]
+    assert engine.score_many([]) == []
+
+
+def test_rank_handles_ties_in_single_pass():
+    scores = [10.0, 30.0, 10.0, 20.0]
+    expected = [(3, 0.0), (1, 75.0), (3, 0.0), (2, 50.0)]
+
+    assert ScoringEngine.rank(scores) == expected
+    assert ScoringEngine.rank([]) == []
+
+
+def test_rescore_month_batch_updates_only_changed_scores():
+    storage = BitableStorage(Mock())
+    records = [
+        {"record_id": "rec1", "fields": {"发言次数": 2, "活跃度分数": 2}},
+        {"record_id": "rec2", "fields": {"发言次数": 1, "活跃度分数": 1}},
+    ]
+    storage._search_month_page = Mock(side_effect=[(records[:1], "p2"), (records[1:], None)])
+    storage._batch_update_records = Mock()
+
+    updated = storage.rescore_month("2026-02", weights={"message_count": 2.0}, batch_size=1)
+
+    assert updated == 2
+    assert storage._batch_update_records.call_count == 2
+    storage._batch_update_records.assert_any_call([{"record_id": "rec1", "fields": {"活跃度分数": 4.0}}])
@@ -0,0 +1,58 @@
+from metrics_stream import StreamingMetricsEngine
+from snapshot_store import MessageSnapshotStore, pack_contribution, unpack_contribution
+
+CONTRIBUTION = {
+    "message_id": "om_1",
+    "sender_id": "ou_sender",
+    "sender_name": "Sender",
+    "sender_metrics": {"message_count": 1, "char_count": 42, "topic_initiated": 0},
+    "reply_target": {"user_id": "ou_reply", "user_name": "Reply"},
+    "mention_targets": [{"user_id": "ou_m1", "user_name": "M1"}, {"user_id": "ou_m2", "user_name": "M2"}],
+}
+
+
+def test_pack_roundtrip_uses_fixed_layout():
+    record = pack_contribution(CONTRIBUTION)
+    # 头部 6 字节 + 4 个 64 字节 ID 槽
+    assert len(record) == 6 + 4 * 64
+
+    restored = unpack_contribution("om_1", record)
+    assert restored["sender_id"] == "ou_sender"
+    assert restored["sender_metrics"]["char_count"] == 42
+    assert restored["sender_metrics"]["topic_initiated"] == 0
+    assert restored["reply_target"]["user_id"] == "ou_reply"
+    assert [t["user_id"] for t in restored["mention_targets"]] == ["ou_m1", "ou_m2"]
+    assert StreamingMetricsEngine.contribution_deltas(restored, sign=-1) == [
+        ("ou_sender", "ou_sender", {"message_count": -1, "char_count": -42}),
+        ("ou_reply", "ou_reply", {"reply_received": -1}),
+        ("ou_m1", "ou_m1", {"mention_received": -1}),
+        ("ou_m2", "ou_m2", {"mention_received": -1}),
+    ]
+
+
+def test_snapshots_and_retracted_marks_survive_restart(tmp_path):
+    db_path = tmp_path / "snapshots.sqlite3"
+    store = MessageSnapshotStore(db_path)
+    engine = StreamingMetricsEngine(contributions=store, retracted=store.retracted)
+    engine.feed({"message_id": "om_root", "sender_id": "ou_a", "char_count": 3})
+    store.close()
+
+    # 重启后新引擎仍可回滚，且只回滚一次
+    reopened = MessageSnapshotStore(db_path)
+    engine = StreamingMetricsEngine(contributions=reopened, retracted=reopened.retracted)
+    deltas = engine.retract("om_root", name_of=lambda uid: f"name-{uid}")
+    assert deltas == [("ou_a", "name-ou_a", {"message_count": -1, "char_count": -3, "topic_initiated": -1})]
+    reopened.close()
+
+    assert MessageSnapshotStore(db_path).is_retracted("om_root")
+
+
+def test_expired_snapshots_are_invisible_and_purged():
+    store = MessageSnapshotStore(":memory:", retention_seconds=60)
+    store.set("om_old", CONTRIBUTION, now=0)
+    store.set("om_new", CONTRIBUTION, now=100)
+
+    assert store.get("om_old", now=100) is None
+    assert store.get("om_new", now=100)["sender_id"] == "ou_sender"
+    assert store.purge_expired(now=100) == 1
+    assert len(store) == 1
@@ -1,14 +1,15 @@
 """
 utils.py 单元测试
 
-测试LRU缓存、线程安全缓存和工具函数
+测试LRU缓存、线程安全缓存、TTL缓存和工具函数
 """
 
 import unittest
 import threading
 import time
 from datetime import datetime
-from utils import LRUCache, ThreadSafeLRUCache, get_timestamp_ms, extract_open_id, sanitize_log_data
+from unittest.mock import patch
+from utils import LRUCache, ThreadSafeLRUCache, TTLCache, get_timestamp_ms, extract_open_id, sanitize_log_data
 
 
 class TestLRUCache(unittest.TestCase):
@@ -176,6 +177,110 @@ class TestThreadSafeLRUCache(unittest.TestCase):
         self.assertGreater(len(cache), 0)
 
 
+class TestTTLCache(unittest.TestCase):
+    """测试TTLCache类"""
+
+    def test_entries_expire_after_ttl(self):
+        """测试条目过期与过期计数"""
+        cache = TTLCache(capacity=10, ttl=60)
+        with patch("utils.time.monotonic", return_value=1000):
+            cache.set("ou_1", "张三")
+            self.assertEqual(cache.get("ou_1"), "张三")
+        with patch("utils.time.monotonic", return_value=1061):
+            self.assertIsNone(cache.get("ou_1"))
+            self.assertNotIn("ou_1", cache)
+
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["expirations"], 1)
+
+    def test_capacity_evicts_least_recently_used(self):
+        """测试单段时的LRU淘汰与淘汰计数"""
+        cache = TTLCache(capacity=2, shards=1)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_get_or_load_single_flight(self):
+        """测试并发未命中只加载一次"""
+        cache = TTLCache(capacity=10)
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.05)
+            return "value"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_load("k", loader))) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["value"] * 5)
+        self.assertEqual(cache.get_or_load("k", loader), "value")
+        self.assertEqual(len(calls), 1)
+
+    def test_get_or_load_negative_cache_and_errors(self):
+        """测试负缓存与加载异常不缓存"""
+        cache = TTLCache(capacity=10, negative_ttl=30)
+        calls = []
+
+        def missing():
+            calls.append(1)
+            return None
+
+        with patch("utils.time.monotonic", return_value=0):
+            self.assertIsNone(cache.get_or_load("ghost", missing))
+            self.assertIsNone(cache.get_or_load("ghost", missing))
+            self.assertNotIn("ghost", cache)
+        self.assertEqual(len(calls), 1)
+        with patch("utils.time.monotonic", return_value=31):
+            cache.get_or_load("ghost", missing)
+        self.assertEqual(len(calls), 2)
+
+        def boom():
+            raise RuntimeError("api down")
+
+        with self.assertRaises(RuntimeError):
+            cache.get_or_load("err", boom)
+        self.assertEqual(cache.get_or_load("err", lambda: "ok"), "ok")
+        self.assertEqual(cache.stats()["load_errors"], 1)
+
+    def test_stats_are_counted_per_shard_and_summed(self):
+        """测试命中统计按段计数（无全局统计锁），并发访问后汇总准确"""
+        cache = TTLCache(capacity=64, shards=8)
+        self.assertFalse(hasattr(cache, "_stats_lock"))
+        for i in range(16):
+            cache.set(f"k{i}", i)
+
+        def work():
+            for _ in range(200):
+                for i in range(16):
+                    cache.get(f"k{i}")
+                cache.lookup("missing")
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        stats = cache.stats()
+        self.assertEqual(stats["hits"], 4 * 200 * 16)
+        self.assertEqual(stats["misses"], 4 * 200)
+        self.assertEqual(stats["size"], 16)
+        self.assertGreater(sum(1 for shard in cache._stats if shard["hits"]), 1)
+
+
 class TestUtilityFunctions(unittest.TestCase):
     """测试工具函数"""
 
@@ -4,8 +4,9 @@
 """
 
 import threading
+import time
 from collections import OrderedDict
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional, Tuple
 from datetime import datetime
 
 
@@ -150,6 +151,250 @@ class ThreadSafeLRUCache(LRUCache):
             super().clear()
 
 
+class _Flight:
+    """get_or_load 中同一键的在途加载（single-flight）"""
+
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Optional[BaseException] = None
+
+
+class TTLCache:
+    """
+    带过期时间、分段锁与命中统计的线程安全缓存
+
+    相比 ThreadSafeLRUCache：
+    - 每个条目有过期时间，昵称等会变化的数据不会永久陈旧
+    - 按键哈希分为若干段，每段独立加锁与 LRU 淘汰，并发线程互不阻塞
+    - get 一次加锁同时完成存在性判断与取值，无需 ``in`` + ``get`` 两次加锁
+    - get_or_load 原子地"查缓存，未命中则加载"，同一键的并发未命中只加载一次
+    - 加载结果为 None 时做负缓存（较短 TTL），避免对不存在的数据反复请求
+    - 统计命中 / 未命中 / 淘汰 / 过期 / 加载次数（按段计数，在已持有的段锁内更新，stats() 时汇总）
+
+    Example:
+        >>> cache = TTLCache(capacity=100, ttl=3600)
+        >>> cache.get_or_load("ou_1", lambda: "张三")
+        '张三'
+        >>> cache.stats()["hits"]
+        0
+    """
+
+    _NEGATIVE = object()
+
+    def __init__(
+        self,
+        capacity: int = 500,
+        ttl: Optional[float] = None,
+        negative_ttl: float = 60,
+        shards: int = 8,
+    ):
+        """
+        初始化缓存
+
+        Args:
+            capacity: 总容量（平均分配到各段）
+            ttl: 默认过期时间（秒），None 表示不过期
+            negative_ttl: 负缓存过期时间（秒），0 表示不做负缓存
+            shards: 分段数
+        """
+        if capacity <= 0:
+            raise ValueError("缓存容量必须大于0")
+        shards = max(1, min(shards, capacity))
+        self.capacity = capacity
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._shard_capacity = -(-capacity // shards)
+        self._shards = [OrderedDict() for _ in range(shards)]
+        self._locks = [threading.Lock() for _ in range(shards)]
+        self._flights = [{} for _ in range(shards)]
+        self._stats = [
+            {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "loads": 0, "load_errors": 0}
+            for _ in range(shards)
+        ]
+
+    def _shard_index(self, key: Any) -> int:
+        return hash(key) % len(self._shards)
+
+    def _count(self, index: int, name: str) -> None:
+        """段计数 +1（调用方须持有该段的锁）"""
+        self._stats[index][name] += 1
+
+    def _lookup_locked(self, index: int, key: Any, now: float):
+        """段锁内查找：返回 (是否命中, 值)，过期条目顺便删除"""
+        shard = self._shards[index]
+        entry = shard.get(key)
+        if entry is None:
+            return False, None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= now:
+            del shard[key]
+            self._count(index, "expirations")
+            return False, None
+        shard.move_to_end(key)
+        return True, value
+
+    def _store_locked(self, index: int, key: Any, value: Any, ttl: Optional[float], now: float) -> None:
+        shard = self._shards[index]
+        shard[key] = (value, now + ttl if ttl is not None else None)
+        shard.move_to_end(key)
+        if len(shard) > self._shard_capacity:
+            shard.popitem(last=False)
+            self._count(index, "evictions")
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        """
+        获取未过期的缓存值（负缓存条目视为未命中）
+
+        Args:
+            key: 缓存键
+            default: 未命中时的返回值
+        """
+        index = self._shard_index(key)
+        with self._locks[index]:
+            found, value = self._lookup_locked(index, key, time.monotonic())
+            hit = found and value is not self._NEGATIVE
+            self._count(index, "hits" if hit else "misses")
+        return value if hit else default
+
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        设置缓存值
+
+        Args:
+            key: 缓存键
+            value: 缓存值
+            ttl: 本条目的过期时间（秒），默认使用构造时的 ttl
+        """
+        index = self._shard_index(key)
+        with self._locks[index]:
+            self._store_locked(index, key, value, ttl if ttl is not None else self.ttl, time.monotonic())
+
+    def lookup(self, key: Any) -> Tuple[bool, Any]:
+        """
+        查询缓存并区分"未命中"与"负缓存命中"
+
+        Returns:
+            (是否命中, 值)；负缓存命中时为 (True, None)
+        """
+        index = self._shard_index(key)
+        with self._locks[index]:
+            found, value = self._lookup_locked(index, key, time.monotonic())
+            self._count(index, "hits" if found else "misses")
+        return found, None if value is self._NEGATIVE else value
+
+    def set_negative(self, key: Any, ttl: Optional[float] = None) -> None:
+        """写入负缓存条目（ttl 默认为 negative_ttl；negative_ttl 为 0 时不写入）"""
+        ttl = ttl if ttl is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+        index = self._shard_index(key)
+        with self._locks[index]:
+            self._store_locked(index, key, self._NEGATIVE, ttl, time.monotonic())
+
+    def get_or_load(self, key: Any, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """
+        原子地获取缓存值，未命中时调用 loader 加载并写入缓存
+
+        同一键的并发未命中只有一个线程调用 loader，其余线程等待并共享结果；
+        loader 返回 None 时按 negative_ttl 负缓存，期间直接返回 None；
+        loader 抛出的异常会传递给所有等待者，且不写入缓存。
+
+        Args:
+            key: 缓存键
+            loader: 无参加载函数
+            ttl: 本条目的过期时间（秒），默认使用构造时的 ttl
+
+        Returns:
+            缓存值或加载结果（可能为 None）
+        """
+        index = self._shard_index(key)
+        with self._locks[index]:
+            found, value = self._lookup_locked(index, key, time.monotonic())
+            if found:
+                self._count(index, "hits")
+                return None if value is self._NEGATIVE else value
+            self._count(index, "misses")
+            flight = self._flights[index].get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[index][key] = flight
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = loader()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._locks[index]:
+                self._count(index, "loads")
+                if flight.error is not None:
+                    self._count(index, "load_errors")
+                else:
+                    if flight.value is not None:
+                        self._store_locked(
+                            index, key, flight.value, ttl if ttl is not None else self.ttl, time.monotonic()
+                        )
+                    elif self.negative_ttl > 0:
+                        self._store_locked(index, key, self._NEGATIVE, self.negative_ttl, time.monotonic())
+                del self._flights[index][key]
+            flight.done.set()
+        return flight.value
+
+    def delete(self, key: Any) -> None:
+        """删除缓存条目"""
+        index = self._shard_index(key)
+        with self._locks[index]:
+            self._shards[index].pop(key, None)
+
+    def __contains__(self, key: Any) -> bool:
+        """支持 in 操作符（仅未过期的正常条目）"""
+        index = self._shard_index(key)
+        with self._locks[index]:
+            found, value = self._lookup_locked(index, key, time.monotonic())
+        return found and value is not self._NEGATIVE
+
+    def __len__(self) -> int:
+        """返回缓存条目数（含尚未清理的过期条目）"""
+        total = 0
+        for index, shard in enumerate(self._shards):
+            with self._locks[index]:
+                total += len(shard)
+        return total
+
+    def clear(self) -> None:
+        """清空缓存（统计计数保留）"""
+        for index, shard in enumerate(self._shards):
+            with self._locks[index]:
+                shard.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        获取缓存统计
+
+        Returns:
+            hits / misses / evictions / expirations / loads / load_errors / size / hit_rate
+        """
+        stats: Dict[str, Any] = {}
+        for index, shard_stats in enumerate(self._stats):
+            with self._locks[index]:
+                for name, value in shard_stats.items():
+                    stats[name] = stats.get(name, 0) + value
+        lookups = stats["hits"] + stats["misses"]
+        stats["size"] = len(self)
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
 def get_timestamp_ms() -> int:
     """
     获取当前时间戳(毫秒)